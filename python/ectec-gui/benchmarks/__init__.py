@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmarking equipment.
+
+The benchmarks aren't part of the test suite. Run a module with e.g.
+::
+
+    python -m benchmarks.server
+
+***********************************
+
+Created on Mon Oct 19 09:12:40 2026
+
+Copyright (C) 2020 real-yfprojects (github.com user)
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+import os.path as osp
+import socket
+import sys
+import time
+
+
+def _import_ectec(*submodules):
+    try:
+        ectec = __import__('ectec')
+
+        for sbm in submodules:
+            __import__('ectec.'+sbm)
+    except:
+        path = osp.abspath(osp.join(osp.dirname(__file__), '../src/'))
+        if not path in sys.path:
+            sys.path.append(path)
+
+        ectec = __import__('ectec')
+
+        for sbm in submodules:
+            __import__('ectec.'+sbm)
+
+    return ectec
+
+
+class Timer:
+    """
+    Context manager measuring the time spent in its block.
+
+    Examples
+    --------
+    >>> with Timer() as timer:
+    ...     do_something()
+    >>> timer.elapsed
+    0.0123
+
+    """
+
+    def __init__(self):
+        self.start = None
+        self.elapsed = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.elapsed = time.perf_counter() - self.start
+        return False
+
+
+def report(name, value, unit=''):
+    """
+    Print the result of a benchmark.
+
+    Parameters
+    ----------
+    name : str
+        What was measured.
+    value : float
+        The measured value.
+    unit : str, optional
+        The unit of the value. The default is ''.
+
+    """
+    print("{:<50} {:>14.4f} {}".format(name, value, unit))
+
+
+def raw_connect(port, name, address='127.0.0.1', version=None):
+    """
+    Connect a plain socket to an ectec server as user client.
+
+    This doesn't start any thread for the client. It is therefore
+    suited to simulate many clients.
+
+    Parameters
+    ----------
+    port : int
+        The port of the server.
+    name : str
+        The name to register as.
+    address : str, optional
+        The address of the server. ``unix://<path>`` for a unix socket.
+        The default is '127.0.0.1'.
+    version : str, optional
+        The version to send. The default is the version of ectec.
+
+    Returns
+    -------
+    socket.socket
+        The connected and registered socket.
+
+    """
+    ectec = _import_ectec()
+    version = version or str(ectec.VERSION)
+
+    if address.startswith('unix://'):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(address[len('unix://'):])
+    else:
+        sock = socket.create_connection((address, port))
+    sock.sendall('INFO {}\nREGISTER {} AS user\n'.format(
+        version, name).encode('utf-8'))
+
+    # await INFO and UPDATE USERS
+    data = b''
+    while data.count(b'\n') < 2:
+        part = sock.recv(8192)
+        if not part:
+            raise ConnectionError("Server closed the connection.")
+        data += part
+
+    return sock
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Replay traffic captured by an ectec server.
+
+A capture is recorded with ``Server.start(..., capture=path)``. The replay
+re-creates the captured connections and sends the same data in the same
+order. By default a local server is started for that. Run e.g.
+::
+
+    python -m benchmarks.replay traffic.cap --speed 10
+
+***********************************
+
+Created on Mon Oct 19 15:04:51 2026
+
+Copyright (C) 2020 real-yfprojects (github.com user)
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+import argparse
+import socket
+import threading
+import time
+
+from . import Timer, _import_ectec, report
+
+ectec = _import_ectec('server')
+ectecserver = ectec.server
+TrafficCapture = ectecserver.TrafficCapture
+
+
+def drain(sock, received, index):
+    """Receive from `sock` until it is closed and count the bytes."""
+    try:
+        while True:
+            data = sock.recv(65536)
+            if not data:
+                break
+            received[index] += len(data)
+    except OSError:
+        pass
+    finally:
+        sock.close()
+
+
+def connect(port, address):
+    """Connect a socket to the server at `address` and `port`."""
+    if address.startswith('unix://'):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(address[len('unix://'):])
+        return sock
+
+    return socket.create_connection((address, port))
+
+
+def replay(path, port, address='127.0.0.1', speed=1.):
+    """
+    Replay a capture against a server.
+
+    All data is sent by one thread in the captured order. The answers of
+    the server are received and discarded by one thread per connection.
+
+    Parameters
+    ----------
+    path : str
+        The path of the capture.
+    port : int
+        The port of the server.
+    address : str, optional
+        The address of the server. ``unix://<path>`` for a unix socket.
+        The default is '127.0.0.1'.
+    speed : float, optional
+        The factor to speed up the replay by. 0 to send as fast as
+        possible. The default is 1.
+
+    Returns
+    -------
+    tuple of (int, int, int)
+        The number of records, the bytes sent and the bytes received.
+
+    """
+    sockets = {}
+    threads = []
+    received = []
+    records = sent = 0
+
+    start = time.perf_counter()
+    try:
+        for record in TrafficCapture.read(path):
+            records += 1
+
+            if speed:
+                delay = record.time / speed - (time.perf_counter() - start)
+                if delay > 0:
+                    time.sleep(delay)
+
+            if record.kind == TrafficCapture.OPEN:
+                sock = connect(port, address)
+                sockets[record.connection] = sock
+
+                received.append(0)
+                thread = threading.Thread(target=drain,
+                                          args=(sock, received,
+                                                len(received) - 1),
+                                          daemon=True)
+                thread.start()
+                threads.append(thread)
+                continue
+
+            sock = sockets.get(record.connection)
+            if sock is None:
+                continue  # the capture started after the connection
+
+            if record.kind == TrafficCapture.DATA:
+                try:
+                    sock.sendall(record.data)
+                    sent += len(record.data)
+                except OSError:
+                    del sockets[record.connection]
+            elif record.kind == TrafficCapture.CLOSE:
+                # the server still gets the data sent before
+                del sockets[record.connection]
+                try:
+                    sock.shutdown(socket.SHUT_WR)
+                except OSError:
+                    pass
+    finally:
+        for sock in sockets.values():
+            try:
+                sock.shutdown(socket.SHUT_WR)
+            except OSError:
+                pass
+
+        for thread in threads:
+            thread.join(5)
+
+    return records, sent, sum(received)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('capture', help="The capture file to replay.")
+    parser.add_argument('--speed',
+                        type=float,
+                        default=1.,
+                        help="Factor to speed up the replay by. "
+                        "0 for maximum speed. Default: 1")
+    parser.add_argument('--port',
+                        type=int,
+                        help="Replay against the server at this port "
+                        "instead of a local one.")
+    parser.add_argument('--address',
+                        default='127.0.0.1',
+                        help="The address of the server. Default: 127.0.0.1")
+    args = parser.parse_args()
+
+    server = None
+    port = args.port
+    if port is None:
+        server = ectecserver.Server()
+        server.start(0, address=args.address)
+        port = server.port
+
+    try:
+        with Timer() as timer:
+            records, sent, received = replay(args.capture, port,
+                                             args.address, args.speed)
+        stats = server.stats() if server else None
+    finally:
+        if server:
+            server.stop()
+
+    name = "replay at {}".format('max speed' if not args.speed else
+                                 '{:g}x'.format(args.speed))
+    report(name + " duration", timer.elapsed, 's')
+    report(name + " records", records)
+    report(name + " bytes sent", sent, 'B')
+    report(name + " bytes received", received, 'B')
+    if stats:
+        report(name + " packages received by server", stats.packages_in)
+        report(name + " packages sent by server", stats.packages_out)
+        report(name + " package rate",
+               stats.packages_in / timer.elapsed, 'pkg/s')
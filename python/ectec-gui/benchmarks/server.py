@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmarks for the `ectec.server` module.
+
+***********************************
+
+Created on Mon Oct 19 09:31:02 2026
+
+Copyright (C) 2020 real-yfprojects (github.com user)
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+import argparse
+import logging
+import os.path as osp
+import selectors
+import tempfile
+import threading
+import time
+
+from . import Timer, _import_ectec, raw_connect, report
+
+ectec = _import_ectec('server', 'logs')
+ectecserver = ectec.server
+
+
+class QuietHandler(ectecserver.ClientHandler):
+    """
+    A ClientHandler that doesn't share the user list.
+
+    Otherwise every new client would cause an update to be sent to all
+    other clients. The traffic would dominate benchmarks with many clients.
+    """
+
+    PUBLIC_ROLES = []
+
+    clients = {role.value: [] for role in ectec.Role}
+
+
+def connect_clients(server, n):
+    """Connect `n` raw clients to the server."""
+    sockets = []
+    for i in range(n):
+        sockets.append(raw_connect(server.port, 'client{}'.format(i)))
+    return sockets
+
+
+def bench_stop(n=1000):
+    """Measure the time stopping a server with `n` clients takes."""
+    for mode in ('stop', 'drain'):
+        server = ectecserver.Server(QuietHandler)
+        server.start(0)
+
+        with Timer() as timer:
+            sockets = connect_clients(server, n)
+        report("connect {} clients".format(n), timer.elapsed, 's')
+
+        with Timer() as timer:
+            if mode == 'stop':
+                server.stop()
+            else:
+                server.drain(5)
+        report("{} with {} clients".format(mode, n), timer.elapsed, 's')
+
+        for sock in sockets:
+            sock.close()
+
+
+def bench_connect_storm(n=200):
+    """Measure connect latencies when `n` clients connect at once."""
+    for backlog in (5, 128):
+        server = ectecserver.Server(QuietHandler)
+        server.start(0, backlog=backlog)
+
+        barrier = threading.Barrier(n)
+        latencies = []
+        sockets = []
+        failures = []
+        lock = threading.Lock()
+
+        def connect(i):
+            barrier.wait()
+            try:
+                with Timer() as timer:
+                    sock = raw_connect(server.port,
+                                       'storm{}_{}'.format(backlog, i))
+            except OSError as error:
+                with lock:
+                    failures.append(error)
+                return
+
+            with lock:
+                latencies.append(timer.elapsed)
+                sockets.append(sock)
+
+        threads = [threading.Thread(target=connect, args=(i, ))
+                   for i in range(n)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        stats = server.accept_stats()
+        server.stop()
+        for sock in sockets:
+            sock.close()
+
+        latencies.sort()
+        name = "storm of {} (backlog {})".format(n, backlog)
+        report(name + " failed connects", len(failures))
+        if latencies:
+            report(name + " mean connect",
+                   sum(latencies) / len(latencies), 's')
+            report(name + " p99 connect",
+                   latencies[int(len(latencies) * 0.99) - 1], 's')
+            report(name + " max connect", latencies[-1], 's')
+        report(name + " max accept batch", stats.max_batch)
+        report(name + " mean accept latency", stats.mean_latency, 's')
+        if stats.max_queue is not None:
+            report(name + " max accept queue", stats.max_queue)
+        if stats.listen_overflows is not None:
+            report(name + " listen overflows", stats.listen_overflows)
+
+
+def recv_package(sock, buffer=b''):
+    """
+    Receive one relayed PACKAGE command with its content.
+
+    Returns
+    -------
+    tuple of (bytes, bytes)
+        The package and the bytes received after it.
+
+    """
+    while b'\n' not in buffer:
+        buffer += sock.recv(65536)
+
+    command, buffer = buffer.split(b'\n', 1)
+    length = int(command.rsplit(b' ', 1)[1])
+
+    while len(buffer) < length:
+        buffer += sock.recv(65536)
+
+    return command + b'\n' + buffer[:length], buffer[length:]
+
+
+def bench_transport(n=20000, size=256):
+    """Compare TCP loopback and unix sockets for relaying packages."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = osp.join(directory, 'ectec.sock')
+
+        server = ectecserver.Server(QuietHandler)
+        server.start(0, address='127.0.0.1', unix_path=path)
+
+        try:
+            for transport, address in (('tcp', '127.0.0.1'),
+                                       ('unix', 'unix://' + path)):
+                sender = raw_connect(server.port, transport + '_sender',
+                                     address)
+                receiver = raw_connect(server.port, transport + '_receiver',
+                                       address)
+
+                message = 'PACKAGE text/plain FROM {0}_sender TO ' \
+                    '{0}_receiver WITH {1}\n'.format(transport, size).encode(
+                        'utf-8') + b'x' * size
+
+                # latency of single packages
+                latencies = []
+                buffer = b''
+                for i in range(n // 10):
+                    with Timer() as timer:
+                        sender.sendall(message)
+                        dummy, buffer = recv_package(receiver, buffer)
+                    latencies.append(timer.elapsed)
+
+                latencies.sort()
+                name = "{} ({} bytes)".format(transport, size)
+                report(name + " mean latency",
+                       sum(latencies) / len(latencies) * 1e6, 'us')
+                report(name + " p99 latency",
+                       latencies[int(len(latencies) * 0.99) - 1] * 1e6, 'us')
+
+                # throughput
+                buffer = b''
+
+                def send():
+                    for i in range(n):
+                        sender.sendall(message)
+
+                with Timer() as timer:
+                    thread = threading.Thread(target=send)
+                    thread.start()
+                    for i in range(n):
+                        dummy, buffer = recv_package(receiver, buffer)
+                    thread.join()
+
+                report(name + " throughput", n / timer.elapsed, 'msg/s')
+
+                sender.close()
+                receiver.close()
+        finally:
+            server.stop()
+
+
+def bench_fanout(n=500, repeat=20, size=1024):
+    """Measure the latency of broadcasting a package to `n` clients."""
+    for workers in (None, 4, 16):
+        server = ectecserver.Server(QuietHandler, fanout_workers=workers)
+        server.start(0, address='127.0.0.1')
+
+        sender = raw_connect(server.port, 'fanout_sender')
+        receivers = connect_clients(server, n)
+
+        message = 'PACKAGE text/plain FROM fanout_sender TO all WITH ' \
+            '{}\n'.format(size).encode('utf-8') + b'x' * size
+
+        # a receiver got the package when it got all bytes of it
+        expected = len(message)
+
+        last = []
+        mean = []
+        with selectors.DefaultSelector() as selector:
+            for sock in receivers:
+                selector.register(sock, selectors.EVENT_READ)
+
+            for i in range(repeat):
+                received = {sock: 0 for sock in receivers}
+                latencies = []
+
+                with Timer() as timer:
+                    sender.sendall(message)
+                    while len(latencies) < n:
+                        for key, dummy in selector.select(1):
+                            sock = key.fileobj
+                            if received[sock] >= expected:
+                                continue
+                            received[sock] += len(sock.recv(65536))
+                            if received[sock] >= expected:
+                                latencies.append(time.perf_counter() -
+                                                 timer.start)
+
+                last.append(max(latencies))
+                mean.append(sum(latencies) / n)
+
+        server.stop()
+        sender.close()
+        for sock in receivers:
+            sock.close()
+
+        name = "fan-out to {} ({} workers)".format(n, workers or 'no')
+        report(name + " mean latency", sum(mean) / repeat * 1e3, 'ms')
+        report(name + " last-recipient latency",
+               sum(last) / repeat * 1e3, 'ms')
+
+
+def bench_logging(n=20000, size=256):
+    """Compare the forwarding throughput with different logging setups."""
+    logs = ectec.logs
+    root = logs.getLogger('ectec')
+    packages = logs.getLogger('ectec.server.packages')
+    old_level = root.level
+
+    with tempfile.TemporaryDirectory() as directory:
+        handler = logging.FileHandler(osp.join(directory, 'ectec.log'))
+        handler.setFormatter(logs.EctecFormatter())
+
+        for setup in ('disabled', 'info', 'info queued', 'info rate limited'):
+            root.setLevel(logs.WARNING if setup == 'disabled' else logs.INFO)
+            root.addHandler(handler)
+            queued = logs.QueueLogging(root) if setup == 'info queued' \
+                else None
+            limit = logs.RateLimitFilter(100) \
+                if setup == 'info rate limited' else None
+
+            if queued:
+                queued.start()
+            if limit:
+                packages.addFilter(limit)
+
+            server = ectecserver.Server(QuietHandler)
+            server.start(0, address='127.0.0.1')
+            try:
+                sender = raw_connect(server.port, 'log_sender')
+                receiver = raw_connect(server.port, 'log_receiver')
+
+                message = 'PACKAGE text/plain FROM log_sender TO ' \
+                    'log_receiver WITH {}\n'.format(size).encode('utf-8') + \
+                    b'x' * size
+
+                def send():
+                    for i in range(n):
+                        sender.sendall(message)
+
+                buffer = b''
+                with Timer() as timer:
+                    thread = threading.Thread(target=send)
+                    thread.start()
+                    for i in range(n):
+                        dummy, buffer = recv_package(receiver, buffer)
+                    thread.join()
+
+                sender.close()
+                receiver.close()
+            finally:
+                server.stop()
+                if queued:
+                    queued.stop()
+                if limit:
+                    packages.removeFilter(limit)
+                root.removeHandler(handler)
+
+            report("logging {} throughput".format(setup), n / timer.elapsed,
+                   'msg/s')
+
+        handler.close()
+
+    root.setLevel(old_level)
+
+
+BENCHMARKS = {
+    'stop': bench_stop,
+    'connect_storm': bench_connect_storm,
+    'transport': bench_transport,
+    'fanout': bench_fanout,
+    'logging': bench_logging
+}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('benchmarks',
+                        nargs='*',
+                        help="The benchmarks to run out of {}. Default: all"
+                        .format(', '.join(BENCHMARKS)))
+    args = parser.parse_args()
+
+    for name in args.benchmarks or BENCHMARKS:
+        BENCHMARKS[name]()
@@ -0,0 +1,461 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmarks for the package storages of `ectec.client`.
+
+***********************************
+
+Created on Mon Oct 19 17:48:20 2026
+
+Copyright (C) 2020 real-yfprojects (github.com user)
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+import argparse
+import datetime
+import os
+import os.path as osp
+import random
+import tempfile
+import time
+import tracemalloc
+
+from . import Timer, _import_ectec, report
+
+ectec = _import_ectec('client', 'storage')
+ectecclient = ectec.client
+ectecstorage = ectec.storage
+
+#: The number of different users sending and receiving the packages.
+USERS = 1000
+
+#: The content types of the packages.
+TYPES = ('text/plain', 'image/png', 'application/octet-stream')
+
+
+def iter_packages(n, seed=0):
+    """
+    Create `n` packages between `USERS` users.
+
+    Every tenth package is sent to three users. Bodies are empty so the
+    storage itself is measured.
+    """
+    rand = random.Random(seed)
+    users = ['user{}'.format(i) for i in range(USERS)]
+
+    for i in range(n):
+        recipients = rand.sample(users, 3 if i % 10 == 0 else 1)
+        yield ectecclient.Package(rand.choice(users), recipients,
+                                  rand.choice(TYPES), float(i))
+
+
+def make_packages(n, seed=0):
+    """Create a list of `n` packages like `iter_packages`."""
+    return list(iter_packages(n, seed))
+
+
+def scan(storage, **kwargs):
+    """Filter `storage` by comparing every package like before indexing."""
+    return [
+        pkg for pkg in storage.package_list
+        if all(getattr(pkg, k) == v for k, v in kwargs.items())
+    ]
+
+
+def bench_filter(n=1000000, repeat=20):
+    """Measure filtering `n` stored packages with and without indexes."""
+    packages = make_packages(n)
+    storage = ectecclient.PackageStorage()
+
+    with Timer() as timer:
+        storage.add(as_list=packages)
+    report("storage add {} packages".format(n), timer.elapsed, 's')
+
+    queries = [{'sender': 'user{}'.format(i)} for i in range(repeat)]
+    queries += [{'recipient': ('user{}'.format(i), )} for i in range(repeat)]
+    queries += [{
+        'sender': 'user{}'.format(i),
+        'type': TYPES[i % len(TYPES)]
+    } for i in range(repeat)]
+
+    for query in queries[:3]:
+        assert list(storage.filter(**query)) == scan(storage, **query)
+
+    for name, group in (('sender', queries[:repeat]),
+                        ('recipient', queries[repeat:2 * repeat]),
+                        ('sender and type', queries[2 * repeat:])):
+        with Timer() as timer:
+            for query in group:
+                list(storage.filter(**query))
+        indexed = timer.elapsed / repeat
+        report("storage filter {} indexed".format(name), indexed * 1000, 'ms')
+
+        with Timer() as timer:
+            for query in group[:3]:
+                scan(storage, **query)
+        linear = timer.elapsed / 3
+        report("storage filter {} linear scan".format(name), linear * 1000,
+               'ms')
+
+    recipients = ['user{}'.format(i) for i in range(5)]
+    with Timer() as timer:
+        for i in range(repeat):
+            list(storage.filter_recipient(recipients[0]))
+    report("storage filter_recipient one", timer.elapsed / repeat * 1000,
+           'ms')
+
+    with Timer() as timer:
+        for i in range(repeat):
+            list(storage.filter_recipient(*recipients))
+    report("storage filter_recipient five", timer.elapsed / repeat * 1000,
+           'ms')
+
+    with Timer() as timer:
+        for pkg in packages[-1000:]:
+            assert pkg in storage
+    report("storage contains", timer.elapsed / 1000 * 1e6, 'us')
+
+    with Timer() as timer:
+        storage.remove(*packages[-1000:])
+    report("storage remove", timer.elapsed / 1000 * 1e6, 'us')
+
+
+def bench_soak(n=200000, size=1024, checkpoints=5):
+    """Check that bounded storages keep their memory use while adding."""
+    limits = {
+        'fifo': dict(max_packages=5000),
+        'oldest': dict(max_packages=5000,
+                       eviction=ectecclient.Eviction.OLDEST),
+        'content': dict(max_bytes=1 << 20,
+                        max_packages=20000,
+                        eviction=ectecclient.Eviction.CONTENT),
+    }
+
+    for name, kwargs in limits.items():
+        storage = ectecclient.PackageStorage(**kwargs)
+        rand = random.Random(0)
+        usage = []
+
+        tracemalloc.start()
+        try:
+            with Timer() as timer:
+                for i in range(n):
+                    pkg = ectecclient.Package(
+                        'user{}'.format(rand.randrange(USERS)),
+                        'user{}'.format(rand.randrange(USERS)), TYPES[i % 3],
+                        rand.random() * n)
+                    pkg.content = b'x' * size
+                    storage.add(pkg)
+
+                    if (i + 1) % (n // checkpoints) == 0:
+                        usage.append(tracemalloc.get_traced_memory()[0])
+        finally:
+            tracemalloc.stop()
+
+        report("storage soak {} adds".format(name), n / timer.elapsed,
+               'pkg/s')
+        report("storage soak {} memory after {}".format(
+            name, n // checkpoints), usage[0] / (1 << 20), 'MiB')
+        report("storage soak {} memory after {}".format(name, n),
+               usage[-1] / (1 << 20), 'MiB')
+        report("storage soak {} packages stored".format(name), len(storage))
+
+
+def bench_sqlite(n=100000, batch=100, size=256):
+    """Measure the `SqlitePackageStorage` with `n` packages on disk."""
+    packages = make_packages(n)
+    for pkg in packages:
+        pkg.content = b'x' * size
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = osp.join(directory, 'history.db')
+        with ectecstorage.SqlitePackageStorage(path) as storage:
+            with Timer() as timer:
+                for i in range(0, n, batch):
+                    storage.add(as_list=packages[i:i + batch])
+            report("sqlite add in batches of {}".format(batch),
+                   n / timer.elapsed, 'pkg/s')
+            report("sqlite file size", os.path.getsize(path) / (1 << 20),
+                   'MiB')
+
+        # reopen like after a restart
+        with Timer() as timer:
+            storage = ectecstorage.SqlitePackageStorage(path)
+        report("sqlite open", timer.elapsed * 1000, 'ms')
+
+        with storage:
+            with Timer() as timer:
+                count = sum(1 for pkg in storage)
+            report("sqlite iterate metadata", count / timer.elapsed, 'pkg/s')
+
+            with Timer() as timer:
+                for i in range(20):
+                    list(storage.filter(sender='user{}'.format(i)))
+            report("sqlite filter sender", timer.elapsed / 20 * 1000, 'ms')
+
+            with Timer() as timer:
+                for i in range(20):
+                    list(storage.filter_recipient('user{}'.format(i)))
+            report("sqlite filter_recipient", timer.elapsed / 20 * 1000, 'ms')
+
+            tracemalloc.start()
+            try:
+                for pkg in storage:
+                    pass
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+            report("sqlite iterate memory peak", peak / (1 << 20), 'MiB')
+
+
+def bench_archive(n=16384, size=1 << 16):
+    """Measure the memory of a history of `n` bodies of `size` bytes."""
+    rand = random.Random(0)
+    body = bytes(rand.getrandbits(8) for i in range(size))
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = osp.join(directory, 'bodies.archive')
+        tracemalloc.start()
+        try:
+            with ectecstorage.ArchivePackageStorage(path) as storage:
+                with Timer() as timer:
+                    for i in range(n):
+                        pkg = ectecclient.Package(
+                            'user{}'.format(rand.randrange(USERS)),
+                            'user{}'.format(rand.randrange(USERS)),
+                            TYPES[i % 3], float(i))
+                        pkg.content = body
+                        storage.add(pkg)
+                        del pkg
+                memory = tracemalloc.get_traced_memory()[0]
+
+                report("archive history size",
+                       storage.archive.size / (1 << 30), 'GiB')
+                report("archive add", storage.archive.size / timer.elapsed /
+                       (1 << 20), 'MiB/s')
+                report("archive memory with history", memory / (1 << 20),
+                       'MiB')
+
+                with Timer() as timer:
+                    for pkg in storage.filter(sender='user1'):
+                        len(pkg.content)
+                    for pkg in list(storage)[::64]:
+                        len(pkg.view())
+                report("archive read bodies", timer.elapsed * 1000, 'ms')
+        finally:
+            tracemalloc.stop()
+
+
+def bench_columnar(n=1000000, batch=10000, repeat=20):
+    """Compare the `ColumnarPackageStorage` to the `PackageStorage`."""
+    storages = {}
+    for name, factory in (('list', ectecclient.PackageStorage),
+                          ('columnar', ectecstorage.ColumnarPackageStorage)):
+        packages = iter_packages(n)
+
+        tracemalloc.start()
+        try:
+            storage = factory()
+            with Timer() as timer:
+                while True:
+                    chunk = [pkg for pkg, i in zip(packages, range(batch))]
+                    if not chunk:
+                        break
+                    storage.add(as_list=chunk)
+            del chunk
+            memory = tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+
+        storages[name] = storage
+        report("{} storage memory per package".format(name), memory / n, 'B')
+        report("{} storage add (traced)".format(name), n / timer.elapsed,
+               'pkg/s')
+
+    for name, storage in storages.items():
+        for keyword, values in (('sender', ['user{}'.format(i)
+                                            for i in range(repeat)]),
+                                ('recipient', [('user{}'.format(i), )
+                                               for i in range(repeat)])):
+            with Timer() as timer:
+                for value in values:
+                    list(storage.filter(**{keyword: value}))
+            report("{} storage filter {}".format(name, keyword),
+                   timer.elapsed / repeat * 1000, 'ms')
+
+        with Timer() as timer:
+            count = sum(1 for pkg in storage)
+        report("{} storage iterate".format(name), count / timer.elapsed,
+               'pkg/s')
+
+
+def bench_time(n=1000000):
+    """Measure setting and comparing the time of `n` received packages."""
+    packages = make_packages(n)
+    now = time.time()
+
+    with Timer() as timer:
+        for pkg in packages:
+            pkg.time = now
+    report("package set timestamp", n / timer.elapsed, 'pkg/s')
+
+    with Timer() as timer:
+        for pkg in packages:
+            pkg.time = datetime.datetime.fromtimestamp(now)
+    report("package set datetime", n / timer.elapsed, 'pkg/s')
+
+    with Timer() as timer:
+        sorted(packages, key=lambda pkg: pkg.timestamp)
+    report("package sort by timestamp", n / timer.elapsed, 'pkg/s')
+
+    with Timer() as timer:
+        sorted(packages, key=lambda pkg: pkg.time)
+    report("package sort by datetime", n / timer.elapsed, 'pkg/s')
+
+
+def bench_range(n=1000000, repeat=20, late=0.01):
+    """Measure time range queries on `n` packages, some out of order."""
+    rand = random.Random(0)
+    packages = make_packages(n)
+    for pkg in packages:
+        if rand.random() < late:
+            pkg.time = pkg.timestamp - rand.random() * 100
+
+    storage = ectecclient.PackageStorage()
+    with Timer() as timer:
+        storage.add(as_list=packages)
+    report("range storage add {} packages".format(n), timer.elapsed, 's')
+
+    # the last 600 packages were received in the last 10 minutes
+    start = float(n - 600)
+    assert list(storage.since(start)) == sorted(
+        storage.filter(lambda pkg: pkg.timestamp >= start),
+        key=lambda pkg: pkg.timestamp)
+
+    with Timer() as timer:
+        for i in range(repeat):
+            list(storage.since(start))
+    report("range since indexed", timer.elapsed / repeat * 1000, 'ms')
+
+    with Timer() as timer:
+        for i in range(3):
+            list(storage.filter(lambda pkg: pkg.timestamp >= start))
+    report("range since linear scan", timer.elapsed / 3 * 1000, 'ms')
+
+    with Timer() as timer:
+        for i in range(repeat):
+            page = n // repeat * i
+            list(storage.range(page, page + 100))
+    report("range page of 100", timer.elapsed / repeat * 1e6, 'us')
+
+
+def make_messages(n, words=20000, length=8, seed=0):
+    """Create `n` text packages of `length` words out of `words` words."""
+    rand = random.Random(seed)
+    vocabulary = ['word{}'.format(i) for i in range(words)]
+    # a few words are much more common than others
+    weights = [1 / (i + 1) for i in range(words)]
+
+    packages = make_packages(n, seed)
+    for pkg in packages:
+        pkg.type = 'text/plain'
+        pkg.content = ' '.join(rand.choices(vocabulary, weights,
+                                            k=length)).encode('utf-8')
+    return packages
+
+
+def bench_search(n=500000, batch=100, repeat=20):
+    """Measure searching `n` text messages with and without an index."""
+    packages = make_messages(n)
+
+    for name, index in (('unindexed', None),
+                        ('indexed', ectecclient.TextIndex())):
+        storage = ectecclient.PackageStorage(text_index=index)
+        with Timer() as timer:
+            for i in range(0, n, batch):
+                storage.add(as_list=packages[i:i + batch])
+        report("search {} add on the receiving thread".format(name),
+               n / timer.elapsed, 'pkg/s')
+
+    with Timer() as timer:
+        index.wait()
+    report("search index ready after adding", timer.elapsed, 's')
+
+    tracemalloc.start()
+    try:
+        memory_index = ectecclient.TextIndex()
+        memory_index.add(enumerate(packages))
+        memory_index.wait()
+        memory = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del memory_index
+    report("search index memory per package", memory / n, 'B')
+
+    def scan(word, limit):
+        needle = word.encode('utf-8')
+        hits = []
+        for pkg in reversed(storage.package_list):
+            if needle in pkg.content.lower():
+                hits.append(pkg)
+                if len(hits) == limit:
+                    break
+        return hits
+
+    queries = (('common word', 'word1 '), ('rare word', 'word19999 '),
+               ('two words', 'word3 word5 '), ('prefix', 'word123'),
+               ('short prefix', 'word1'))
+    for name, query in queries:
+        with Timer() as timer:
+            for i in range(repeat):
+                hits = storage.search(query, limit=50)
+        report("search {} ({} hits) indexed".format(name, len(hits)),
+               timer.elapsed / repeat * 1000, 'ms')
+
+    # substring matching like before, only comparable for single words
+    for name, query in queries[:2]:
+        with Timer() as timer:
+            scan(query.strip(), 50)
+        report("search {} linear scan".format(name), timer.elapsed * 1000,
+               'ms')
+
+    with Timer() as timer:
+        storage.remove(*packages[:batch * 10])
+        index.wait()
+    report("search remove from index", timer.elapsed / (batch * 10) * 1e6,
+           'us')
+
+
+BENCHMARKS = {
+    'filter': bench_filter,
+    'soak': bench_soak,
+    'sqlite': bench_sqlite,
+    'archive': bench_archive,
+    'columnar': bench_columnar,
+    'time': bench_time,
+    'range': bench_range,
+    'search': bench_search,
+}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('benchmarks',
+                        nargs='*',
+                        help="The benchmarks to run out of {}. Default: all"
+                        .format(', '.join(BENCHMARKS)))
+    args = parser.parse_args()
+
+    for name in args.benchmarks or BENCHMARKS:
+        BENCHMARKS[name]()
@@ -292,6 +292,11 @@ Eine Lizenzdatei sollte aber dennoch Anwendungsordner vorliegen.</translation>
     </message>
     <message>
         <location filename="clientUser.ui" line="203"/>
+        <source>Search</source>
+        <translation>Suchen</translation>
+    </message>
+    <message>
+        <location filename="clientUser.ui" line="213"/>
         <source>Disconnect</source>
         <translation>Trennen</translation>
     </message>
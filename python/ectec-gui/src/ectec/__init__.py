@@ -29,7 +29,8 @@
 """
 
 import enum
-from collections import namedtuple
+import hashlib
+from collections import OrderedDict, namedtuple
 from typing import Callable, Iterable, List, Optional, Union
 
 from . import logs
@@ -84,6 +85,114 @@ class IncompatibleVersion(ConnectException):
 Address.port.__doc__ = "The port of the socket"
 
 
+def content_hash(content: bytes) -> str:
+    """
+    Compute the hash identifying the body of a package.
+
+    Parameters
+    ----------
+    content : bytes
+        The body.
+
+    Returns
+    -------
+    str
+        The hex encoded SHA-256 digest.
+
+    """
+    return hashlib.sha256(content).hexdigest()
+
+
+class BodyCache:
+    """
+    A LRU cache of package bodies keyed by their hash.
+
+    This is used for deduplicating package bodies. Both ends of a connection
+    keep a cache of the same size for each direction and update it on the
+    same commands in the same order. So the sender knows which bodies the
+    receiver holds and can send a reference instead.
+
+    Parameters
+    ----------
+    max_entries : int
+        The maximum number of bodies kept.
+
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._bodies = OrderedDict()
+
+    def __contains__(self, digest: str):
+        return digest in self._bodies
+
+    def __len__(self):
+        return len(self._bodies)
+
+    def items(self):
+        """
+        Get the cached hashes and bodies.
+
+        Returns
+        -------
+        list of (str, bytes)
+            The hashes and bodies from the least to the most recently used.
+
+        """
+        return list(self._bodies.items())
+
+    def get(self, digest: str):
+        """
+        Get a body and mark it as recently used.
+
+        Parameters
+        ----------
+        digest : str
+            The hash of the body.
+
+        Returns
+        -------
+        bytes or None
+            The body or None if it isn't cached.
+
+        """
+        if digest not in self._bodies:
+            return None
+
+        self._bodies.move_to_end(digest)
+        return self._bodies[digest]
+
+    def put(self, digest: str, body: bytes) -> bytes:
+        """
+        Cache a body and mark it as recently used.
+
+        The least recently used body is dropped if the cache is full.
+
+        Parameters
+        ----------
+        digest : str
+            The hash of the body.
+        body : bytes or None
+            The body. None to only track the hash.
+
+        Returns
+        -------
+        bytes
+            The cached body. If an equal body was cached already, that one is
+            returned so that the body is held only once.
+
+        """
+        if digest in self._bodies:
+            self._bodies.move_to_end(digest)
+            return self._bodies[digest]
+
+        self._bodies[digest] = body
+        if len(self._bodies) > self.max_entries:
+            self._bodies.popitem(last=False)
+
+        return body
+
+
 class AbstractPackage:
     """
     A package being sent using ectec.
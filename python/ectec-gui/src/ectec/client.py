@@ -24,17 +24,24 @@
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 """
-import copy
+import bisect
+import collections
 import datetime
+import enum
+import heapq
+import io
 import re
 import socket
+import tempfile
 import threading
 import time
-from typing import Callable, Iterator, List, Optional, Union
+from typing import (BinaryIO, Callable, Dict, Iterator, List, Optional, Set,
+                    Union)
 
 from . import (VERSION, AbstractPackage, AbstractPackageStorage,
-               AbstractUserClient, Address, ConnectException, EctecException,
-               Role, logs)
+               AbstractUserClient, Address, BodyCache, ConnectException,
+               EctecException, Role, content_hash, logs)
+from .search import TextIndex
 
 # ---- Logging
 
@@ -80,6 +87,9 @@ def __init__(self, logger, client_type: str, extra=None):
                          (extra if extra else {}).update({'ct': client_type}))
         self.client_type = client_type
 
+        # formatted once instead of for every message
+        self.prefix = "[{}] ".format(client_type)
+
     def process(self, msg, kwargs):
         """
         Process the log record, add ip info to msg.
@@ -99,13 +109,24 @@ def process(self, msg, kwargs):
             DESCRIPTION.
 
         """
-        msg = "[{}] {msg}".format(self.client_type, msg=msg)
-        return super().process(msg, kwargs)
+        return super().process(self.prefix + str(msg), kwargs)
 
 
 # ---- Package Managment
 
 
+def _timestamp(value) -> Optional[float]:
+    """Convert None, a number or a datetime to a timestamp."""
+    if value is None:
+        return None
+    if isinstance(value, (float, int)):
+        return float(value)
+    if isinstance(value, datetime.datetime):
+        return value.timestamp()
+
+    raise TypeError(f"Unsupported type for `time`: {type(value)}")
+
+
 class Package(AbstractPackage):
     """
     A package being sent using ectec.
@@ -129,17 +150,25 @@ class Package(AbstractPackage):
     sender : str
         The user who sends the package.
     recipient : tuple of str
-        The users this package is sent to.
+        The users this package is sent to. Groups start with `#`.
+    groups : tuple of str
+        The names of the groups this package is sent to.
     type : str
         The content type.
     content : bytes
-        The body of the package.
+        The body of the package. Large bodies are read from `file`.
+    file : file-like object or None
+        The file holding the body of a large package. None if the body is
+        held in memory.
     time : datetime.datetime
         The time the package was received. Might be None.
+    timestamp : float
+        The time the package was received in seconds since the epoch.
+        Might be None. `time` is created from it when read.
 
     """
 
-    __slots__ = ['__time']
+    __slots__ = ['timestamp', '__content', '__hash', 'file']
 
     def __init__(self,
                  sender: str,
@@ -164,6 +193,7 @@ def __init__(self,
         super().__init__(sender, recipient, typ)
         self.sender = sender
         self.type = typ
+        self.file = None
         self.content = b""
         self.time = time
 
@@ -173,18 +203,99 @@ def __init__(self,
         else:
             self.recipient = tuple(recipient)
 
+    @property
+    def content(self) -> bytes:
+        """
+        Get the `content` property.
+
+        If the body is stored in `file` it is read completely.
+        Use `open` to read it in parts.
+
+        Returns
+        -------
+        bytes
+            The body of the package.
+
+        """
+        if self.file is not None:
+            self.file.seek(0)
+            return self.file.read()
+
+        return self.__content
+
+    @content.setter
+    def content(self, value: bytes):
+        """Set the `content` property. This replaces the `file`."""
+        self._set_content(value)
+
+    def _set_content(self, value: bytes):
+        """Hold a body in memory. Subclasses overriding `content` use this."""
+        self.__content = value
+        self.file = None
+
+    @property
+    def groups(self) -> tuple:
+        """
+        Get the `groups` property.
+
+        Returns
+        -------
+        tuple of str
+            The names of the groups among the recipients (without `#`).
+
+        """
+        return tuple(recipient[1:] for recipient in self.recipient
+                     if recipient.startswith('#'))
+
+    @property
+    def size(self) -> int:
+        """
+        Get the `size` property.
+
+        Returns
+        -------
+        int
+            The length of the body in bytes.
+
+        """
+        if self.file is not None:
+            return self.file.seek(0, io.SEEK_END)
+
+        return len(self.__content)
+
+    def open(self) -> BinaryIO:
+        """
+        Get the body as a readable file-like object.
+
+        Returns
+        -------
+        file-like object
+            `file` (rewound) or a BytesIO object for the content.
+
+        """
+        if self.file is not None:
+            self.file.seek(0)
+            return self.file
+
+        return io.BytesIO(self.__content)
+
     @property
     def time(self) -> datetime.datetime:
         """
         Get the `time` property.
 
+        The datetime is created from `timestamp` on every access.
+
         Returns
         -------
         datetime.datetime or None
-            The time the package was received.
+            The time the package was received (local time).
 
         """
-        return self.__time
+        if self.timestamp is None:
+            return None
+
+        return datetime.datetime.fromtimestamp(self.timestamp)
 
     @time.setter
     def time(self, value):
@@ -194,7 +305,7 @@ def time(self, value):
         Parameters
         ----------
         value : None, number or datetime.datetime
-            DESCRIPTION.
+            The time as a timestamp or datetime.
 
         Raises
         ------
@@ -202,41 +313,79 @@ def time(self, value):
             Tried to set to an unsupported type.
 
         """
-        # handle `time` types
-        if value is None:
-            self.__time = None
-        elif isinstance(value, (float, int)):
-            self.__time = datetime.datetime.fromtimestamp(value)
-        elif isinstance(value, datetime.datetime):
-            self.__time = value
-        else:
-            raise TypeError(f"Unsupported type for `time`: {type(time)}")
+        self.timestamp = _timestamp(value)
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+
+        # any change invalidates the cached hash
+        if name != '_Package__hash':
+            object.__setattr__(self, '_Package__hash', None)
 
     def __hash__(self):
-        return hash(
-            (self.sender, self.recipient, self.type, self.time, self.content))
+        # the body is left out since it might have to be read from `file`
+        if self.__hash is None:
+            self.__hash = hash((self.sender, self.recipient, self.type,
+                                self.timestamp, self.size))
+        return self.__hash
 
     def __eq__(self, o):
         if not isinstance(o, AbstractPackage):
             return False
 
+        if not isinstance(o, Package):
+            return (self.sender == o.sender and self.recipient == o.recipient
+                    and self.type == o.type and self.time == o.time
+                    and self.content == o.content)
+
+        if hash(self) != hash(o):
+            return False  # avoids comparing the content
+
         return (self.sender == o.sender and self.recipient == o.recipient
-                and self.type == o.type and self.content == o.content
-                and self.time == o.time)
+                and self.type == o.type and self.timestamp == o.timestamp
+                and self._same_body(o))
+
+    def _same_body(self, o: 'Package') -> bool:
+        """Compare the bodies. Files are read in parts."""
+        if self.file is None and o.file is None:
+            return self.content == o.content
+
+        if self.size != o.size:
+            return False
+
+        mine, theirs = self.open(), o.open()
+        if mine is theirs:
+            return True
+
+        while True:
+            chunk = mine.read(1 << 16)
+            if chunk != theirs.read(len(chunk)):
+                return False
+            if not chunk:
+                return True
 
     def __str__(self):
-        if not self.time:
+        if self.timestamp is None:
             template = "<Package type={} sender={} recipients={}>"
             return template.format(self.type, self.sender, str(self.recipient))
 
         template = "<Package type={} sender={} recipients={} time={}>"
         return template.format(self.type, self.sender, str(self.recipient),
-                               str(self.time.timestamp()))
+                               str(self.timestamp))
 
     def __repr__(self):
         return str(self)
 
 
+class Eviction(enum.Enum):
+    """
+    The policies making room in a bounded `PackageStorage`.
+    """
+    FIFO = 'fifo'  #: remove the packages in the order they were added
+    OLDEST = 'oldest'  #: remove the packages with the oldest `time` first
+    CONTENT = 'content'  #: drop the oldest bodies but keep the packages
+
+
 class PackageStorage(AbstractPackageStorage):
     """
     A storage and a manager for packages.
@@ -245,6 +394,20 @@ class PackageStorage(AbstractPackageStorage):
     contains a package. It also supports the `len` function to get the number
     of packages stored. And the `PackageStorage` is an iterable.
 
+    Parameters
+    ----------
+    max_packages : int, optional
+        The maximum number of packages stored. The default is None.
+    max_bytes : int, optional
+        The maximum size of the bodies stored. The default is None.
+    eviction : Eviction, optional
+        The policy making room when a limit is exceeded.
+        The default is `Eviction.FIFO`.
+    on_evict : callable(List[Package]), optional
+        Called with the packages evicted by `add`. The default is None.
+    text_index : TextIndex, optional
+        The index used by `search`. The default is None.
+
     Examples
     --------
     >>> storage = PackageStorage()
@@ -281,14 +444,368 @@ class PackageStorage(AbstractPackageStorage):
     The method filters out all the Packages in the storage that have a sender
     called 'somesender'. In this case that's only `package1`.
 
+    Notes
+    -----
+    Every package added gets a stable id. The packages are indexed by
+    their id, their value, their sender, each of their recipients and their
+    type. `filter`, `remove` and the in-statement use these indexes.
+    Therefore a package must not be changed while it is stored. A package
+    changed anyway is only removed when the stored object is passed. `range`
+    and `since` look up the packages in an index sorted by their time.
+    If there is a `text_index` the bodies of the text packages are indexed
+    in its thread for `search`.
+
+    When a limit is exceeded `add` evicts packages according to the
+    `eviction` policy. `Eviction.CONTENT` replaces the bodies by empty
+    ones to satisfy `max_bytes`. Packages exceeding `max_packages` are
+    removed in the order they were added then.
+
     """
 
-    def __init__(self):
+    #: The attributes of `Package` that are indexed.
+    INDEXED = ('sender', 'recipient', 'type')
+
+    def __init__(self,
+                 max_packages: Optional[int] = None,
+                 max_bytes: Optional[int] = None,
+                 eviction: Eviction = Eviction.FIFO,
+                 on_evict: Optional[Callable[[List[Package]], None]] = None,
+                 text_index: Optional[TextIndex] = None):
         """
         Init.
 
         """
-        self.package_list: List[Package] = []
+        self.max_packages = max_packages
+        self.max_bytes = max_bytes
+        self.eviction = Eviction(eviction)
+        self.on_evict = on_evict
+        self.text_index = text_index
+
+        #: bytes - the size of the bodies stored
+        self.size = 0
+
+        #: id -> size of the body
+        self._sizes: Dict[int, int] = {}
+
+        #: heap of (key, id) in the order of eviction
+        self._order: List[tuple] = []
+
+        #: ids of the packages with a body in the order they were added
+        self._bodies: collections.deque = collections.deque()
+
+        #: wether `_order` and `_bodies` list all packages
+        self._ordered = True
+
+        #: id -> package in the order they were added
+        self.packages: Dict[int, Package] = {}
+
+        #: attribute -> value -> id -> package in the order they were added
+        self.indexes: Dict[str, Dict[str, Dict[int, Package]]] = {
+            attribute: {}
+            for attribute in self.INDEXED
+        }
+
+        #: hash -> id or ids of the stored packages with that hash
+        self._equal: Dict[int, Union[int, Dict[int, None]]] = {}
+
+        #: id -> hash of the package when it was stored
+        self._hashes: Dict[int, int] = {}
+
+        #: sorted timestamps of the packages added with a time
+        self._times: List[float] = []
+
+        #: ids of the packages in the order of `_times`
+        self._time_ids: List[int] = []
+
+        #: number of entries in `_time_ids` of removed packages
+        self._times_removed = 0
+
+        self._next_id = 0
+
+    @property
+    def package_list(self) -> List[Package]:
+        """
+        Get the `package_list` property.
+
+        Returns
+        -------
+        List[Package]
+            The packages in the order they were added. Changing the list
+            doesn't change the storage.
+
+        """
+        return list(self.packages.values())
+
+    @staticmethod
+    def index_keys(package: Package) -> Iterator[tuple]:
+        """
+        Get the index entries of a package.
+
+        Parameters
+        ----------
+        package : Package
+            The package.
+
+        Yields
+        ------
+        tuple of (str, str)
+            The indexed attribute and the value the package is listed under.
+
+        """
+        yield 'sender', package.sender
+        yield 'type', package.type
+        for recipient in set(package.recipient):
+            yield 'recipient', recipient
+
+    def _index(self, packages: List[Package]) -> List[int]:
+        """Store packages under new ids and add them to the indexes."""
+        start = self._next_id
+        self._next_id += len(packages)
+
+        senders = self.indexes['sender']
+        recipients = self.indexes['recipient']
+        types = self.indexes['type']
+
+        # the order is only maintained if there is a limit
+        bounded = self.max_packages is not None or self.max_bytes is not None
+        self._ordered = self._ordered and bounded
+
+        # `setdefault` would create a dict for every call
+        for package_id, pkg in enumerate(packages, start):
+            self.packages[package_id] = pkg
+            self._add_equal(pkg, package_id)
+
+            timestamp = pkg.timestamp
+            if timestamp is not None:
+                if not self._times or timestamp >= self._times[-1]:
+                    self._times.append(timestamp)
+                    self._time_ids.append(package_id)
+                else:
+                    # packages arrive in time order almost always
+                    i = bisect.bisect_right(self._times, timestamp)
+                    self._times.insert(i, timestamp)
+                    self._time_ids.insert(i, package_id)
+
+            size = pkg.size
+            self._sizes[package_id] = size
+            self.size += size
+            if bounded:
+                key = self.eviction_key(package_id, pkg)
+                heapq.heappush(self._order, (key, package_id))
+                if size:
+                    self._bodies.append(package_id)
+
+            for index, values in ((senders, (pkg.sender, )),
+                                  (types, (pkg.type, )),
+                                  (recipients, set(pkg.recipient))):
+                for value in values:
+                    entry = index.get(value)
+                    if entry is None:
+                        index[value] = {package_id: pkg}
+                    else:
+                        entry[package_id] = pkg
+
+        if self.text_index is not None:
+            self.text_index.add(list(zip(range(start, self._next_id),
+                                         packages)))
+
+        return list(range(start, self._next_id))
+
+    def _add_equal(self, pkg: Package, package_id: int) -> None:
+        """Register the id of a stored package by its hash."""
+        key = self._hashes[package_id] = hash(pkg)
+        equal = self._equal.get(key)
+        if equal is None:
+            self._equal[key] = package_id
+        elif isinstance(equal, int):
+            self._equal[key] = {equal: None, package_id: None}
+        else:
+            equal[package_id] = None
+
+    def _remove_equal(self, package_id: int) -> None:
+        """Unregister the id of a stored package."""
+        key = self._hashes.pop(package_id)
+        equal = self._equal[key]
+        if isinstance(equal, int):
+            del self._equal[key]
+        else:
+            del equal[package_id]
+            if len(equal) == 1:
+                self._equal[key], = equal
+
+    def _unindex(self, package_id: int) -> None:
+        """Remove a stored package from the storage and the indexes."""
+        pkg = self.packages.pop(package_id)
+        self._remove_equal(package_id)
+        self.size -= self._sizes.pop(package_id)
+
+        if pkg.timestamp is not None:
+            self._times_removed += 1
+            if self._times_removed > len(self.packages) + 1024:
+                self._compact_times()
+
+        if self.text_index is not None:
+            self.text_index.remove((package_id, ))
+
+        for attribute, value in self.index_keys(pkg):
+            index = self.indexes[attribute]
+            del index[value][package_id]
+            if not index[value]:
+                del index[value]
+
+    def _compact_times(self) -> None:
+        """Drop the entries of removed packages from the time index."""
+        entries = [(timestamp, package_id) for timestamp, package_id in zip(
+            self._times, self._time_ids) if package_id in self.packages]
+        self._times = [timestamp for timestamp, package_id in entries]
+        self._time_ids = [package_id for timestamp, package_id in entries]
+        self._times_removed = 0
+
+    def _strip(self, package_id: int) -> Package:
+        """Replace the body of a stored package by an empty one."""
+        pkg = self.packages[package_id]
+
+        # the hash changes with the content
+        self._remove_equal(package_id)
+        pkg.content = b''
+        self._add_equal(pkg, package_id)
+
+        self.size -= self._sizes[package_id]
+        self._sizes[package_id] = 0
+
+        if self.text_index is not None:
+            self.text_index.remove((package_id, ))
+        return pkg
+
+    def eviction_key(self, package_id: int, package: Package) -> tuple:
+        """
+        Get the key ordering the packages for eviction.
+
+        Packages with smaller keys are evicted first. Override this method
+        to implement another policy.
+
+        Parameters
+        ----------
+        package_id : int
+            The id of the package.
+        package : Package
+            The package.
+
+        Returns
+        -------
+        tuple
+            The key.
+
+        """
+        if self.eviction == Eviction.OLDEST:
+            # packages without a time are evicted first
+            timestamp = package.timestamp
+            return (-1e300 if timestamp is None else timestamp, package_id)
+
+        return (package_id, )
+
+    @property
+    def over_limit(self) -> bool:
+        """
+        Get the `over_limit` property.
+
+        Returns
+        -------
+        bool
+            Wether the storage exceeds `max_packages` or `max_bytes`.
+
+        """
+        return ((self.max_packages is not None
+                 and len(self.packages) > self.max_packages)
+                or (self.max_bytes is not None and self.size > self.max_bytes))
+
+    def evict(self) -> List[Package]:
+        """
+        Evict packages until the limits are satisfied.
+
+        This is called by `add`. `on_evict` is called with the evicted
+        packages.
+
+        Returns
+        -------
+        List[Package]
+            The packages removed or stripped of their body.
+
+        """
+        evicted = []
+
+        if not self._ordered:
+            # the limits were set after adding packages
+            self._order = [(self.eviction_key(package_id, pkg), package_id)
+                           for package_id, pkg in self.packages.items()]
+            heapq.heapify(self._order)
+            self._bodies = collections.deque(
+                package_id for package_id in self.packages
+                if self._sizes[package_id])
+            self._ordered = True
+
+        if self.eviction == Eviction.CONTENT and self.max_bytes is not None:
+            while self.size > self.max_bytes and self._bodies:
+                package_id = self._bodies.popleft()
+                if self._sizes.get(package_id):
+                    evicted.append(self._strip(package_id))
+
+        while self.over_limit and self._order:
+            dummy, package_id = heapq.heappop(self._order)
+            if package_id in self.packages:
+                evicted.append(self.packages[package_id])
+                self._unindex(package_id)
+
+        # drop the entries of packages removed otherwise
+        if len(self._order) > 2 * len(self.packages) + 1024:
+            self._order = [(key, package_id)
+                           for key, package_id in self._order
+                           if package_id in self.packages]
+            heapq.heapify(self._order)
+        if len(self._bodies) > 2 * len(self.packages) + 1024:
+            self._bodies = collections.deque(
+                package_id for package_id in self._bodies
+                if self._sizes.get(package_id))
+
+        if evicted and self.on_evict:
+            self.on_evict(evicted)
+
+        return evicted
+
+    def _candidates(self, kwargs: dict) -> Dict[int, Package]:
+        """
+        Get the smallest list of packages possibly matching the keywords.
+
+        Parameters
+        ----------
+        kwargs : dict
+            The attributes to match.
+
+        Returns
+        -------
+        Dict[int, Package]
+            An index or `packages`.
+
+        """
+        candidates = self.packages
+        for attribute, value in kwargs.items():
+            if attribute not in self.indexes:
+                continue
+
+            if attribute == 'recipient':
+                if not isinstance(value, tuple) or not value:
+                    continue
+                value = value[0]
+
+            try:
+                packages = self.indexes[attribute].get(value, {})
+            except TypeError:
+                continue  # unhashable values never match
+
+            if len(packages) < len(candidates):
+                candidates = packages
+
+        return candidates
 
     def __contains__(self, package: Package):
         """
@@ -318,7 +835,10 @@ def __contains__(self, package: Package):
         In this case the package isn't in the PackageStorage.
 
         """
-        return package in self.package_list
+        if isinstance(package, Package):
+            return bool(self.find(package))
+
+        return package in self.packages.values()
 
     def __iter__(self):
         """
@@ -337,7 +857,7 @@ def __iter__(self):
         is called to get the packages in the for-loop.
 
         """
-        return iter(self.package_list)
+        return iter(self.package_list)  # a copy allows changing the storage
 
     def __len__(self):
         """
@@ -350,7 +870,7 @@ def __len__(self):
         Int.
 
         """
-        return len(self.package_list)
+        return len(self.packages)
 
     def remove(self,
                *packages: Package,
@@ -359,10 +879,11 @@ def remove(self,
         Remove packages from the storage.
 
         All packages that equal the packages directly specified are removed.
-        The function acts as a filter. The `func` function gets passed
-        an `Package` if the function returns `True` the package is removed.
-        If you pass both packages and a function all packages matching
-        one of them will be removed.
+        A stored package changed since it was added is removed if the same
+        object is passed. The function acts as a filter. The `func`
+        function gets passed an `Package` if the function returns `True`
+        the package is removed. If you pass both packages and a function
+        all packages matching one of them will be removed.
 
         Parameters
         ----------
@@ -372,23 +893,26 @@ def remove(self,
             A function acting as a filter.
 
         """
-        packages = set(packages)
-        new_list = []
-        if func:
-            for pkg in self.package_list:
-                if pkg not in packages and not func(pkg):
-                    new_list.append(pkg)
+        for package in packages:
+            ids = self.find(package)
+            if not ids:
+                # it might have been changed while stored
+                ids = [
+                    package_id for package_id, pkg in self.packages.items()
+                    if pkg is package
+                ]
 
-        else:
-            for pkg in self.package_list:
-                if pkg not in packages:
-                    new_list.append(pkg)
+            for package_id in ids:
+                self._unindex(package_id)
 
-        self.package_list = new_list
+        if func:
+            for package_id, pkg in list(self.packages.items()):
+                if func(pkg):
+                    self._unindex(package_id)
 
     def add(self,
             *packages: Package,
-            as_list: Optional[List[Package]] = None) -> None:
+            as_list: Optional[List[Package]] = None) -> List[int]:
         """
         Add packages to the PackageStorage.
 
@@ -401,15 +925,75 @@ def add(self,
 
         Returns
         -------
-        None.
+        List[int]
+            The ids of the packages in the storage. The packages might have
+            been evicted already.
 
         """
         if packages and isinstance(packages[0], list):
             raise ValueError("Expected Package not list for `*packages`.")
 
-        self.package_list.extend(packages)
+        ids = self._index(packages)
         if as_list:
-            self.package_list.extend(as_list)
+            ids += self._index(as_list)
+
+        if self.over_limit:
+            self.evict()
+
+        return ids
+
+    def get(self, package_id: int) -> Package:
+        """
+        Get a stored package by its id.
+
+        Parameters
+        ----------
+        package_id : int
+            The id returned by `add`.
+
+        Raises
+        ------
+        KeyError
+            There is no package with this id.
+
+        Returns
+        -------
+        Package
+            The package.
+
+        """
+        return self.packages[package_id]
+
+    def find(self, package: Package) -> List[int]:
+        """
+        Get the ids of the stored packages equal to `package`.
+
+        Parameters
+        ----------
+        package : Package
+            The package to search for.
+
+        Returns
+        -------
+        List[int]
+            The ids in the order the packages were added.
+
+        """
+        if isinstance(package, Package):
+            equal = self._equal.get(hash(package), ())
+            if isinstance(equal, int):
+                equal = (equal, )
+
+            # packages with the same hash might differ in their body
+            return [
+                package_id for package_id in equal
+                if self.packages[package_id] == package
+            ]
+
+        return [
+            package_id for package_id, pkg in self.packages.items()
+            if pkg == package
+        ]
 
     def all(self) -> List[Package]:
         """
@@ -424,7 +1008,7 @@ def all(self) -> List[Package]:
 
         """
 
-        return copy.copy(self.package_list)
+        return self.package_list
 
     def filter(self,
                func: Optional[Callable[[Package], bool]] = None,
@@ -435,7 +1019,8 @@ def filter(self,
         This functions returns an iterable yielding all packages that
         have a positive return value when passing to `func` AND
         match all the `kwargs`. The keywords are checked first.
-        The PackageStorage isn't changed.
+        The PackageStorage isn't changed. Only the packages listed in the
+        smallest index matching one of the keywords are checked.
 
         Parameters
         ----------
@@ -453,7 +1038,8 @@ def filter(self,
         # the list is iterated faster than the view
         kwargs_items = list(kwargs.items())
 
-        for pkg in self.package_list:
+        # a copy allows changing the storage while iterating
+        for pkg in list(self._candidates(kwargs).values()):
             for keyword, value in kwargs_items:
                 if not hasattr(pkg, keyword) or getattr(pkg, keyword) != value:
                     break
@@ -461,6 +1047,98 @@ def filter(self,
                 if (not func) or (func and func(pkg)):
                     yield pkg
 
+    def range(self, start=None, end=None) -> Iterator[Package]:
+        """
+        Get the packages received in a time range.
+
+        The packages are looked up in an index sorted by their timestamp.
+        Packages without a time are never yielded.
+
+        Parameters
+        ----------
+        start : None, number or datetime.datetime, optional
+            The earliest time included. The default is None.
+        end : None, number or datetime.datetime, optional
+            The time the range ends before. The default is None.
+
+        Raises
+        ------
+        TypeError
+            `start` or `end` are of an unsupported type.
+
+        Yields
+        ------
+        Package
+            The packages ordered by their time. Packages with the same time
+            are in the order they were added.
+
+        """
+        start, end = _timestamp(start), _timestamp(end)
+
+        low = 0 if start is None else bisect.bisect_left(self._times, start)
+        high = (len(self._times) if end is None else bisect.bisect_left(
+            self._times, end))
+
+        # a copy allows changing the storage while iterating
+        for package_id in self._time_ids[low:high]:
+            pkg = self.packages.get(package_id)
+            if pkg is not None:
+                yield pkg
+
+    def since(self, start) -> Iterator[Package]:
+        """
+        Get the packages received at or after a time.
+
+        Parameters
+        ----------
+        start : number or datetime.datetime
+            The earliest time included.
+
+        Yields
+        ------
+        Package
+            The packages ordered by their time.
+
+        """
+        return self.range(start)
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[Package]:
+        """
+        Find the text packages containing all words of a query.
+
+        Packages added recently might not be indexed yet. Call
+        `text_index.wait` before to include them.
+
+        Parameters
+        ----------
+        query : str
+            The words. The last one also matches the words it is a prefix
+            of. Case is ignored.
+        limit : int, optional
+            The maximum number of packages returned. The default is None
+            for all.
+
+        Raises
+        ------
+        ValueError
+            The storage has no `text_index`.
+
+        Returns
+        -------
+        List[Package]
+            The packages matching, the most recently added first.
+
+        """
+        if self.text_index is None:
+            raise ValueError("The storage has no text index.")
+
+        # packages might be removed meanwhile by another thread
+        packages = self.packages
+        hits = self.text_index.search(query, limit, packages)
+        return [
+            pkg for pkg in map(packages.get, hits) if pkg is not None
+        ]
+
     def filter_recipient(self, *recipients: str):
         """
         Filter out the packages that have one of the given recipients.
@@ -478,11 +1156,18 @@ def filter_recipient(self, *recipients: str):
             The packages.
 
         """
-        for pkg in self.package_list:
-            for recipient in recipients:
-                if recipient in pkg.recipient:
-                    yield pkg
-                    break  # breaks inner loop
+        index = self.indexes['recipient']
+        lists = [list(index[r].items()) for r in set(recipients) if r in index]
+        if len(lists) == 1:
+            yield from (pkg for package_id, pkg in lists[0])
+            return
+
+        # the ids increase in the order the packages were added in
+        last = None
+        for package_id, pkg in heapq.merge(*lists, key=lambda item: item[0]):
+            if package_id != last:
+                last = package_id
+                yield pkg
 
 
 # ---- Client - General
@@ -520,11 +1205,65 @@ class Client:
     SOCKET_BUFSIZE = 8192  #: bytes to read from socket at once
     COMMAND_SEPERATOR = b'\n'  #: seperates commands of the ectec protocol
     COMMAND_LENGTH = 4096  #: bytes - the maximum length of a command
+    SPILL_THRESHOLD = 1 << 20  #: bytes - larger bodies are stored in a file
+    MAX_PACKAGE_SIZE = 1 << 30  #: bytes - larger packages are dropped
+    MAX_UPDATE_SIZE = 1 << 24  #: bytes - larger user lists are dropped
+    UNIX_SCHEME = 'unix://'  #: prefix of server addresses of unix sockets
 
     def __init__(self):
         self.socket: socket.SocketType = None
         self._buffer = b""
 
+        #: bodies received with a hash for deduplication or None
+        self.received_bodies: BodyCache = None
+
+        #: bodies sent with a hash for deduplication or None
+        self.sent_bodies: BodyCache = None
+
+        #: bytes - the maximum size of deduplicated bodies
+        self.dedup_max_size = 0
+
+    def open_socket(self, server: str, port: int = None) -> socket.socket:
+        """
+        Open a connection to a server.
+
+        Addresses starting with `UNIX_SCHEME` (e.g. ``unix:///tmp/ectec``)
+        refer to a unix socket. The port is ignored then.
+
+        Parameters
+        ----------
+        server : str
+            The ip, hostname or unix socket address.
+        port : int, optional
+            The port to connect to. Required for TCP.
+
+        Raises
+        ------
+        ValueError
+            No port was given for a TCP connection.
+        OSError
+            Server not online. (Connection error on the socket layer.)
+
+        Returns
+        -------
+        socket.socket
+            The connected socket.
+
+        """
+        if server.startswith(self.UNIX_SCHEME):
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(server[len(self.UNIX_SCHEME):])
+            except OSError:
+                sock.close()
+                raise
+            return sock
+
+        if port is None:
+            raise ValueError("A port is required for TCP connections.")
+
+        return socket.create_connection((server, port))
+
     def recv_bytes(self, length, start_timeout=None, timeout=None) -> bytes:
         """
         Receive a specified number of bytes.
@@ -585,8 +1324,11 @@ def recv_bytes(self, length, start_timeout=None, timeout=None) -> bytes:
         start_time = time.perf_counter_ns()
 
         # convert timeout to ns (nanoseconds)
-        timeout = timeout * 0.000000001 if timeout is not None else None
+        timeout = timeout * 1000000000 if timeout is not None else None
 
+        # Joining the parts at the end avoids copying the data received
+        # so far for every part.
+        parts = [msg]
         data_length = len(msg)
         needed = length - data_length
         while True:  # ends by an error or a return
@@ -604,7 +1346,8 @@ def recv_bytes(self, length, start_timeout=None, timeout=None) -> bytes:
             part_length = len(part)
 
             if part_length >= needed:
-                data = msg + part[:needed]
+                parts.append(part[:needed])
+                data = b''.join(parts)
                 self._buffer = part[needed:]
                 return data
 
@@ -620,7 +1363,60 @@ def recv_bytes(self, length, start_timeout=None, timeout=None) -> bytes:
             needed = length - data_length
 
             # add part to local buffer
-            msg += part
+            parts.append(part)
+
+    def recv_into(self, length, file, start_timeout=None):
+        """
+        Receive a specified number of bytes and write them to a file.
+
+        The data is never held in memory completely. The timeout between two
+        parts is `TRANSMISSION_TIMEOUT`.
+
+        Parameters
+        ----------
+        length : int
+            The number of bytes.
+        file : file-like object
+            The writable binary file.
+        start_timeout : int, optional
+            The timeout in s for receiving first data. The default is None.
+
+        Raises
+        ------
+        CommandTimeout
+            The data timed out.
+        ConnectionClosed
+            The connection was closed unexpectedly.
+
+        """
+        data = self._buffer[:length]
+        self._buffer = self._buffer[length:]
+        file.write(data)
+
+        needed = length - len(data)
+        if not needed:
+            return
+
+        self.socket.settimeout(
+            self.TRANSMISSION_TIMEOUT if data else start_timeout)
+
+        buffer = bytearray(self.SOCKET_BUFSIZE * 8)
+        view = memoryview(buffer)
+        while needed:
+            try:
+                size = min(needed, len(buffer))
+                received = self.socket.recv_into(view[:size])
+            except socket.timeout as error:
+                raise CommandTimeout("Data parts timed out.") from error
+
+            if not received:
+                # connection was closed
+                raise ConnectionClosed("The connection was closed.")
+
+            file.write(view[:received])
+            needed -= received
+
+            self.socket.settimeout(self.TRANSMISSION_TIMEOUT)
 
     def recv_command(self,
                      max_length,
@@ -695,6 +1491,10 @@ class variable `COMMAND_SEPERATOR`. Commands also must not exceed a
 
             return command
 
+        if len(msg) > max_length:
+            # too long -> don't wait for the rest
+            raise CommandError(f"Command too long: over {max_length} bytes")
+
         # Command wasn't received completely yet.
         self.socket.setblocking(True)
         self.socket.settimeout(self.TRANSMISSION_TIMEOUT)
@@ -703,8 +1503,11 @@ class variable `COMMAND_SEPERATOR`. Commands also must not exceed a
         start_time = time.perf_counter_ns()
 
         # convert timeout to ns (nanoseconds)
-        timeout = timeout * 0.000000001 if timeout is not None else None
+        timeout = timeout * 1000000000 if timeout is not None else None
 
+        # Appending to a bytearray avoids copying the data received
+        # so far for every part.
+        data = bytearray(msg)
         length = len(msg)
         while True:  # ends by an error or a return
             try:
@@ -720,18 +1523,18 @@ class variable `COMMAND_SEPERATOR`. Commands also must not exceed a
 
             i = part.find(seperator)  # end of command?
             if i >= 0:  # separator found
-                command = msg + part[:i]
                 # seperator is removed
                 self._buffer = part[i + len(seperator):]
 
-                # for expected behavoir check length of command
-                cmd_length = len(command)
+                # check the length before adding the part
+                cmd_length = length + i
                 if cmd_length > max_length:
                     raise CommandError(
                         f"Command too long: {cmd_length} bytes" +
                         f" from {max_length}")
 
-                return command
+                data += part[:i]
+                return bytes(data)
 
             # check time
             if timeout is not None and time_elapsed > timeout:
@@ -749,7 +1552,7 @@ class variable `COMMAND_SEPERATOR`. Commands also must not exceed a
                     f"Command too long: over {max_length} bytes")
 
             # add part to local buffer
-            msg += part
+            data += part
 
     # regular expression for the INFO command
     regex_info = re.compile(r"INFO (True|False) ([\w.\-+]+)")
@@ -817,6 +1620,12 @@ def parse_update(self, command: str):
         command : str
             DESCRIPTION.
 
+        Raises
+        ------
+        ConnectionClosed
+            The user list is larger than `MAX_UPDATE_SIZE`. It can't be
+            skipped.
+
         Returns
         -------
         bool or List[str]
@@ -842,6 +1651,13 @@ def parse_update(self, command: str):
             return False
 
         length = int(match.group(1))
+
+        if length > self.MAX_UPDATE_SIZE:
+            # the list would have to be read to find the next command
+            raise ConnectionClosed(
+                "User list too large: {} bytes exceed the limit of {} "
+                "bytes.".format(length, self.MAX_UPDATE_SIZE))
+
         # Keep the timeout between 0.3 and 5
         timeout = min(max(length * 2e-07, 0.3), 5)
 
@@ -855,19 +1671,29 @@ def parse_update(self, command: str):
 
     # regular expression for the PACKAGE command
     regex_package = re.compile(
-        r"PACKAGE ([\w/.-]+) FROM ([\w]+) TO ([\w,]+) WITH (\d+)")
+        r"PACKAGE ([\w/.-]+) FROM ([\w]+) TO ([\w,#]+)"
+        r" (?:WITH (\d+)(?: HASH ([0-9a-f]{64}))?|REF ([0-9a-f]{64}))")
 
     def parse_package(self, command: str):
         """
         Parse and handle a PACKAGE command.
 
         The content of the command is received if it is a PACKAGE command.
+        Contents larger than `SPILL_THRESHOLD` are written to a temporary
+        file which is assigned to `Package.file`. If deduplication is enabled
+        bodies with a hash are cached and references are resolved.
 
         Parameters
         ----------
         command : str
             The received command.
 
+        Raises
+        ------
+        ConnectionClosed
+            The package is larger than `MAX_PACKAGE_SIZE`. Its content can't
+            be skipped.
+
         Returns
         -------
         bool or Package
@@ -894,18 +1720,116 @@ def parse_package(self, command: str):
         sender = match.group(2)
         recipients = match.group(3).split(',')
 
+        package = Package(sender, recipients, content_type)
+
+        digest = match.group(6)
+        if digest:
+            # The body was sent before
+            body = None
+            if self.received_bodies is not None:
+                body = self.received_bodies.get(digest)
+
+            if body is None:
+                raise CommandError("Unknown reference {}.".format(digest))
+
+            package.content = body
+            return package
+
         length = int(match.group(4))
+        digest = match.group(5)
+
+        if length > self.MAX_PACKAGE_SIZE:
+            # the body would have to be read to find the next command
+            raise ConnectionClosed(
+                "Package too large: {} bytes exceed the limit of {} "
+                "bytes.".format(length, self.MAX_PACKAGE_SIZE))
+
+        if length > self.SPILL_THRESHOLD:
+            # Large bodies are written to disk while they arrive
+            file = tempfile.TemporaryFile()
+            try:
+                self.recv_into(length, file, 0.2)
+            except Exception:
+                file.close()
+                raise
+            package.file = file
+            return package
 
         # Keep the timeout between 0.3 and 5
         timeout = min(max(length * 2e-07, 0.3), 5)
 
-        data = self.recv_bytes(length, 0.2, timeout)
+        content = self.recv_bytes(length, 0.2, timeout)
 
-        package = Package(sender, recipients, content_type)
-        package.content = data
+        if digest and self.received_bodies is not None:
+            # Equal bodies are held only once
+            content = self.received_bodies.put(digest, content)
+
+        package.content = content
 
         return package
 
+    # regular expression for the CACHE command
+    regex_cache = re.compile(r"CACHE (\d+) (\d+)")
+
+    def parse_cache(self, command: str):
+        """
+        Parse the answer to a CACHE command and set up the deduplication.
+
+        The server tells the number of bodies and the maximum size of the
+        bodies to keep. From then on the client sends packages with a hash
+        and references bodies sent before.
+
+        ::
+
+            CACHE (\\d+) (\\d+)
+                  ----- -----
+                  entries max-size
+
+        Parameters
+        ----------
+        command : str
+            The received command.
+
+        Returns
+        -------
+        bool
+            Whether it was a CACHE command.
+
+        """
+        match = self.regex_cache.fullmatch(command)
+
+        if not match:
+            return False
+
+        entries, max_size = int(match.group(1)), int(match.group(2))
+
+        if entries:
+            self.received_bodies = BodyCache(entries)
+            self.sent_bodies = BodyCache(entries)
+        else:
+            self.received_bodies = self.sent_bodies = None
+        self.dedup_max_size = max_size
+
+        return True
+
+    def forget_sent_bodies(self):
+        """
+        Send the following bodies with a hash instead of a reference.
+
+        The client records a body before the server stored it. So this is
+        called when the server reports an error since it might have failed
+        to store the last body sent.
+        The bodies cached by the server stay a superset of the bodies
+        referenced later.
+
+        Returns
+        -------
+        None.
+
+        """
+        if self.sent_bodies is not None:
+            self.sent_bodies = BodyCache(self.sent_bodies.max_entries)
+
     # regular expression for the ERROR command
     regex_error = re.compile(r"ERROR (.*)")
 
@@ -1003,10 +1927,105 @@ def send_register(self, name, role):
         command = "REGISTER {name} AS {role}".format(name=name, role=role)
         self.send_command(command)
 
+    def send_handshake(self, version_str, name, role):
+        """
+        Send an INFO and a REGISTER command at once.
+
+        This is used for the pipelined handshake. The client doesn't await
+        the INFO answer of the server before registering. Both commands are
+        sent with a single write so that the server receives them together.
+
+        Parameters
+        ----------
+        version_str : str
+            A string representing the version of the client.
+        name : str
+            The name to register as.
+        role : str
+            The role to register as.
+
+        Raises
+        ------
+        ValueError
+            Bad version string, name or role.
+
+        """
+        if not re.fullmatch(r'[\w.\-+]+', version_str):
+            raise ValueError("Version string doesn't match `[\\w.-+]+`.")
+        if not re.fullmatch(r'\w+', name):
+            raise ValueError("Name doesn't match `\\w+`.")
+        if not re.fullmatch(r'\w+', role):
+            raise ValueError("Role doesn't match `\\w+`.")
+
+        info = "INFO {version}".format(version=version_str)
+        register = "REGISTER {name} AS {role}".format(name=name, role=role)
+
+        self.send_command(
+            info, register.encode('utf-8', errors='backslashreplace') +
+            self.COMMAND_SEPERATOR)
+
+    def send_join(self, group: str):
+        """
+        Send a JOIN command to join a group.
+
+        Parameters
+        ----------
+        group : str
+            The name of the group.
+
+        Raises
+        ------
+        ValueError
+            Bad group name.
+
+        """
+        if not re.fullmatch(r'\w+', group):
+            raise ValueError("Group doesn't match `\\w+`.")
+
+        self.send_command("JOIN {}".format(group))
+
+    def send_part(self, group: str):
+        """
+        Send a PART command to leave a group.
+
+        Parameters
+        ----------
+        group : str
+            The name of the group.
+
+        Raises
+        ------
+        ValueError
+            Bad group name.
+
+        """
+        if not re.fullmatch(r'\w+', group):
+            raise ValueError("Group doesn't match `\\w+`.")
+
+        self.send_command("PART {}".format(group))
+
+    def send_cache(self, entries: int):
+        """
+        Send a CACHE command to enable the deduplication of bodies.
+
+        The deduplication starts when the answer of the server is parsed
+        using `parse_cache`.
+
+        Parameters
+        ----------
+        entries : int
+            The number of bodies to keep. 0 disables the deduplication.
+
+        """
+        self.send_command("CACHE {}".format(int(entries)))
+
     def send_package(self, package):
         """
         Send a PACKAGE command containing the given package.
 
+        If deduplication is enabled the hash of the content is sent too.
+        A body sent before is referenced instead of being sent again.
+
         Parameters
         ----------
         package : Package
@@ -1015,20 +2034,25 @@ def send_package(self, package):
         Raises
         ------
         ValueError
-            Some attribute of the package is not legal.
-
+            Some attribute of the package is not legal or the package is
+            larger than `MAX_PACKAGE_SIZE`.
 
         """
         recipient = ",".join(package.recipient)
-        length = len(package.content)
+        length = package.size
+
+        if length > self.MAX_PACKAGE_SIZE:
+            raise ValueError(
+                "Package too large: {} bytes exceed the limit of {} "
+                "bytes.".format(length, self.MAX_PACKAGE_SIZE))
 
         # check characters of parameters using regexes
         if not re.fullmatch(r'[\w/.-]+', str(package.type)):
             raise ValueError("Type of package does't match `[\\w/.-]+`.")
         if not re.fullmatch(r'\w+', str(package.sender)):
             raise ValueError("Sender of package does't match `\\w+`.")
-        if not re.fullmatch(r'[\w,]+', str(recipient)):
-            raise ValueError("Recipient of package does't match `[\\w,]+`.")
+        if not re.fullmatch(r'[\w,#]+', str(recipient)):
+            raise ValueError("Recipient of package does't match `[\\w,#]+`.")
 
         template = "PACKAGE {typ} FROM {sender} TO {recipient} WITH {length}"
         command = template.format(typ=package.type,
@@ -1036,7 +2060,33 @@ def send_package(self, package):
                                   recipient=recipient,
                                   length=length)
 
-        self.send_command(command, package.content)
+        if package.file is None:
+            content = package.content
+
+            if self.sent_bodies is not None and length <= self.dedup_max_size:
+                digest = content_hash(content)
+
+                if digest in self.sent_bodies:
+                    # The server holds the body already
+                    self.sent_bodies.get(digest)
+                    self.send_command(
+                        "PACKAGE {typ} FROM {sender} TO {recipient} REF "
+                        "{digest}".format(typ=package.type,
+                                          sender=package.sender,
+                                          recipient=recipient,
+                                          digest=digest))
+                    return
+
+                # Equal bodies are held only once
+                package.content = self.sent_bodies.put(digest, content)
+                command += " HASH " + digest
+
+            self.send_command(command, package.content)
+            return
+
+        # Large bodies are sent from the file without reading them
+        self.send_command(command)
+        self.socket.sendfile(package.open(), 0, length)
 
 
 # ---- User Client
@@ -1085,10 +2135,15 @@ def run(self):
                         self.client._update_users(res)
                         continue
 
+                    # Handle CACHE command
+                    if self.client.parse_cache(cmd):
+                        continue
+
                     # Handle ERROR command
                     res = self.client.parse_error(cmd)
                     if res:
                         self.log.error("Server error: " + res)
+                        self.client.forget_sent_bodies()
                         continue
 
                     # Unkown command
@@ -1147,9 +2202,28 @@ class UserClient(Client, AbstractUserClient):
         Send a package.
     receive(n)
         Read out the buffer of Packages.
+    join(group)
+        Join a group.
+    part(group)
+        Leave a group.
 
     """
 
+    #: The number of bodies kept for deduplication. 0 disables it.
+    DEDUP_ENTRIES = 0
+
+    #: The maximum number of packages in `packages`. None for no limit.
+    HISTORY_PACKAGES = None
+
+    #: bytes - the maximum size of the bodies in `packages` or None
+    HISTORY_BYTES = 1 << 28
+
+    #: The policy making room in `packages`.
+    HISTORY_EVICTION = Eviction.CONTENT
+
+    #: The maximum number of unread packages in `buffer`. None for no limit.
+    BUFFER_LENGTH = 10000
+
     def __init__(self, username: str):
         """
         A Client for the normal user role.
@@ -1164,10 +2238,19 @@ def __init__(self, username: str):
         self.username: str = username
         self.role: Role = Role.USER
         self.users: List[str] = None
-        self.packages: PackageStorage = PackageStorage()
+        self.packages: PackageStorage = PackageStorage(
+            self.HISTORY_PACKAGES, self.HISTORY_BYTES, self.HISTORY_EVICTION)
+
+        #: The groups joined on the current server
+        self.groups: Set[str] = set()
 
         #: A buffer for processing packages. This is used by `receive`.
-        self.buffer: List[Package] = []
+        #: The oldest packages are dropped when it exceeds `BUFFER_LENGTH`.
+        self.buffer: collections.deque = collections.deque(
+            maxlen=self.BUFFER_LENGTH)
+
+        #: The number of unread packages dropped from a full `buffer`
+        self.dropped = 0
 
         #: The socket connected to the server. Or None.
         self.socket = None
@@ -1209,6 +2292,9 @@ def server(self):
         if not self.connected or not self.socket:
             return None
 
+        if self.socket.family == getattr(socket, 'AF_UNIX', None):
+            return Address(self.UNIX_SCHEME + self.socket.getpeername(), 0)
+
         return Address._make(self.socket.getpeername())
 
     def _add_package(self, package: Package):
@@ -1222,6 +2308,11 @@ def _add_package(self, package: Package):
         package : Package
             The newly received package.
         """
+        if len(self.buffer) == self.buffer.maxlen:
+            self.dropped += 1
+            self.log.warning("Buffer full. Dropped the oldest unread "
+                             "package ({} so far).".format(self.dropped))
+
         self.buffer.append(package)
         self.packages.add(package)
 
@@ -1268,19 +2359,30 @@ def __exit__(self, exc_type, exc_value, traceback):
             # wether to raise the Exception or suppress
             return False  # do not suppress
 
-    def connect(self, server: str, port: int):
+    def connect(self, server: str, port: int = None, pipeline: bool = False):
         """
         Connect to a server.
 
+        `server` can also be the address of a unix socket on the same
+        machine like ``unix:///tmp/ectec``. The port isn't needed then.
+
+        With `pipeline` the client sends the INFO and the REGISTER command
+        back to back instead of awaiting the server's INFO answer first.
+        This saves one round trip. A refused version is still reported.
+
         Parameters
         ----------
         server : str
-            The ip or hostname.
-        port : int
-            The port to connect to.
+            The ip, hostname or unix socket address.
+        port : int, optional
+            The port to connect to. Required for TCP.
+        pipeline : bool, optional
+            Whether to use the pipelined handshake. The default is False.
 
         Raises
         ------
+        ValueError
+            No port was given for a TCP connection.
         OSError
             Server not online. (Connection error on the socket layer.)
         ConnectException
@@ -1291,11 +2393,19 @@ def connect(self, server: str, port: int):
         None.
 
         """
-        self.socket = socket.create_connection((server, port))
+        self.socket = self.open_socket(server, port)
+
+        # The deduplication is set up for each connection
+        self.received_bodies = self.sent_bodies = None
 
         try:
-            # send version number
-            self.send_info(str(VERSION))
+            if pipeline:
+                # send version number and register without awaiting an answer
+                self.send_handshake(str(VERSION), self.username,
+                                    self.role.value)
+            else:
+                # send version number
+                self.send_info(str(VERSION))
 
             # receive answer of the server
             # wether the version is accepted and the version of the server.
@@ -1325,8 +2435,9 @@ def connect(self, server: str, port: int):
             self.log.info("Server ({}, {})[{}] accepted.".format(
                 server, port, parsed[1]))
 
-            # send register
-            self.send_register(self.username, self.role.value)
+            if not pipeline:
+                # send register
+                self.send_register(self.username, self.role.value)
 
             # Receive user list update
             raw_cmd = self.recv_command(self.COMMAND_LENGTH, self.TIMEOUT,
@@ -1348,6 +2459,10 @@ def connect(self, server: str, port: int):
                 raise ConnectException(
                     "Server didn't follow the ectec protocol.")
 
+            # The answer is handled by the thread
+            if self.DEDUP_ENTRIES:
+                self.send_cache(self.DEDUP_ENTRIES)
+
             # Start thread
             self._thread = UserClientThread(self)
             self._thread.start()
@@ -1383,6 +2498,35 @@ def disconnect(self):
             self.socket.close()
 
         self.users = []
+        self.groups = set()
+
+    def join(self, group: str):
+        """
+        Join a group.
+
+        Packages sent to ``#group`` are received from then on.
+
+        Parameters
+        ----------
+        group : str
+            The name of the group.
+
+        """
+        self.send_join(group)
+        self.groups.add(group)
+
+    def part(self, group: str):
+        """
+        Leave a group.
+
+        Parameters
+        ----------
+        group : str
+            The name of the group.
+
+        """
+        self.send_part(group)
+        self.groups.discard(group)
 
     def send(self, package: Package):
         """
@@ -1406,7 +2550,7 @@ def send(self, package: Package):
         self.send_package(package)
 
         # append package to package storage
-        package.time = datetime.datetime.now()
+        package.time = time.time()
         self.packages.add(package)
 
     def _update(self):
@@ -1439,6 +2583,10 @@ def receive(
         returned. If `n>1` a list of Packages is returned. If `n=None` or
         `n<1` all packages in the buffer are returned.
 
+        The buffer holds at most `BUFFER_LENGTH` packages. If it isn't read
+        out in time the oldest packages are dropped from it. They are
+        counted by `dropped` but are still added to `packages`.
+
         Parameters
         ----------
         n : positive int, optional
@@ -1450,18 +2598,14 @@ def receive(
 
         """
         if not n:
-            packages = self.buffer
-            self.buffer = []
-            return packages
+            n = len(self.buffer)
+            return [self.buffer.popleft() for i in range(n)]
 
         if n > 1:
-            packages = self.buffer[:n]
-            self.buffer = self.buffer[n:]
-            return packages
+            n = min(n, len(self.buffer))
+            return [self.buffer.popleft() for i in range(n)]
 
         if n == 1:
-            package = self.buffer[0]
-            self.buffer = self.buffer[1:]
-            return package
+            return self.buffer.popleft()
 
         raise ValueError("Cannot receive less than one package from buffer.")
@@ -24,6 +24,10 @@
 
 """
 import logging
+import logging.handlers
+import queue
+import threading
+import time
 from logging import (CRITICAL, DEBUG, ERROR, INFO, NOTSET, WARNING,
                      NullHandler, StreamHandler, getLogger)
 
@@ -89,3 +93,192 @@ def formatException(self, exc_info):
         """
         result = super().formatException(exc_info)  # Super formats for us.
         return indent(result, 2, prefix="| >>>")  # Indent output
+
+
+class EctecQueueHandler(logging.handlers.QueueHandler):
+    """
+    A handler putting records into a queue without blocking.
+
+    Unlike `logging.handlers.QueueHandler` the message isn't formatted
+    before putting the record into the queue. That is left to the thread
+    handling the queue. Records are dropped if the queue is full.
+
+    Attributes
+    ----------
+    dropped : int
+        The number of records dropped.
+
+    """
+
+    def __init__(self, queue):
+        super().__init__(queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        """Put a record into the queue or drop it if the queue is full."""
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record):
+        """Return the record unchanged. It doesn't leave the process."""
+        return record
+
+
+class QueueLogging:
+    """
+    Moves the output of a logger to a background thread.
+
+    The handlers of the logger are replaced by a `EctecQueueHandler`. A
+    `logging.handlers.QueueListener` passes the records to the original
+    handlers in its own thread. So logging doesn't block the threads
+    forwarding packages. `stop` restores the handlers.
+
+    Records usually reach the handlers of the ancestors of the logger,
+    e.g. the root logger. The listener handles them with these handlers
+    too and the logger stops propagating while the output is moved. The
+    handlers of the ancestors stay in place for other loggers.
+
+    Parameters
+    ----------
+    logger : logging.Logger
+        The logger. Usually the one of the whole package (``ectec``).
+    maxsize : int, optional
+        The maximum number of records waiting. Further records are dropped.
+        The default is 10000.
+
+    Examples
+    --------
+    >>> with QueueLogging(getLogger('ectec')):
+    ...     server.start(0)
+    ...     # do something
+    ...     server.stop()
+
+    """
+
+    def __init__(self, logger: logging.Logger, maxsize: int = 10000):
+        self.logger = logger
+        self.queue = queue.Queue(maxsize)
+        self.handler = EctecQueueHandler(self.queue)
+
+        self._handlers = []
+        self._propagate = logger.propagate
+        self._listener = None
+
+    @property
+    def dropped(self) -> int:
+        """int: The number of records dropped because the queue was full."""
+        return self.handler.dropped
+
+    def start(self):
+        """Start the background thread and replace the handlers."""
+        if self._listener is not None:
+            return
+
+        self._handlers = list(self.logger.handlers)
+
+        # the handlers the records would propagate to
+        handlers = list(self._handlers)
+        ancestor = self.logger
+        while ancestor.propagate and ancestor.parent is not None:
+            ancestor = ancestor.parent
+            handlers.extend(ancestor.handlers)
+
+        self._listener = logging.handlers.QueueListener(
+            self.queue, *handlers, respect_handler_level=True)
+        self._listener.start()
+
+        for handler in self._handlers:
+            self.logger.removeHandler(handler)
+        self.logger.addHandler(self.handler)
+
+        self._propagate = self.logger.propagate
+        self.logger.propagate = False
+
+    def stop(self):
+        """Handle the waiting records and restore the handlers."""
+        if self._listener is None:
+            return
+
+        self.logger.removeHandler(self.handler)
+        for handler in self._handlers:
+            self.logger.addHandler(handler)
+        self.logger.propagate = self._propagate
+
+        self._listener.stop()
+        self._listener = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return False
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    A filter limiting how often the same message is logged.
+
+    Records with the same logger and unformatted message share a token
+    bucket. It holds up to `burst` tokens and gains `rate` tokens per second.
+    Each record takes one token. Records arriving when the bucket is empty
+    are suppressed. Use it with lazy formatting, e.g.
+    ``log.info("PACKAGE %s", name)``, so that the unformatted message
+    stays the same.
+
+    Parameters
+    ----------
+    rate : float
+        The records per second allowed in the long run.
+    burst : int, optional
+        The records allowed at once. The default is `rate` but at least 1.
+
+    Attributes
+    ----------
+    suppressed : int
+        The number of records suppressed.
+
+    Examples
+    --------
+    >>> getLogger('ectec.server.packages').addFilter(RateLimitFilter(10))
+
+    At most about ten package logs per second.
+
+    """
+
+    #: The buckets are reset when there are more (e.g. formatted messages)
+    MAX_BUCKETS = 1024
+
+    def __init__(self, rate: float, burst: int = None):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst if burst is not None else max(rate, 1)
+        self.suppressed = 0
+
+        # key -> (tokens, time of the last update)
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        """Take a token for the record. Return whether it is logged."""
+        key = (record.name, record.msg)
+        now = time.monotonic()
+
+        with self._lock:
+            if key not in self._buckets and \
+                    len(self._buckets) >= self.MAX_BUCKETS:
+                self._buckets.clear()
+
+            tokens, last = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                self.suppressed += 1
+                return False
+
+            self._buckets[key] = (tokens - 1, now)
+            return True
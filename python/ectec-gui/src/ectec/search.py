@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+A full text index of the packages received.
+
+***********************************
+
+Created on Mon Oct 19 21:05:47 2026
+
+Copyright (C) 2020 real-yfprojects (github.com user)
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+import bisect
+import heapq
+import queue
+import re
+import threading
+from typing import Container, Dict, Iterable, List, Optional, Tuple
+
+from . import AbstractPackage, logs
+
+logger = logs.getLogger(__name__)
+
+#: The pattern of the words indexed.
+WORD = re.compile(r'\w+')
+
+
+class TextIndex:
+    """
+    An inverted index of the words in the bodies of text packages.
+
+    The packages are indexed by their id in a background thread. So adding
+    packages doesn't block the thread receiving them. `add` and `remove`
+    only queue the changes. `search` answers from the packages indexed
+    so far. `wait` blocks until the queue is handled. The thread ends when
+    there is nothing to do for `IDLE` seconds and is started again by the
+    next change.
+
+    Parameters
+    ----------
+    encoding : str, optional
+        The encoding of the bodies. The default is 'utf-8'.
+
+    Examples
+    --------
+    >>> index = TextIndex()
+    >>> index.add([(0, package1), (1, package2)])
+    >>> index.wait()
+    >>> index.search('hello wor')
+    [1]
+
+    The ids of the packages are returned newest first. The last word of
+    the query matches all words it is a prefix of unless the query ends
+    with a space or punctuation.
+
+    """
+
+    #: The prefixes of the types of the packages indexed.
+    TYPES = ('text', )
+
+    #: seconds - the time the thread waits for changes before it ends
+    IDLE = 1.0
+
+    #: The number of words a prefix may match to merge their ids. Prefixes
+    #: matching more words are compared to the words of each package.
+    PREFIX_MERGE = 32
+
+    def __init__(self, encoding: str = 'utf-8'):
+        self.encoding = encoding
+
+        #: The changes waiting to be indexed.
+        self.queue: queue.Queue = queue.Queue()
+
+        #: Guards `postings` and `words`.
+        self.lock = threading.Lock()
+
+        #: word -> ids of the packages containing it in the order added
+        self.postings: Dict[str, Dict[int, None]] = {}
+
+        #: id -> words of the package
+        self.words: Dict[int, Tuple[str, ...]] = {}
+
+        #: the sorted words for prefix lookups or None if outdated
+        self._vocabulary: Optional[List[str]] = []
+
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Get the number of packages indexed."""
+        return len(self.words)
+
+    @staticmethod
+    def terms(text: str) -> Tuple[str, ...]:
+        """
+        Get the words a text is listed under.
+
+        Parameters
+        ----------
+        text : str
+            The text.
+
+        Returns
+        -------
+        tuple of str
+            The different words in lower case.
+
+        """
+        return tuple(set(WORD.findall(text.casefold())))
+
+    # ---- Changes
+
+    def add(self, packages: Iterable[Tuple[int, AbstractPackage]]) -> None:
+        """
+        Queue packages for indexing.
+
+        Only packages with a type starting with one of `TYPES` are indexed.
+
+        Parameters
+        ----------
+        packages : iterable of (int, AbstractPackage)
+            The ids and the packages. The ids must increase.
+
+        """
+        self._put(self._add, packages)
+
+    def remove(self, package_ids: Iterable[int]) -> None:
+        """
+        Queue packages for removal from the index.
+
+        Parameters
+        ----------
+        package_ids : iterable of int
+            The ids of the packages.
+
+        """
+        self._put(self._remove, package_ids)
+
+    def wait(self) -> None:
+        """Block until the changes queued are indexed."""
+        self.queue.join()
+
+    def _put(self, func, argument) -> None:
+        """Queue a change and start the thread if needed."""
+        with self._thread_lock:
+            self.queue.put((func, argument))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run,
+                                                name='TextIndex',
+                                                daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        """Handle the changes queued until there are none for a while."""
+        try:
+            while True:
+                try:
+                    func, argument = self.queue.get(timeout=self.IDLE)
+                except queue.Empty:
+                    with self._thread_lock:
+                        if self.queue.empty():
+                            self._thread = None
+                            return
+                    continue
+
+                try:
+                    func(argument)
+                except Exception:
+                    logger.exception("Couldn't update the text index.")
+                finally:
+                    self.queue.task_done()
+        finally:
+            # the next change starts a new thread
+            with self._thread_lock:
+                if self._thread is threading.current_thread():
+                    self._thread = None
+
+    def _add(self, packages: Iterable[Tuple[int, AbstractPackage]]) -> None:
+        """Index packages. This is called by the thread."""
+        for package_id, pkg in packages:
+            try:
+                if not pkg.type.startswith(self.TYPES):
+                    continue
+
+                content = pkg.content
+                if isinstance(content, (bytes, bytearray, memoryview)):
+                    text = bytes(content).decode(self.encoding,
+                                                 errors='replace')
+                else:
+                    text = str(content)
+            except Exception:
+                logger.exception("Couldn't index package %d.", package_id)
+                continue
+
+            # the words are found without holding the lock
+            terms = self.terms(text)
+            if not terms:
+                continue
+
+            with self.lock:
+                self.words[package_id] = terms
+                for term in terms:
+                    posting = self.postings.get(term)
+                    if posting is None:
+                        self.postings[term] = {package_id: None}
+                        self._vocabulary = None
+                    else:
+                        posting[package_id] = None
+
+    def _remove(self, package_ids: Iterable[int]) -> None:
+        """Remove packages from the index. This is called by the thread."""
+        with self.lock:
+            for package_id in package_ids:
+                for term in self.words.pop(package_id, ()):
+                    posting = self.postings[term]
+                    del posting[package_id]
+                    if not posting:
+                        del self.postings[term]
+                        self._vocabulary = None
+
+    # ---- Queries
+
+    def _prefixed(self, prefix: str) -> List[Dict[int, None]]:
+        """Get the postings of the words starting with `prefix`."""
+        if self._vocabulary is None:
+            # sorted again when words were added or dropped since
+            self._vocabulary = sorted(self.postings)
+
+        vocabulary = self._vocabulary
+        i = bisect.bisect_left(vocabulary, prefix)
+        postings = []
+        while i < len(vocabulary) and vocabulary[i].startswith(prefix):
+            postings.append(self.postings[vocabulary[i]])
+            i += 1
+
+        return postings
+
+    def search(self,
+               query: str,
+               limit: Optional[int] = None,
+               alive: Optional[Container[int]] = None) -> List[int]:
+        """
+        Find the packages containing all words of a query.
+
+        Parameters
+        ----------
+        query : str
+            The words. If the query ends with a word character the last
+            word also matches the words it is a prefix of.
+        limit : int, optional
+            The maximum number of hits. The default is None for all.
+        alive : Container[int], optional
+            The ids of the packages that may be returned. This allows
+            skipping packages removed but not yet dropped from the index.
+            The default is None.
+
+        Returns
+        -------
+        List[int]
+            The ids of the packages matching, the newest first.
+
+        """
+        terms = WORD.findall(query.casefold())
+        if not terms or limit == 0:
+            return []
+
+        prefix = None
+        if WORD.match(query[-1:]):
+            prefix = terms.pop()
+
+        hits = []
+        with self.lock:
+            exact = []
+            for term in set(terms):
+                posting = self.postings.get(term)
+                if posting is None:
+                    return []
+                exact.append(posting)
+
+            if exact:
+                exact.sort(key=len)
+                candidates = reversed(exact.pop(0))
+            else:
+                prefixed = self._prefixed(prefix)
+                if len(prefixed) <= self.PREFIX_MERGE:
+                    # the ids of the words are merged newest first
+                    candidates = heapq.merge(*map(reversed, prefixed),
+                                             reverse=True)
+                    prefix = None
+                else:
+                    candidates = reversed(self.words)
+
+            words = self.words
+            last = None
+            for package_id in candidates:
+                if package_id == last:
+                    continue
+                last = package_id
+
+                if alive is not None and package_id not in alive:
+                    continue
+                if not all(package_id in posting for posting in exact):
+                    continue
+                if prefix is not None and not any(
+                        word.startswith(prefix)
+                        for word in words[package_id]):
+                    continue
+
+                hits.append(package_id)
+                if len(hits) == limit:
+                    break
+
+        return hits
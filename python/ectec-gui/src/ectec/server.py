@@ -44,23 +44,36 @@
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 """
+import array
+import base64
+import enum
+import json
 import logging
+import os
+import queue
 import re
+import select
+import selectors
 import socket
 import socketserver
+import struct
 import threading
 import time
 import traceback
-from collections import namedtuple
-from typing import Dict, List, Tuple
+from collections import deque, namedtuple
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
 
-from . import (VERSION, AbstractServer, Address, EctecException, Role, logs,
-               version)
+from . import (VERSION, AbstractServer, Address, BodyCache, EctecException,
+               Role, content_hash, logs, version)
 
 # ---- Logging
 
 logger = logs.getLogger(__name__)
 
+#: Logs a line for every package. Add a `logs.RateLimitFilter` or raise its
+#: level to reduce the logs under load.
+package_logger = logs.getLogger(__name__ + '.packages')
+
 
 class ConnectionAdapter(logging.LoggerAdapter):
     """
@@ -99,6 +112,9 @@ def __init__(self, logger, remote, extra=None):
         super().__init__(logger, extra if extra else {})
         self.remote = Address._make(remote)
 
+        # formatted once instead of for every message
+        self.prefix = "|{ip:>15}| ".format(ip=self.remote.ip)
+
     def process(self, msg, kwargs):
         """
         Process the log record, add ip info to msg.
@@ -118,8 +134,7 @@ def process(self, msg, kwargs):
             DESCRIPTION.
 
         """
-        msg = "|{ip:>15}| {msg}".format(ip=self.remote.ip, msg=msg)
-        return super().process(msg, kwargs)
+        return super().process(self.prefix + str(msg), kwargs)
 
 
 # ---- Exceptions for this implementation
@@ -141,6 +156,12 @@ class RequestRefusedError(EctecException):
     """
 
 
+class HandoffError(EctecException):
+    """
+    The handing over of the server to another process failed.
+    """
+
+
 class CommandError(EctecException):
     """
     There was a problem handling a command.
@@ -201,9 +222,778 @@ class UnexpectedCommand(UnexpectedData):
     The content/body of the package.
 """
 
+PoolStats = namedtuple('PoolStats', [
+    'workers', 'busy', 'max_workers', 'pending', 'max_pending', 'rejected',
+    'saturation', 'mean_delay', 'max_delay'
+])
+"""
+Namedtuple holding statistics about the threads handling the clients.
+
+Attributes
+----------
+workers : int
+    The number of threads currently existing.
+busy : int
+    The number of clients currently handled.
+max_workers : int or None
+    The size of the pool or None if there is one thread per client.
+pending : int
+    The number of clients waiting for a free worker.
+max_pending : int or None
+    The maximum number of waiting clients or None for no limit.
+rejected : int
+    The number of clients refused because the pool was saturated.
+saturation : float
+    The part of the pool that is busy. Always 0 without a pool.
+mean_delay : float
+    The mean time in s clients waited before being handled.
+max_delay : float
+    The maximum time in s a client waited before being handled.
+"""
+
+AcceptStats = namedtuple('AcceptStats', [
+    'accepted', 'refused', 'wakeups', 'max_batch', 'mean_latency',
+    'max_latency', 'backlog', 'max_queue', 'full_queue', 'listen_overflows'
+])
+"""
+Namedtuple holding statistics about accepting new connections.
+
+Attributes
+----------
+accepted : int
+    The number of connections accepted.
+refused : int
+    The number of connections closed because `verify_request` failed.
+wakeups : int
+    The number of times the accept loop woke up for new connections.
+max_batch : int
+    The maximum number of connections accepted in one wakeup.
+mean_latency : float
+    The mean time in s between the wakeup and handing over a connection.
+max_latency : float
+    The maximum time in s between the wakeup and handing over a connection.
+backlog : int
+    The size of the accept queue requested from the OS.
+max_queue : int or None
+    The maximum length of the accept queue observed. None if unsupported.
+full_queue : int or None
+    The number of wakeups with a full accept queue. None if unsupported.
+listen_overflows : int or None
+    Connections the OS dropped because an accept queue was full since the
+    server started. This counter is system wide. None if unsupported.
+"""
+
+ClientState = namedtuple(
+    'ClientState', ['name', 'role', 'address', 'buffer', 'dedup', 'groups'],
+    defaults=(None, ()))
+"""
+Namedtuple holding the state of a client handed over to another server.
+
+Attributes
+----------
+name : str
+    The name/id of the client.
+role : str
+    The value of the role of the client.
+address : Address
+    The address of the client consisting of ip address and port.
+buffer : bytes
+    The bytes received from the client but not processed yet.
+dedup : dict or None
+    The state of the deduplication (see `ClientHandler.export_dedup`).
+groups : list of str
+    The groups the client joined.
+"""
+
+ClientStats = namedtuple('ClientStats', [
+    'name', 'role', 'address', 'connected', 'last_activity', 'packages_in',
+    'packages_out', 'bytes_in', 'bytes_out', 'queued', 'buffered'
+])
+"""
+Namedtuple holding statistics about the connection to one client.
+
+Attributes
+----------
+name : str
+    The name/id of the client.
+role : Role
+    The role of the client.
+address : Address
+    The address of the client.
+connected : float
+    The time the client connected (see `time.time`).
+last_activity : float
+    The time the last command was received from the client.
+packages_in : int
+    The number of packages received from the client.
+packages_out : int
+    The number of packages sent to the client.
+bytes_in : int
+    The number of bytes received from the client.
+bytes_out : int
+    The number of bytes sent to the client.
+queued : int
+    The number of frames waiting to be sent to the client.
+buffered : int
+    The number of bytes received from the client but not processed yet.
+"""
+
+ServerStats = namedtuple('ServerStats', [
+    'clients', 'uptime', 'packages_in', 'packages_out', 'bytes_in',
+    'bytes_out', 'packages_in_rate', 'packages_out_rate', 'bytes_in_rate',
+    'bytes_out_rate'
+])
+"""
+Namedtuple holding statistics about the traffic of a server.
+
+The counters include clients that disconnected already. The rates are
+measured since the snapshot passed as `previous` to `Server.stats` (or
+the start of the server).
+
+Attributes
+----------
+clients : int
+    The number of registered clients.
+uptime : float
+    The time in s since the server was started.
+packages_in : int
+    The number of packages received.
+packages_out : int
+    The number of packages sent.
+bytes_in : int
+    The number of bytes received.
+bytes_out : int
+    The number of bytes sent.
+packages_in_rate : float
+    Packages received per second.
+packages_out_rate : float
+    Packages sent per second.
+bytes_in_rate : float
+    Bytes received per second.
+bytes_out_rate : float
+    Bytes sent per second.
+"""
+
+CaptureRecord = namedtuple('CaptureRecord',
+                           ['kind', 'connection', 'time', 'data'])
+"""
+Namedtuple holding a record of a traffic capture.
+
+Attributes
+----------
+kind : int
+    `TrafficCapture.OPEN`, `TrafficCapture.DATA` or `TrafficCapture.CLOSE`.
+connection : int
+    The id of the connection.
+time : float
+    The time in s since the capture started.
+data : bytes
+    The data received. The address of the client for OPEN records.
+"""
+
+#: `threading.stack_size` is process wide. This lock guards changing it.
+_stack_size_lock = threading.Lock()
+
+#: The maximum number of file descriptors passed with one message.
+HANDOFF_CHUNK_SIZE = 200
+
+
+def _listen_overflows() -> int:
+    """
+    Read the system wide number of dropped connections of full accept queues.
+
+    Returns
+    -------
+    int or None
+        The counter or None if it isn't available (only on linux).
+
+    """
+    try:
+        with open('/proc/net/netstat') as file:
+            lines = file.readlines()
+    except OSError:
+        return None
+
+    # the file consists of pairs of a header line and a line of values
+    for header, values in zip(lines[::2], lines[1::2]):
+        if header.startswith('TcpExt:'):
+            fields = dict(zip(header.split()[1:], values.split()[1:]))
+            if 'ListenOverflows' in fields:
+                return int(fields['ListenOverflows'])
+
+    return None
+
+
+def _recv_exactly(sock, length: int) -> bytes:
+    """Receive exactly `length` bytes from a blocking socket."""
+    data = b''
+    while len(data) < length:
+        part = sock.recv(length - len(data))
+        if not part:
+            raise HandoffError("The connection was closed during handoff.")
+        data += part
+    return data
+
+
+def _send_handoff_message(sock, obj, fds: List[int]):
+    """
+    Send a message and file descriptors over a unix socket.
+
+    The message is a json serializable object. It is sent with its length
+    in front. The file descriptors are attached using SCM_RIGHTS. The method
+    blocks until the remote acknowledged the message.
+
+    """
+    data = json.dumps(obj).encode('utf-8')
+    msg = struct.pack('!I', len(data)) + data
+
+    ancdata = []
+    if fds:
+        ancdata.append((socket.SOL_SOCKET, socket.SCM_RIGHTS,
+                        array.array('i', fds)))
+
+    # the file descriptors are attached to the first byte
+    sent = sock.sendmsg([msg], ancdata)
+    if sent < len(msg):
+        sock.sendall(msg[sent:])
+
+    if _recv_exactly(sock, 1) != b'\x01':
+        raise HandoffError("The handoff message wasn't acknowledged.")
+
+
+def _recv_handoff_message(sock, maxfds: int):
+    """
+    Receive a message sent with `_send_handoff_message`.
+
+    Returns
+    -------
+    tuple (obj, list of int)
+        The message and the received file descriptors.
+
+    """
+    fds = array.array('i')
+    msg, ancdata, flags, dummy = sock.recvmsg(
+        4, socket.CMSG_SPACE(maxfds * fds.itemsize))
+
+    for level, typ, data in ancdata:
+        if level == socket.SOL_SOCKET and typ == socket.SCM_RIGHTS:
+            fds.frombytes(data[:len(data) - (len(data) % fds.itemsize)])
+
+    try:
+        if flags & socket.MSG_CTRUNC:
+            raise HandoffError("Too many file descriptors received.")
+
+        if not msg:
+            raise HandoffError("The connection was closed during handoff.")
+
+        msg += _recv_exactly(sock, 4 - len(msg))
+        length, = struct.unpack('!I', msg)
+        obj = json.loads(_recv_exactly(sock, length).decode('utf-8'))
+
+        sock.sendall(b'\x01')
+    except BaseException:
+        for fd in fds:
+            os.close(fd)
+        raise
+
+    return obj, list(fds)
+
+
+# ---- Traffic Capture
+
+
+class TrafficCapture:
+    """
+    Records the data a server receives to a binary file.
+
+    The file starts with `MAGIC`. Each record consists of a header and the
+    data. The header holds the kind of the record, the id of the connection,
+    the time since the start of the capture in ns and the length of the
+    data (see `HEADER`). Connections start with an OPEN record holding the
+    address and end with a CLOSE record.
+
+    The captured sessions can be replayed with ``benchmarks.replay``.
+
+    Parameters
+    ----------
+    path : str
+        The path of the file. An existing file is overwritten.
+
+    """
+
+    MAGIC = b'ECTECCAP\x01'  #: The first bytes of a capture file
+    HEADER = struct.Struct('<BIQI')  #: kind, connection, time in ns, length
+
+    OPEN = 0  #: A client connected
+    DATA = 1  #: Data was received from a client
+    CLOSE = 2  #: The connection was closed
+
+    def __init__(self, path: str):
+        self._file = open(path, 'wb')
+        self._file.write(self.MAGIC)
+
+        # Guards the file and the ids
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._start = time.monotonic_ns()
+
+    def open(self, address) -> int:
+        """
+        Record a new connection.
+
+        Parameters
+        ----------
+        address : tuple
+            The address of the client.
+
+        Returns
+        -------
+        int
+            The id of the connection.
+
+        """
+        with self._lock:
+            connection = self._next_id
+            self._next_id += 1
+
+        host, port = address[:2]
+        self._write(self.OPEN, connection,
+                    '{}:{}'.format(host, port).encode('utf-8'))
+        return connection
+
+    def data(self, connection: int, data: bytes):
+        """Record data received from a client."""
+        self._write(self.DATA, connection, data)
+
+    def close_connection(self, connection: int):
+        """Record that a connection was closed."""
+        self._write(self.CLOSE, connection, b'')
+
+    def close(self):
+        """Stop capturing and close the file."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _write(self, kind: int, connection: int, data: bytes):
+        """Write a record if the capture wasn't closed."""
+        with self._lock:
+            # the records are written in the order of their time
+            header = self.HEADER.pack(kind, connection,
+                                      time.monotonic_ns() - self._start,
+                                      len(data))
+            if self._file is not None:
+                self._file.write(header)
+                self._file.write(data)
+
+    @classmethod
+    def read(cls, path: str) -> Iterator[CaptureRecord]:
+        """
+        Read the records of a capture file.
+
+        Parameters
+        ----------
+        path : str
+            The path of the file.
+
+        Raises
+        ------
+        ValueError
+            The file isn't a capture.
+
+        Yields
+        ------
+        CaptureRecord
+            The records in the order they were captured.
+
+        """
+        with open(path, 'rb') as file:
+            if file.read(len(cls.MAGIC)) != cls.MAGIC:
+                raise ValueError("Not a capture of ectec traffic.")
+
+            while True:
+                header = file.read(cls.HEADER.size)
+                if len(header) < cls.HEADER.size:
+                    return  # end of file or incomplete record
+
+                kind, connection, ns, length = cls.HEADER.unpack(header)
+                data = file.read(length)
+                if len(data) < length:
+                    return
+
+                yield CaptureRecord(kind, connection, ns / 1e9, data)
+
+
 # ---- Socketserver Implementation
 
 
+class Priority(enum.IntEnum):
+    """
+    The priority classes of the data sent to a client.
+
+    Queued control frames are written before queued bulk frames. A frame
+    that is being written is never interrupted.
+    """
+    CONTROL = 0  #: INFO, UPDATE and ERROR commands
+    BULK = 1  #: packages and everything that must stay in their order
+
+
+class _Frame:
+    """A command queued for a client with its content."""
+
+    __slots__ = ['data', 'chunks', 'sent', 'error']
+
+    def __init__(self, data: bytes, chunks: Iterable[bytes] = None):
+        self.data = data
+
+        #: the content of a streamed frame. Or None.
+        self.chunks = chunks
+
+        #: Whether the frame was written (or failed)
+        self.sent = False
+
+        #: The OSError raised while writing the frame. Or None.
+        self.error: OSError = None
+
+
+class PackageStream:
+    """
+    Forwards the content of a large package to one client while it arrives.
+
+    The chunks put into the stream are written to the client by a separate
+    thread. At most `max_buffer` bytes wait for that thread, so a slow client
+    slows down the sender instead of filling the memory of the server.
+
+    The stream is queued behind the other frames of the client, e.g. another
+    stream. While it waits the sender is held back without a time limit.
+    The timeouts of `put` and `close` only run once the stream is written.
+
+    Contents are never padded. If the stream is closed before `length`
+    bytes were put, nothing is written to the client if the stream didn't
+    start yet. Otherwise the client is disconnected since it can't be kept
+    in sync with the protocol.
+
+    Parameters
+    ----------
+    handler : ClientHandler
+        The handler of the client to forward to.
+    command : bytes
+        The PACKAGE command including the seperator.
+    length : int
+        The length of the content.
+    max_buffer : int
+        The maximum number of bytes buffered. Chunks are counted with
+        `chunk_size` bytes.
+    chunk_size : int
+        The maximum size of a chunk.
+
+    """
+
+    def __init__(self, handler, command: bytes, length: int, max_buffer: int,
+                 chunk_size: int):
+        self.handler = handler
+        self.command = command
+        self.length = length
+
+        #: Whether writing to the client failed or was aborted
+        self.failed = False
+
+        #: Whether the stream was closed before `length` bytes were put
+        self.incomplete = False
+
+        #: Set once the stream is written to the client or failed
+        self.started = threading.Event()
+
+        self._put_bytes = 0
+
+        #: Whether the writer took the end of the stream from the queue
+        self._ended = False
+
+        self._queue = queue.Queue(maxsize=max(max_buffer // chunk_size, 1))
+        self._thread = threading.Thread(target=self._write,
+                                        name="Ectec-Stream",
+                                        daemon=True)
+
+    def start(self):
+        """Start writing to the client."""
+        self._thread.start()
+
+    def put(self, chunk: bytes, timeout: float = None):
+        """
+        Forward a chunk of the content.
+
+        Parameters
+        ----------
+        chunk : bytes
+            The chunk.
+        timeout : float, optional
+            The maximum time to wait for space in the buffer in s once the
+            stream is written. The default is None (no limit).
+
+        Raises
+        ------
+        queue.Full
+            The buffer stayed full for `timeout` seconds.
+
+        """
+        if not self.failed:
+            self._put_bytes += len(chunk)
+            self._enqueue(chunk, timeout)
+
+    def close(self, timeout: float = None):
+        """
+        End the stream and wait until the content was written.
+
+        The client is disconnected if it doesn't accept the rest of the
+        content in time.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            The maximum time to wait in s once the stream is written.
+            The default is None (no limit).
+
+        """
+        self.incomplete = self._put_bytes < self.length
+        try:
+            self._enqueue(None, timeout)
+        except queue.Full:
+            self.abort()
+
+            # the failing writer empties the buffer until the end
+            self._queue.put(None)
+
+        self._thread.join(timeout)
+
+    def abort(self):
+        """Stop forwarding and disconnect the client."""
+        self.failed = True
+        try:
+            # a reason would be queued behind the stream
+            self.handler.disconnect()
+        except OSError:
+            pass  # already closed
+
+    def _enqueue(self, item, timeout: float = None):
+        """Put a chunk or the end into the buffer."""
+        try:
+            self._queue.put_nowait(item)
+            return
+        except queue.Full:
+            pass
+
+        # other frames of the client are written first
+        self.started.wait()
+        self._queue.put(item, timeout=timeout)
+
+    def _chunks(self):
+        """Yield the chunks put into the stream."""
+        self.started.set()
+        if self.incomplete:
+            return  # nothing is written
+
+        written = 0
+        for chunk in iter(self._queue.get, None):
+            written += len(chunk)
+            yield chunk
+        self._ended = True
+
+        if written < self.length:
+            raise ConnectionAbortedError("The content is incomplete.")
+
+    def _write(self):
+        """Write the command and the chunks to the client."""
+        try:
+            self.handler.send_stream(self.command, self._chunks())
+        except OSError:
+            self.abort()
+        finally:
+            self.started.set()
+
+            # unblock `put` and `close`
+            if not self._ended:
+                while self._queue.get() is not None:
+                    pass
+
+
+class PackageFrames:
+    """
+    The frames of a package forwarded to multiple clients.
+
+    Each frame is composed on first use and then shared by all recipients.
+    So the content is copied once per variant instead of once per recipient.
+
+    Parameters
+    ----------
+    handler : ClientHandler
+        The handler composing the commands.
+    package : Package
+        The package.
+    digest : str, optional
+        The hash of the content. The default is None.
+
+    """
+
+    def __init__(self, handler, package: Package, digest: str = None):
+        self.handler = handler
+        self.package = package
+        self.digest = digest
+
+        self._plain: bytes = None
+        self._hashed: bytes = None
+        self._ref: bytes = None
+
+    @property
+    def plain(self) -> bytes:
+        """The PACKAGE command with the content."""
+        if self._plain is None:
+            package = self.package
+            self._plain = self.handler.compose_pkg(
+                package.type, package.sender, package.recipient,
+                len(package.content)) + package.content
+        return self._plain
+
+    @property
+    def hashed(self) -> bytes:
+        """The PACKAGE command with the hash and the content."""
+        if self._hashed is None:
+            package = self.package
+            self._hashed = self.handler.compose_pkg(
+                package.type, package.sender, package.recipient,
+                len(package.content), self.digest) + package.content
+        return self._hashed
+
+    @property
+    def ref(self) -> bytes:
+        """The PACKAGE command referencing the content."""
+        if self._ref is None:
+            package = self.package
+            self._ref = self.handler.compose_ref(package.type, package.sender,
+                                                 package.recipient,
+                                                 self.digest)
+        return self._ref
+
+
+class FanOutPool:
+    """
+    A pool of threads writing a package to many clients in parallel.
+
+    Each client is always served by the same worker. The workers handle
+    their work in order. So the packages arrive at each client in the order
+    they were forwarded.
+
+    Parameters
+    ----------
+    workers : int
+        The number of threads.
+
+    """
+
+    def __init__(self, workers: int):
+        if workers < 1:
+            raise ValueError("`workers` must be positive.")
+
+        self._queues = [queue.SimpleQueue() for i in range(workers)]
+
+        # Guards `_closed` so that no work is queued after stopping
+        self._lock = threading.Lock()
+        self._closed = False
+
+        self._threads = [
+            threading.Thread(target=self._work,
+                             args=(q, ),
+                             name="Ectec-FanOut",
+                             daemon=True) for q in self._queues
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    @property
+    def workers(self) -> int:
+        """The number of threads."""
+        return len(self._threads)
+
+    def forward(self, handlers: Iterable['ClientHandler'],
+                send) -> List['ClientHandler']:
+        """
+        Call `send` for every handler and wait until all calls returned.
+
+        Parameters
+        ----------
+        handlers : iterable of ClientHandler
+            The handlers of the recipients.
+        send : callable
+            Called with a handler. Sends the package to its client.
+
+        Returns
+        -------
+        list of ClientHandler
+            The handlers `send` raised an exception for.
+
+        """
+        shards = [[] for q in self._queues]
+        for handler in handlers:
+            shards[hash(handler) % len(shards)].append(handler)
+
+        results = queue.SimpleQueue()
+        count = 0
+        with self._lock:
+            if self._closed:
+                # send in this thread instead
+                self._send_shard(sum(shards, []), send, results)
+                return results.get()
+
+            for shard, q in zip(shards, self._queues):
+                if shard:
+                    q.put((shard, send, results))
+                    count += 1
+
+        failed = []
+        for i in range(count):
+            failed.extend(results.get())
+        return failed
+
+    def close(self, timeout: float = None):
+        """
+        Stop the threads after the work queued.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            The maximum time to wait for each thread in s.
+            The default is None (no limit).
+
+        """
+        with self._lock:
+            self._closed = True
+            for q in self._queues:
+                q.put(None)
+
+        for thread in self._threads:
+            thread.join(timeout)
+
+    @classmethod
+    def _work(cls, work: queue.SimpleQueue):
+        """Handle the shards from the queue until receiving `None`."""
+        for shard, send, results in iter(work.get, None):
+            cls._send_shard(shard, send, results)
+
+    @staticmethod
+    def _send_shard(shard, send, results: queue.SimpleQueue):
+        """Call `send` for the handlers of a shard and put the failed."""
+        failed = []
+        for handler in shard:
+            try:
+                send(handler)
+            except OSError:
+                failed.append(handler)
+            except Exception:
+                logger.exception("Couldn't forward package.")
+                failed.append(handler)
+        results.put(failed)
+
+
 class ClientHandler(socketserver.BaseRequestHandler):
     """
     Handles one client connecting to the server.
@@ -271,19 +1061,51 @@ class ClientHandler(socketserver.BaseRequestHandler):
     SOCKET_BUFSIZE = 8192  #: bytes to read from socket at once
     COMMAND_SEPERATOR = b'\n'  #: seperates commands of the ectec protocol
     COMMAND_LENGTH = 4096  #: bytes - the maximum length of a command
+    DETACH_POLL_INTERVAL = 0.2  #: s between checks for a detach request
 
-    #: Users with the listed roles are shared with all clients
-    PUBLIC_ROLES = [Role.USER]
+    #: bytes - larger packages are rejected before their content is read
+    MAX_PACKAGE_SIZE = 1 << 30
 
-    # ---- Process (server) wide data
+    #: bytes - larger package contents are forwarded while being received
+    STREAM_THRESHOLD = 1 << 20
 
-    class Locks:
-        """
-        This is a data class holding locks for class variables.
+    #: bytes - the maximum size of the chunks of streamed contents
+    STREAM_CHUNK_SIZE = 1 << 16
 
-        Its puprose is making the code cleaner.
-        """
+    #: bytes - the maximum buffered per recipient of a streamed content
+    STREAM_BUFFER_SIZE = 1 << 22
+
+    #: s a recipient may block a stream before it is disconnected
+    STREAM_TIMEOUT = 10.
+
+    #: s timeout between parts of a streamed content
+    STREAM_PART_TIMEOUT = 10.
+
+    #: The maximum number of bodies kept per client for deduplication
+    DEDUP_ENTRIES = 64
+
+    #: bytes - larger bodies aren't deduplicated
+    DEDUP_MAX_SIZE = 1 << 20
+
+    #: bytes - queued frames are combined into writes up to this size
+    WRITE_BATCH_SIZE = 1 << 16
+
+    #: Packages to at least this many clients use the server's `fanout_pool`
+    FANOUT_THRESHOLD = 8
+
+    #: Users with the listed roles are shared with all clients
+    PUBLIC_ROLES = [Role.USER]
+
+    # ---- Process (server) wide data
+
+    class Locks:
+        """
+        This is a data class holding locks for class variables.
+
+        Its puprose is making the code cleaner.
+        """
         clients: threading.Lock = threading.Lock()
+        groups: threading.Lock = threading.Lock()
 
     clients: Dict[str, List[ClientData]] = {role.value: [] for role in Role}
     """
@@ -293,6 +1115,16 @@ class Locks:
     !!! the keys aren't thread safe
     """
 
+    subscriptions: Dict[str, Set['ClientHandler']] = {}
+    """
+    The members of each group.
+
+    Structure: { 'group': {ClientHandler, ClientHandler},
+               }
+
+    Groups without members are removed.
+    """
+
     # ---- BaseRequestHandler API
 
     def __init__(self, request, client_address, server) -> None:
@@ -315,6 +1147,52 @@ def setup(self):
         #: lock used when accessing socket for sending
         self.sending_lock = threading.Lock()
 
+        #: notified whenever a write to the socket ended
+        self._written = threading.Condition(self.sending_lock)
+
+        #: the frames waiting to be written. One deque per priority.
+        self._lanes: List[deque] = [deque() for p in Priority]
+
+        #: whether a thread is writing to the socket
+        self._writing = False
+
+        #: whether frames are held back until `uncork` is called
+        self._corked = False
+
+        #: set to request that the handler stops handling the client
+        #: without closing the connection (for a handoff)
+        self.detach_requested = threading.Event()
+
+        #: set by the handler when it stopped handling the client
+        self.detached = threading.Event()
+
+        #: bodies received from the client for deduplication or None
+        self.received_bodies: BodyCache = None
+
+        #: hashes of the bodies sent to the client or None
+        self.sent_bodies: BodyCache = None
+
+        #: bytes - the maximum size of deduplicated bodies
+        self.dedup_max_size = 0
+
+        #: the groups the client joined
+        self.joined: Set[str] = set()
+
+        # Statistics. The counters for received data are only changed by
+        # the handling thread, the others with the `sending_lock` held.
+
+        #: time the client connected and the last command was received
+        self.connected = self.last_activity = time.time()
+
+        #: packages and bytes received from and sent to the client
+        self.packages_in = self.packages_out = 0
+        self.bytes_in = self.bytes_out = 0
+
+        #: the capture of the received data and the id of the connection
+        self.capture: TrafficCapture = getattr(self.server, 'capture', None)
+        self.capture_id = self.capture.open(self.client_address) \
+            if self.capture is not None else None
+
         # only this thread accesses the socket for receiving
         # -> no need for a lock in that case
 
@@ -327,6 +1205,8 @@ def handle(self):
         """
         # Set up logging with context info of connection (ip)
         self.log = ConnectionAdapter(logger, self.client_address)
+        self.package_log = ConnectionAdapter(package_logger,
+                                             self.client_address)
 
         # Handle all kinds of exceptions.
         # Log them and send a notice to the client
@@ -383,6 +1263,223 @@ def disconnect(self, reason=""):
         finally:
             self.request.close()
 
+    def cork(self):
+        """
+        Hold back all data sent to the client until `uncork` is called.
+
+        This allows answering multiple pipelined commands with a single
+        write to the socket.
+
+        """
+        with self.sending_lock:
+            self._corked = True
+
+    def uncork(self):
+        """
+        Send all data held back since `cork` was called.
+
+        Raises
+        ------
+        OSError
+            The data couldn't be sent.
+
+        """
+        with self.sending_lock:
+            self._corked = False
+            self._send_frames()
+
+    def send_bytes(self, data: bytes, priority: Priority = Priority.BULK):
+        """
+        Send raw bytes to the client.
+
+        All `send_XXX` methods use this method to access the socket.
+        The data is held back if the handler is corked.
+
+        Parameters
+        ----------
+        data : bytes
+            The bytes to send.
+        priority : Priority, optional
+            The priority of the data. The default is Priority.BULK.
+
+        """
+        with self.sending_lock:
+            self._write(data, priority)
+
+    def _write(self, data: bytes, priority: Priority = Priority.BULK):
+        """
+        Queue raw bytes and wait until they were sent.
+
+        The `sending_lock` must be held. It is released while writing.
+        Data is held back if the handler is corked.
+
+        """
+        frame = _Frame(data)
+        self._lanes[priority].append(frame)
+
+        if not self._corked:
+            self._send_frames(frame)
+
+    def _send_frames(self, frame: _Frame = None):
+        """
+        Write the queued frames until `frame` was sent.
+
+        Whichever thread finds the socket idle writes the next frames
+        to it. Control frames are written first. Other frames are combined
+        into writes of up to `WRITE_BATCH_SIZE` bytes. Streamed frames are
+        only written by the thread that queued them.
+
+        The `sending_lock` must be held. It is released while writing.
+
+        Parameters
+        ----------
+        frame : _Frame, optional
+            The frame to wait for. The default is None (until no frame
+            can be written).
+
+        Raises
+        ------
+        OSError
+            `frame` couldn't be sent.
+
+        """
+        while frame is None or not frame.sent:
+            if self._writing:
+                self._written.wait()
+                continue
+
+            batch = self._pop_frames(frame)
+            if not batch:
+                if frame is None:
+                    return
+
+                # the next frame is streamed by another thread
+                self._written.wait()
+                continue
+
+            self._writing = True
+            self.sending_lock.release()
+            error = None
+            written = 0
+            try:
+                if batch[0].chunks is None:
+                    data = b''.join(f.data for f in batch)
+                    self.request.sendall(data)
+                    written = len(data)
+                else:
+                    # the command is sent with the first chunk
+                    for chunk in batch[0].chunks:
+                        if not written:
+                            self.request.sendall(batch[0].data)
+                            written = len(batch[0].data)
+                        self.request.sendall(chunk)
+                        written += len(chunk)
+            except OSError as exc:
+                error = exc
+            finally:
+                self.sending_lock.acquire()
+                self._writing = False
+                self.bytes_out += written
+                for sent in batch:
+                    sent.sent = True
+                    sent.error = error
+                self._written.notify_all()
+
+        if frame.error is not None:
+            raise frame.error
+
+    def _pop_frames(self, frame: _Frame = None) -> List[_Frame]:
+        """Take the next frames to write. The `sending_lock` must be held."""
+        # a stream flushes the frames held back before it
+        held = self._corked and (frame is None or frame.chunks is None)
+
+        batch = []
+        size = 0
+        for lane in self._lanes:
+            while lane:
+                head = lane[0]
+                if head.chunks is not None:
+                    if not batch and head is frame:
+                        batch.append(lane.popleft())
+                    return batch
+
+                if held or batch and \
+                        size + len(head.data) > self.WRITE_BATCH_SIZE:
+                    return batch
+
+                batch.append(lane.popleft())
+                size += len(head.data)
+
+        return batch
+
+    def send_stream(self, command: bytes, chunks: Iterable[bytes]):
+        """
+        Send a command followed by content arriving in chunks.
+
+        Nothing else is sent to the client in between. Data held back by
+        `cork` is sent before. The command is sent with the first chunk.
+        So nothing is sent if `chunks` ends right away.
+
+        Parameters
+        ----------
+        command : bytes
+            The command including the seperator.
+        chunks : iterable of bytes
+            The content.
+
+        """
+        with self.sending_lock:
+            frame = _Frame(command, chunks)
+            self._lanes[Priority.BULK].append(frame)
+            self._send_frames(frame)
+            self.packages_out += 1
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        Wait until all data that is currently being sent was sent.
+
+        Data held back by `cork` isn't waited for.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            The maximum time to wait in s. The default is None (no limit).
+
+        Returns
+        -------
+        bool
+            Whether all data was sent before the timeout.
+
+        """
+        if timeout is not None and timeout < 0:
+            timeout = 0
+
+        with self._written:
+            return self._written.wait_for(
+                lambda: not self._writing and
+                (self._corked or not any(self._lanes)), timeout)
+
+    def stats(self) -> ClientStats:
+        """
+        Get statistics about the connection to the client.
+
+        The counters are read without a lock. They may be from slightly
+        different moments.
+
+        Returns
+        -------
+        ClientStats
+            The statistics.
+
+        """
+        client_data = self.client_data
+        return ClientStats(client_data.name, client_data.role,
+                           Address._make(client_data.address), self.connected,
+                           self.last_activity, self.packages_in,
+                           self.packages_out, self.bytes_in, self.bytes_out,
+                           sum(len(lane) for lane in self._lanes),
+                           len(self.buffer))
+
     #: The regex defining the characters of a clients name
     regex_name = re.compile(r"\w+")
 
@@ -408,6 +1505,15 @@ def run(self):
             The version number received was invalid.
 
         """
+        # ---- Resume a client handed over by another server
+        pop_resumed_state = getattr(self.server, 'pop_resumed_state', None)
+        state = pop_resumed_state(self.request) if pop_resumed_state else None
+
+        if state:
+            role = self.resume(state)
+            self.handle_client(role)
+            return
+
         # ---- Version check
 
         # Receive version number
@@ -434,9 +1540,45 @@ def run(self):
 
         self.log.debug("Version check passed. Sending answer.")
 
-        # Version is compatible - tell the client
-        self.send_info(True)
+        # A client using the pipelined handshake sends the REGISTER command
+        # right after the INFO command without awaiting the answer.
+        # Both answers are sent together in that case.
+        if self.COMMAND_SEPERATOR in self.buffer:
+            self.log.debug("Pipelined handshake.")
+            self.cork()
+
+        try:
+            # Version is compatible - tell the client
+            self.send_info(True)
+
+            role = self.register()
+        finally:
+            self.uncork()
+
+        self.handle_client(role)
+
+    def register(self) -> Role:
+        """
+        Run the register part of the ectec protocoll.
+
+        This receives the REGISTER command, registers the client in `clients`
+        and sends the user list updates.
+
+        Raises
+        ------
+        RequestRefusedError
+            The register attempt was refused.
+        CommandError
+            The REGISTER command was too long.
+        CommandTimeout
+            The REGISTER command timed out.
+
+        Returns
+        -------
+        Role
+            The role the client registered as.
 
+        """
         # ---- Register
 
         # Receive the role and name of the user
@@ -481,23 +1623,72 @@ def run(self):
         if role in self.PUBLIC_ROLES:
 
             # Update user lists of all clients
-            with self.Locks.clients:
-                for dummy, client_list in self.clients.items():
-                    for client in client_list:
-                        try:
-                            client.handler.send_update(lock=False)
-                        except OSError:
-                            # client disconnected
-                            pass
-                        except Exception as error:
-                            self.log.debug(
-                                f"Couldn't update because {str(error)}")
+            self.broadcast_update()
         else:
             # This client has no list yet.
             # It always needs an update
             self.send_update()
 
-        self.handle_client(role)
+        return role
+
+    def resume(self, state: ClientState) -> Role:
+        """
+        Register a client handed over by another server.
+
+        The client already went through the register sequence. Therefore
+        neither the version check nor a user update is done.
+
+        Parameters
+        ----------
+        state : ClientState
+            The state of the client at the other server.
+
+        Returns
+        -------
+        Role
+            The role of the client.
+
+        """
+        role = Role(state.role)
+        self.buffer = state.buffer
+
+        if state.dedup:
+            self.import_dedup(state.dedup)
+
+        for group in state.groups:
+            self.join_group(group)
+
+        with self.Locks.clients:
+            self.client_data = ClientData(state.name, role,
+                                          Address._make(state.address), self)
+            self.clients[role.value].append(self.client_data)
+
+        self.log.info("Resumed as {0}, {1}".format(state.name, role.value))
+
+        return role
+
+    def wait_readable(self, timeout: float) -> bool:
+        """
+        Wait until data from the client can be received.
+
+        Parameters
+        ----------
+        timeout : float
+            The maximum time to wait in s.
+
+        Returns
+        -------
+        bool
+            Whether data (or the end of the connection) can be received.
+
+        """
+        try:
+            readable, dummy, dummy = select.select([self.request], [], [],
+                                                   timeout)
+        except (OSError, ValueError):
+            return True  # socket closed -> the next `recv` fails
+
+        return bool(readable)
 
     def handle_client(self, role: Role):
         """
@@ -530,121 +1721,632 @@ def handle_user(self):
         """
         # Receive packages
         while True:
+            if self.detach_requested.is_set():
+                # Stop handling between two commands
+                self.detached.set()
+                return
+
+            # Check for detach requests regularly while the client is idle
+            if not self.buffer and not self.wait_readable(
+                    self.DETACH_POLL_INTERVAL):
+                continue
+
             try:
-                package = self.recv_pkg()
+                raw_cmd = self.recv_command(self.COMMAND_LENGTH, None,
+                                            self.COMMAND_TIMEOUT)
+                self.last_activity = time.time()
+                cmd = raw_cmd.decode(encoding='utf-8',
+                                     errors='backslashreplace')
+
+                match = self.regex_cache.fullmatch(cmd)
+                if match:
+                    self.enable_dedup(int(match.group(1)))
+                    continue
+
+                match = self.regex_join.fullmatch(cmd)
+                if match:
+                    self.join_group(match.group(1))
+                    continue
+
+                match = self.regex_part.fullmatch(cmd)
+                if match:
+                    self.part_group(match.group(1))
+                    continue
+
+                match = self.regex_ref.fullmatch(cmd)
+                if match:
+                    package = self.resolve_ref(*match.groups())
+                    digest = match.group(4)
+                else:
+                    header = self.parse_pkg_header(cmd)
+                    digest = header[4]
+
+                    if header[3] > self.MAX_PACKAGE_SIZE:
+                        self.reject_pkg(*header[:4])
+                        continue
+
+                    if header[3] > self.STREAM_THRESHOLD:
+                        self.stream_pkg(*header[:4])
+                        self.packages_in += 1
+                        continue
+
+                    package = self.recv_pkg_content(*header[:4])
+
+                    if digest:
+                        package = self.store_body(package, digest)
             except (OSError, ConnectionClosed) as error:  # Connection closed
                 return
             except CommandTimeout as error:
                 # wait for next command
                 self.send_error(error)
+                continue
             except CommandError as error:
                 # wait for next command
                 self.send_error(error)
+                continue
 
-            command = "PACKAGE {} FROM {} TO {} WITH {} [{}]"
-            self.log.info(
-                command.format(package.type, package.sender, package.recipient,
-                               len(package.content), id(package)))
+            self.packages_in += 1
 
-            # forward package
-            with self.Locks.clients:
-                for client in self.clients[Role.USER.value]:
-                    if client.name == self.client_data.name:
-                        continue
-                    try:
-                        client.handler.send_pkg(package)
-                        self.log.debug("Forward package {} to {}.".format(
-                            id(package), client.name))
-                    except OSError:
-                        # client already disconnected
-                        self.log.debug("Couldn't forward package to " +
-                                       f"{client.address.ip}")
+            # formatted lazily if the level is enabled
+            self.package_log.info("PACKAGE %s FROM %s TO %s WITH %d [%d]",
+                                  package.type, package.sender,
+                                  package.recipient, len(package.content),
+                                  id(package))
 
-    def recv_bytes(self, length, start_timeout=None, timeout=None) -> bytes:
+            self.forward_pkg(package, digest)
+
+    def forward_pkg(self, package: Package, digest: str = None):
         """
-        Receive a specified number of bytes.
+        Forward a package to its recipients.
+
+        The frames are composed once for all recipients. Packages to at
+        least `FANOUT_THRESHOLD` clients are written in parallel by the
+        `fanout_pool` of the server if it has one. This returns when the
+        package was written to all recipients.
 
         Parameters
         ----------
-        length : int
-            The number of bytes.
-        start_timeout : int, optional
-            The timeout in s for receiving first data. The default is None.
-        timeout : int, optional
-            The timeout in s for all data to be received. The default is None.
+        package : Package
+            The package.
+        digest : str, optional
+            The hash of the content. The default is None.
 
-        Raises
-        ------
-        CommandTimeout
-            The data timed out.
+        """
+        handlers = self.route(package.recipient)
+        frames = PackageFrames(self, package, digest)
 
-        Returns
-        -------
-        bytes
-            The received bytes.
+        def send(handler):
+            handler.send_pkg(package, digest, frames)
 
-        """
-        if length < 1:
-            return b''
+        pool = getattr(self.server, 'fanout_pool', None)
+        if pool is not None and len(handlers) >= self.FANOUT_THRESHOLD:
+            failed = pool.forward(handlers, send)
+        else:
+            failed = []
+            for handler in handlers:
+                try:
+                    send(handler)
+                except OSError:
+                    failed.append(handler)
 
-        msg = self.buffer
-        self.buffer = bytes(0)
-        bufsize = self.SOCKET_BUFSIZE
+        self.package_log.debug("Forward package %d to %d clients.",
+                               id(package), len(handlers) - len(failed))
 
-        if len(msg) < 1:
-            # buffer empty -> command not incoming yet
-            self.request.settimeout(start_timeout)
+        if failed and self.log.isEnabledFor(logs.DEBUG):
+            for handler in failed:
+                # client already disconnected
+                self.log.debug("Couldn't forward package to %s",
+                               handler.client_data.address[0])
 
-            try:
-                msg = self.request.recv(bufsize)  # msg was empty
-            except socket.timeout as error:
-                raise CommandTimeout(
-                    "The receiving of the data timed out.") from error
+    # regular expression for the JOIN command
+    regex_join = re.compile(r"JOIN (\w+)")
 
-            if not msg:
-                # connection was closed
-                raise ConnectionClosed(
-                    "The connection was closed by the client.")
+    # regular expression for the PART command
+    regex_part = re.compile(r"PART (\w+)")
 
-        if len(msg) >= length:  # separator found
-            data = msg[:length]
-            self.buffer = msg[length:]
+    def join_group(self, group: str):
+        """
+        Handle a JOIN command adding the client to a group.
 
-            return data
+        Packages sent to ``#group`` are forwarded to the members only.
 
-        # Data wasn't received completely yet.
-        self.request.settimeout(self.TRANSMISSION_TIMEOUT)
+        ::
 
-        # read out the most precice system clock for timeouting
-        start_time = time.perf_counter_ns()
+            JOIN (\\w+)
+                 -----
+                 group
 
-        # convert timeout to ns (nanoseconds)
-        timeout = timeout * 0.000000001 if timeout is not None else None
+        Parameters
+        ----------
+        group : str
+            The name of the group.
 
-        data_length = len(msg)
-        needed = length - data_length
-        while True:  # ends by an error or a return
-            try:
-                part = self.request.recv(bufsize)
-            except socket.timeout as error:
-                raise CommandTimeout("Data parts timed out.") from error
+        """
+        with self.Locks.groups:
+            self.subscriptions.setdefault(group, set()).add(self)
+            self.joined.add(group)
 
-            if not part:
-                # connection was closed
-                raise ConnectionClosed(
-                    "The connection was closed by the client.")
+        self.log.debug("Joined #{}.".format(group))
 
-            time_elapsed = time.perf_counter_ns() - start_time
+    def part_group(self, group: str):
+        """
+        Handle a PART command removing the client from a group.
 
-            part_length = len(part)
+        ::
 
-            if part_length >= needed:
-                data = msg + part[:needed]
-                self.buffer = part[needed:]
-                return data
+            PART (\\w+)
+                 -----
+                 group
 
-            # check time
-            if timeout is not None and time_elapsed > timeout:
+        Parameters
+        ----------
+        group : str
+            The name of the group.
+
+        """
+        with self.Locks.groups:
+            self.joined.discard(group)
+
+            members = self.subscriptions.get(group)
+            if members is None:
+                return
+
+            members.discard(self)
+            if not members:
+                del self.subscriptions[group]
+
+        self.log.debug("Left #{}.".format(group))
+
+    def route(self, recipient: str) -> List['ClientHandler']:
+        """
+        Get the handlers of the clients a package is forwarded to.
+
+        Packages sent to groups (``#group``) are forwarded to the members of
+        the groups and the users named additionally. Other packages are
+        forwarded to all users. The sender is never included.
+
+        Parameters
+        ----------
+        recipient : str
+            The recipients seperated by commas.
+
+        Returns
+        -------
+        list of ClientHandler
+            The handlers.
+
+        """
+        recipients = recipient.split(',')
+        groups = [name[1:] for name in recipients if name.startswith('#')]
+
+        if not groups:
+            with self.Locks.clients:
+                return [
+                    client.handler
+                    for client in self.clients[Role.USER.value]
+                    if client.handler is not self
+                ]
+
+        handlers = set()
+        with self.Locks.groups:
+            for group in groups:
+                handlers.update(self.subscriptions.get(group, ()))
+
+        names = {name.lower() for name in recipients
+                 if not name.startswith('#')}
+        if names:
+            with self.Locks.clients:
+                handlers.update(client.handler
+                                for client in self.clients[Role.USER.value]
+                                if client.name.lower() in names)
+
+        handlers.discard(self)
+
+        return list(handlers)
+
+    def enable_dedup(self, entries: int):
+        """
+        Handle a CACHE command enabling the deduplication of bodies.
+
+        The client keeps the last `entries` bodies it sent and received
+        with a hash. The server answers with the number of entries and the
+        maximum body size it uses. Both ends use these values from then on.
+        0 entries disable the deduplication.
+
+        ::
+
+            CACHE (\\d+) (\\d+)
+                  ----- -----
+                  entries max-size
+
+        Parameters
+        ----------
+        entries : int
+            The number of bodies the client wants to keep.
+
+        """
+        entries = min(entries, self.DEDUP_ENTRIES)
+        max_size = min(self.DEDUP_MAX_SIZE, self.STREAM_THRESHOLD,
+                       self.MAX_PACKAGE_SIZE) if entries else 0
+
+        command = 'CACHE {} {}'.format(entries, max_size).encode('utf-8') + \
+            self.COMMAND_SEPERATOR
+
+        # No package may be forwarded in between
+        with self.sending_lock:
+            if entries:
+                self.received_bodies = BodyCache(entries)
+                self.sent_bodies = BodyCache(entries)
+            else:
+                self.received_bodies = self.sent_bodies = None
+            self.dedup_max_size = max_size
+
+            self._write(command)
+
+        self.log.debug("Deduplicating {} bodies.".format(entries))
+
+    def export_dedup(self) -> dict:
+        """
+        Get the state of the deduplication for a handoff.
+
+        Returns
+        -------
+        dict or None
+            JSON serializable state. None if the deduplication isn't enabled.
+
+        """
+        with self.sending_lock:
+            if self.received_bodies is None:
+                return None
+
+            return {
+                'entries': self.received_bodies.max_entries,
+                'max_size': self.dedup_max_size,
+                'received': [[digest,
+                              base64.b64encode(body).decode('ascii')]
+                             for digest, body in self.received_bodies.items()],
+                'sent': [digest for digest, dummy in self.sent_bodies.items()]
+            }
+
+    def import_dedup(self, state: dict):
+        """
+        Restore the state of the deduplication after a handoff.
+
+        Parameters
+        ----------
+        state : dict
+            The state returned by `export_dedup`.
+
+        """
+        with self.sending_lock:
+            self.received_bodies = BodyCache(state['entries'])
+            self.sent_bodies = BodyCache(state['entries'])
+            self.dedup_max_size = state['max_size']
+
+            for digest, body in state['received']:
+                self.received_bodies.put(digest, base64.b64decode(body))
+            for digest in state['sent']:
+                self.sent_bodies.put(digest, None)
+
+    def store_body(self, package: Package, digest: str) -> Package:
+        """
+        Check the hash of a received package and cache its body.
+
+        Parameters
+        ----------
+        package : Package
+            The package.
+        digest : str
+            The hash sent with the package.
+
+        Raises
+        ------
+        CommandError
+            The hash doesn't match the content.
+
+        Returns
+        -------
+        Package
+            The package. Its content is the cached body.
+
+        """
+        if content_hash(package.content) != digest:
+            raise CommandError("Hash doesn't match the content.")
+
+        if (self.received_bodies is None
+                or len(package.content) > self.dedup_max_size):
+            return package
+
+        return package._replace(
+            content=self.received_bodies.put(digest, package.content))
+
+    def resolve_ref(self, typ: str, sender: str, recipient: str,
+                    digest: str) -> Package:
+        """
+        Get the package referenced by a REF command.
+
+        ::
+
+            PACKAGE ([\\w/.-]+) FROM ([\\w]+) TO ([\\w,#]+) REF ([0-9a-f]{64})
+                    ----------      ----------    ----------     ------------
+                    content-type    sender        recipient      content-hash
+
+        Parameters
+        ----------
+        typ : str
+            The content type.
+        sender : str
+            The sender.
+        recipient : str
+            The recipients seperated by commas.
+        digest : str
+            The hash of the body.
+
+        Raises
+        ------
+        CommandError
+            The body isn't cached.
+
+        Returns
+        -------
+        Package
+            The package.
+
+        """
+        body = None
+        if self.received_bodies is not None:
+            body = self.received_bodies.get(digest)
+
+        if body is None:
+            raise CommandError("Unknown reference {}.".format(digest))
+
+        return Package(sender, recipient, typ, body)
+
+    def reject_pkg(self, typ: str, sender: str, recipient: str, length: int):
+        """
+        Reject a package exceeding `MAX_PACKAGE_SIZE`.
+
+        The content isn't read. So the client is told with an ERROR command
+        and disconnected since it can't be kept in sync with the protocol.
+
+        Parameters
+        ----------
+        typ : str
+            The content type.
+        sender : str
+            The sender.
+        recipient : str
+            The recipients seperated by commas.
+        length : int
+            The length of the content.
+
+        Raises
+        ------
+        ConnectionClosed
+            The connection was closed.
+
+        """
+        self.log.warning("Rejected PACKAGE {} FROM {} WITH {}.".format(
+            typ, sender, length))
+
+        reason = "Package too large: {} bytes exceed the limit of {} " \
+            "bytes.".format(length, self.MAX_PACKAGE_SIZE)
+        self.disconnect(reason)
+        raise ConnectionClosed(reason)
+
+    def stream_pkg(self, typ: str, sender: str, recipient: str, length: int):
+        """
+        Forward a package to the other clients while receiving its content.
+
+        The content is never held in memory completely. Each recipient gets
+        its own `PackageStream` with a buffer of `STREAM_BUFFER_SIZE` bytes.
+        Recipients that don't accept data for `STREAM_TIMEOUT` seconds while
+        their stream is written are disconnected. The sender is disconnected
+        if a part of the content times out.
+
+        Parameters
+        ----------
+        typ : str
+            The content type.
+        sender : str
+            The sender.
+        recipient : str
+            The recipients seperated by commas.
+        length : int
+            The length of the content.
+
+        Raises
+        ------
+        ConnectionClosed
+            The connection was closed by the client or the content
+            timed out.
+
+        """
+        command = self.compose_pkg(typ, sender, recipient, length)
+
+        self.package_log.info("PACKAGE %s FROM %s TO %s WITH %d [streamed]",
+                              typ, sender, recipient, length)
+
+        handlers = self.route(recipient)
+
+        streams = []
+        for handler in handlers:
+            stream = PackageStream(handler, command, length,
+                                   self.STREAM_BUFFER_SIZE,
+                                   self.STREAM_CHUNK_SIZE)
+            stream.start()
+            streams.append(stream)
+
+        try:
+            for chunk in self.recv_chunks(length, self.STREAM_CHUNK_SIZE):
+                for stream in streams:
+                    if stream.failed:
+                        continue
+                    try:
+                        stream.put(chunk, self.STREAM_TIMEOUT)
+                    except queue.Full:
+                        stream.abort()
+        except CommandTimeout as error:
+            # the rest of the content can't be told apart from commands
+            self.disconnect("Parts of the content timed out.")
+            raise ConnectionClosed("The content timed out.") from error
+        finally:
+            # incomplete contents are dropped by the streams
+            for stream in streams:
+                stream.close(self.STREAM_TIMEOUT)
+
+    def recv_chunks(self, length: int, chunk_size: int) -> Iterator[bytes]:
+        """
+        Receive a specified number of bytes in chunks.
+
+        The buffer is read first. The timeout between two parts is
+        `STREAM_PART_TIMEOUT`.
+
+        Parameters
+        ----------
+        length : int
+            The number of bytes.
+        chunk_size : int
+            The maximum size of a chunk.
+
+        Raises
+        ------
+        CommandTimeout
+            The data timed out.
+        ConnectionClosed
+            The connection was closed by the client.
+
+        Yields
+        ------
+        bytes
+            The chunks.
+
+        """
+        buffer = self.buffer
+        self.buffer = buffer[length:]
+        buffer = buffer[:length]
+        for i in range(0, len(buffer), chunk_size):
+            yield buffer[i:i + chunk_size]
+
+        needed = length - len(buffer)
+        if not needed:
+            return
+
+        self.request.settimeout(self.STREAM_PART_TIMEOUT)
+
+        while needed:
+            try:
+                part = self.request.recv(min(chunk_size, needed))
+            except socket.timeout as error:
+                raise CommandTimeout("Data parts timed out.") from error
+
+            if not part:
+                # connection was closed
+                raise ConnectionClosed(
+                    "The connection was closed by the client.")
+
+            self._received(part)
+            needed -= len(part)
+            yield part
+
+    def _received(self, data: bytes):
+        """Count the bytes received from the client and capture them."""
+        self.bytes_in += len(data)
+        if self.capture is not None:
+            self.capture.data(self.capture_id, data)
+
+    def recv_bytes(self, length, start_timeout=None, timeout=None) -> bytes:
+        """
+        Receive a specified number of bytes.
+
+        Parameters
+        ----------
+        length : int
+            The number of bytes.
+        start_timeout : int, optional
+            The timeout in s for receiving first data. The default is None.
+        timeout : int, optional
+            The timeout in s for all data to be received. The default is None.
+
+        Raises
+        ------
+        CommandTimeout
+            The data timed out.
+
+        Returns
+        -------
+        bytes
+            The received bytes.
+
+        """
+        if length < 1:
+            return b''
+
+        msg = self.buffer
+        self.buffer = bytes(0)
+        bufsize = self.SOCKET_BUFSIZE
+
+        if len(msg) < 1:
+            # buffer empty -> command not incoming yet
+            self.request.settimeout(start_timeout)
+
+            try:
+                msg = self.request.recv(bufsize)  # msg was empty
+            except socket.timeout as error:
+                raise CommandTimeout(
+                    "The receiving of the data timed out.") from error
+
+            if not msg:
+                # connection was closed
+                raise ConnectionClosed(
+                    "The connection was closed by the client.")
+
+            self._received(msg)
+
+        if len(msg) >= length:  # separator found
+            data = msg[:length]
+            self.buffer = msg[length:]
+
+            return data
+
+        # Data wasn't received completely yet.
+        self.request.settimeout(self.TRANSMISSION_TIMEOUT)
+
+        # read out the most precice system clock for timeouting
+        start_time = time.perf_counter_ns()
+
+        # convert timeout to ns (nanoseconds)
+        timeout = timeout * 1000000000 if timeout is not None else None
+
+        # Joining the parts at the end avoids copying the data received
+        # so far for every part.
+        parts = [msg]
+        data_length = len(msg)
+        needed = length - data_length
+        while True:  # ends by an error or a return
+            try:
+                part = self.request.recv(bufsize)
+            except socket.timeout as error:
+                raise CommandTimeout("Data parts timed out.") from error
+
+            if not part:
+                # connection was closed
+                raise ConnectionClosed(
+                    "The connection was closed by the client.")
+
+            self._received(part)
+            time_elapsed = time.perf_counter_ns() - start_time
+
+            part_length = len(part)
+
+            if part_length >= needed:
+                parts.append(part[:needed])
+                data = b''.join(parts)
+                self.buffer = part[needed:]
+                return data
+
+            # check time
+            if timeout is not None and time_elapsed > timeout:
                 raise CommandTimeout("Receiving of a data took too long" +
                                      f". {time_elapsed} nanoseconds" +
                                      " have already past.")
@@ -655,7 +2357,7 @@ def recv_bytes(self, length, start_timeout=None, timeout=None) -> bytes:
             needed = length - data_length
 
             # add part to local buffer
-            msg += part
+            parts.append(part)
 
     def recv_command(self,
                      max_length,
@@ -714,6 +2416,8 @@ class variable `COMMAND_SEPERATOR`. Commands also must not exceed a
                 raise ConnectionClosed(
                     "The connection was closed by the client.")
 
+            self._received(msg)
+
         # check buffer or first data received
         i = msg.find(seperator)
 
@@ -729,6 +2433,10 @@ class variable `COMMAND_SEPERATOR`. Commands also must not exceed a
 
             return command
 
+        if len(msg) > max_length:
+            # too long -> don't wait for the rest
+            raise CommandError(f"Command too long: over {max_length} bytes")
+
         # Command wasn't received completely yet.
         self.request.setblocking(True)
         self.request.settimeout(self.TRANSMISSION_TIMEOUT)
@@ -737,8 +2445,11 @@ class variable `COMMAND_SEPERATOR`. Commands also must not exceed a
         start_time = time.perf_counter_ns()
 
         # convert timeout to ns (nanoseconds)
-        timeout = timeout * 0.000000001 if timeout is not None else None
+        timeout = timeout * 1000000000 if timeout is not None else None
 
+        # Appending to a bytearray avoids copying the data received
+        # so far for every part.
+        data = bytearray(msg)
         length = len(msg)
         while True:  # ends by an error or a return
             try:
@@ -751,21 +2462,22 @@ class variable `COMMAND_SEPERATOR`. Commands also must not exceed a
                 raise ConnectionClosed(
                     "The connection was closed by the client.")
 
+            self._received(part)
             time_elapsed = time.perf_counter_ns() - start_time
 
             i = part.find(seperator)  # end of command?
             if i >= 0:  # separator found
-                command = msg + part[:i]
                 self.buffer = part[i + len(seperator):]  # seperator is removed
 
-                # for expected behavoir check length of command
-                cmd_length = len(command)
+                # check the length before adding the part
+                cmd_length = length + i
                 if cmd_length > max_length:
                     raise CommandError(
                         f"Command too long: {cmd_length} bytes" +
                         f" from {max_length}")
 
-                return command
+                data += part[:i]
+                return bytes(data)
 
             # check time
             if timeout is not None and time_elapsed > timeout:
@@ -783,7 +2495,7 @@ class variable `COMMAND_SEPERATOR`. Commands also must not exceed a
                     f"Command too long: over {max_length} bytes")
 
             # add part to local buffer
-            msg += part
+            data += part
 
     # regular expression for the INFO command
     regex_info = re.compile(r"INFO ([\w+.\-]+)")
@@ -855,8 +2567,15 @@ def recv_register(self):
         return match.group(1), match.group(2)
 
     # regular expression for the PACKAGE command
-    regex_package = re.compile(
-        r"PACKAGE ([\w/.-]+) FROM ([\w]+) TO ([\w,]+) WITH (\d+)")
+    regex_package = re.compile(r"PACKAGE ([\w/.-]+) FROM ([\w]+) TO ([\w,#]+)"
+                               r" WITH (\d+)(?: HASH ([0-9a-f]{64}))?")
+
+    # regular expression for a PACKAGE command referencing a cached body
+    regex_ref = re.compile(r"PACKAGE ([\w/.-]+) FROM ([\w]+) TO ([\w,#]+)"
+                           r" REF ([0-9a-f]{64})")
+
+    # regular expression for the CACHE command
+    regex_cache = re.compile(r"CACHE (\d+)")
 
     def recv_pkg(self, timeout=None):
         """
@@ -866,11 +2585,12 @@ def recv_pkg(self, timeout=None):
         stream of bytes. The number of bytes is specified by the field
         `content-length` in human readable format.
         Multiple recipients are seperated by a `,`. The recipient `all`
-        matches every recipient. There is only one sender allowed.
+        matches every recipient. Recipients starting with `#` are groups.
+        There is only one sender allowed.
 
         ::
 
-            PACKAGE ([\\w/.-]+) FROM ([\\w]+) TO ([\\w,]+) WITH (\\d+)
+            PACKAGE ([\\w/.-]+) FROM ([\\w]+) TO ([\\w,#]+) WITH (\\d+)
                     ----------      ----------    ----------      -----
                     content-type    sender        recipient      content-length
 
@@ -891,23 +2611,95 @@ def recv_pkg(self, timeout=None):
             the packages fields in a namedtuple.
 
         """
-        raw_cmd = self.recv_command(self.COMMAND_LENGTH, timeout,
-                                    self.COMMAND_TIMEOUT)
-        cmd = raw_cmd.decode(encoding='utf-8', errors='backslashreplace')
+        return self.recv_pkg_content(*self.recv_pkg_header(timeout))
 
-        # match regular expression on the whole text
-        match = self.regex_package.fullmatch(cmd)
+    def recv_pkg_header(self, timeout=None) -> Tuple[str, str, str, int]:
+        """
+        Receive the command of a package without its content.
 
-        if not match:
-            raise CommandError("Received data doesn't match PACKAGE command.")
+        Parameters
+        ----------
+        timeout : float
+            The timeout for when the package should arrive.
+            The default is None.
+
+        Raises
+        ------
+        CommandError
+            Wrong command.
+
+        Returns
+        -------
+        tuple of (str, str, str, int)
+            The content type, sender, recipient and content length.
+
+        """
+        raw_cmd = self.recv_command(self.COMMAND_LENGTH, timeout,
+                                    self.COMMAND_TIMEOUT)
+        cmd = raw_cmd.decode(encoding='utf-8', errors='backslashreplace')
+
+        return self.parse_pkg_header(cmd)[:4]
+
+    def parse_pkg_header(self, cmd: str) -> Tuple[str, str, str, int, str]:
+        """
+        Parse the command of a package.
+
+        The content can be identified by a hash (hex encoded SHA-256).
+        Bodies with a hash are deduplicated.
+
+        ::
 
-        type_code = match.group(1)
-        sender = match.group(2)
-        recipient = match.group(3)
+            PACKAGE ([\\w/.-]+) FROM ([\\w]+) TO ([\\w,#]+) WITH (\\d+)
+            [ HASH ([0-9a-f]{64})]
 
-        # decode length
-        length = int(match.group(4))
+        Parameters
+        ----------
+        cmd : str
+            The decoded command.
+
+        Raises
+        ------
+        CommandError
+            Wrong command.
+
+        Returns
+        -------
+        tuple of (str, str, str, int, str)
+            The content type, sender, recipient, content length and hash.
+            The hash is None if the command didn't contain one.
+
+        """
+        # match regular expression on the whole text
+        match = self.regex_package.fullmatch(cmd)
+
+        if not match:
+            raise CommandError("Received data doesn't match PACKAGE command.")
+
+        return (match.group(1), match.group(2), match.group(3),
+                int(match.group(4)), match.group(5))
+
+    def recv_pkg_content(self, typ: str, sender: str, recipient: str,
+                         length: int) -> Package:
+        """
+        Receive the content of a package whose command was received.
+
+        Parameters
+        ----------
+        typ : str
+            The content type.
+        sender : str
+            The sender.
+        recipient : str
+            The recipients seperated by commas.
+        length : int
+            The length of the content.
 
+        Returns
+        -------
+        package : Package
+            the packages fields in a namedtuple.
+
+        """
         # receive package content
         if length:
             content = self.recv_bytes(length)
@@ -915,9 +2707,7 @@ def recv_pkg(self, timeout=None):
             content = b''
 
         # create package
-        package = Package(sender, recipient, type_code, content)
-
-        return package
+        return Package(sender, recipient, typ, content)
 
     def send_info(self, accepted: bool):
         """
@@ -943,52 +2733,137 @@ def send_info(self, accepted: bool):
         msg = command.encode('utf-8', errors='backslashreplace') + \
             self.COMMAND_SEPERATOR
 
-        with self.sending_lock:
-            self.request.sendall(msg)
+        self.send_bytes(msg, Priority.CONTROL)
 
-    def send_pkg(self, package: Package):
+    def send_pkg(self,
+                 package: Package,
+                 digest: str = None,
+                 frames: PackageFrames = None):
         """
         Send a package command with the packages content.
 
         ::
 
-            PACKAGE [\\w/.-]+ FROM [\\w]+ TO [\\w,]+ WITH \\d+
+            PACKAGE [\\w/.-]+ FROM [\\w]+ TO [\\w,#]+ WITH \\d+
                     --------      -----    ------      ---
                     content-type  sender   recipient   content-length
 
+        If the client enabled deduplication and the hash of the content is
+        given, the hash is sent too. If the client holds the body already,
+        only a reference is sent instead of the content.
+
         Parameters
         ----------
         package : Package
             The namedtuple containing the package data.
+        digest : str, optional
+            The hash of the content. The default is None.
+        frames : PackageFrames, optional
+            The frames shared with other recipients. The default is None.
+
+        """
+        if frames is None:
+            frames = PackageFrames(self, package, digest)
+
+        with self.sending_lock:
+            if (digest is None or self.sent_bodies is None
+                    or len(package.content) > self.dedup_max_size):
+                self._write(frames.plain)
+            elif digest in self.sent_bodies:
+                # mark as used like the client does
+                self.sent_bodies.get(digest)
+                self._write(frames.ref)
+            else:
+                self.sent_bodies.put(digest, None)
+                self._write(frames.hashed)
+
+            self.packages_out += 1
+
+    def compose_ref(self, typ: str, sender: str, recipient: str,
+                    digest: str) -> bytes:
+        """
+        Compose a PACKAGE command referencing a body the client holds.
+
+        Parameters
+        ----------
+        typ : str
+            The content type.
+        sender : str
+            The sender.
+        recipient : str
+            The recipients seperated by commas.
+        digest : str
+            The hash of the body.
+
+        Returns
+        -------
+        bytes
+            The command including the seperator.
+
+        """
+        command = 'PACKAGE {} FROM {} TO {} REF {}'.format(
+            typ, sender, recipient, digest)
+
+        return command.encode('utf-8', errors='backslashreplace') + \
+            self.COMMAND_SEPERATOR
+
+    def compose_pkg(self,
+                    typ: str,
+                    sender: str,
+                    recipient: str,
+                    length: int,
+                    digest: str = None) -> bytes:
+        """
+        Compose a PACKAGE command without the content.
+
+        Parameters
+        ----------
+        typ : str
+            The content type.
+        sender : str
+            The sender.
+        recipient : str
+            The recipients seperated by commas.
+        length : int
+            The length of the content.
+        digest : str, optional
+            The hash of the content. The default is None.
+
+        Raises
+        ------
+        ValueError
+            Some field contains illegal characters.
+
+        Returns
+        -------
+        bytes
+            The command including the seperator.
 
         """
         # check characters of parameters using regexes
-        if not re.fullmatch(r'[\w/.-]+', str(package.type)):
+        if not re.fullmatch(r'[\w/.-]+', str(typ)):
             raise ValueError("Type of package does't match `[\\w/.-]+`.")
-        if not re.fullmatch(r'\w+', str(package.sender)):
+        if not re.fullmatch(r'\w+', str(sender)):
             raise ValueError("Sender of package does't match `\\w+`.")
-        if not re.fullmatch(r'[\w,]+', str(package.recipient)):
-            raise ValueError("Recipient of package does't match `[\\w,]+`.")
+        if not re.fullmatch(r'[\w,#]+', str(recipient)):
+            raise ValueError("Recipient of package does't match `[\\w,#]+`.")
 
-        # compose and send command
         template = 'PACKAGE {typ} FROM {sender} TO {recipient} WITH {l}'
 
-        length = len(package.content)
-
-        command = template.format(typ=package.type,
-                                  sender=package.sender,
-                                  recipient=package.recipient,
+        command = template.format(typ=typ,
+                                  sender=sender,
+                                  recipient=recipient,
                                   l=str(length))
 
-        data = command.encode('utf-8', errors='backslashreplace') + \
-            self.COMMAND_SEPERATOR + package.content
+        if digest is not None:
+            command += ' HASH ' + digest
 
-        with self.sending_lock:
-            self.request.sendall(data)
+        return command.encode('utf-8', errors='backslashreplace') + \
+            self.COMMAND_SEPERATOR
 
-    def send_update(self, lock=True):
+    def compose_update(self, lock=True) -> bytes:
         """
-        Send an update to the user list of the remote.
+        Compose an UPDATE USERS command with the current user list.
 
         The user list is automatically created from the users in `clients`.
         But users with roles that aren't specified in `PUBLIC_ROLES`
@@ -1004,6 +2879,11 @@ def send_update(self, lock=True):
         lock : bool, optional
             Whether to use the lock for the `clients` member
 
+        Returns
+        -------
+        bytes
+            The command followed by the user list.
+
         """
         template = 'UPDATE USERS {length}'
 
@@ -1030,8 +2910,41 @@ def send_update(self, lock=True):
             self.COMMAND_SEPERATOR + \
             user_list.encode('utf-8', errors='backslashreplace')
 
-        with self.sending_lock:
-            self.request.sendall(data)
+        return data
+
+    def send_update(self, lock=True):
+        """
+        Send an update to the user list of the remote.
+
+        See `compose_update` for the format.
+
+        Parameters
+        ----------
+        lock : bool, optional
+            Whether to use the lock for the `clients` member
+
+        """
+        self.send_bytes(self.compose_update(lock), Priority.CONTROL)
+
+    def broadcast_update(self):
+        """
+        Send an update of the user list to all clients.
+
+        The command is composed once and then sent to every client.
+
+        """
+        with self.Locks.clients:
+            data = self.compose_update(lock=False)
+
+            for dummy, client_list in self.clients.items():
+                for client in client_list:
+                    try:
+                        client.handler.send_bytes(data, Priority.CONTROL)
+                    except OSError:
+                        # client disconnected
+                        pass
+                    except Exception as error:
+                        self.log.debug(f"Couldn't update because {str(error)}")
 
     def send_error(self, error):
         """
@@ -1067,10 +2980,9 @@ def send_error(self, error):
         command = template.format(message=message)
 
         try:
-            with self.sending_lock:
-                self.request.sendall(
-                    command.encode('utf-8', errors='backslashreplace') +
-                    self.COMMAND_SEPERATOR)
+            self.send_bytes(
+                command.encode('utf-8', errors='backslashreplace') +
+                self.COMMAND_SEPERATOR, Priority.CONTROL)
         except OSError:
             self.log.debug("Error couldn't be sent.")
 
@@ -1087,11 +2999,19 @@ def finish(self):
         method succeeded. It should not raise an Excpetion.
 
         """
+        if self.capture is not None:
+            self.capture.close_connection(self.capture_id)
+
         # Unregister client
         if self.client_data:
             role = self.client_data.role
             try:
                 with self.Locks.clients:
+                    # counted by the server from now on
+                    add_traffic = getattr(self.server, 'add_traffic', None)
+                    if add_traffic is not None:
+                        add_traffic(self.stats())
+
                     self.clients[role.value].remove(self.client_data)
             except ValueError:
                 self.log.debug("Client data wasn't found for removal." +
@@ -1099,25 +3019,20 @@ def finish(self):
 
             self.log.info("Unregistered")
 
+            for group in list(self.joined):
+                self.part_group(group)
+
             # ---- Send user update
 
             # the user list only changes if user has a public role
             # this prevents info leakage, traffic and a lock
             # that is time and CPU usage
-            if role in self.PUBLIC_ROLES:
+            # The other clients are disconnected anyway if the server closes.
+            if role in self.PUBLIC_ROLES and not getattr(
+                    self.server, 'closing', False):
 
                 # Update user lists of all clients
-                with self.Locks.clients:
-                    for dummy, client_list in self.clients.items():
-                        for client in client_list:
-                            try:
-                                client.handler.send_update(lock=False)
-                            except OSError:
-                                # client disconnected
-                                pass
-                            except Exception as error:
-                                self.log.debug(
-                                    f"Couldn't update because {str(error)}")
+                self.broadcast_update()
 
     @classmethod
     def check_version(cls, version_str: str) -> bool:
@@ -1161,108 +3076,811 @@ def get_client_list(cls):
             a list of the clients.
 
         """
-        clientl = []
-        for role in cls.clients:
-            clientl += cls.clients[role]
+        clientl = []
+        for role in cls.clients:
+            clientl += cls.clients[role]
+
+        return clientl
+
+    @classmethod
+    def get_groups(cls) -> Dict[str, List[str]]:
+        """
+        Get the groups and their members.
+
+        Returns
+        -------
+        dict of str: list of str
+            The names of the members of each group.
+
+        """
+        with cls.Locks.groups:
+            return {
+                group: sorted(handler.client_data.name for handler in members)
+                for group, members in cls.subscriptions.items()
+            }
+
+
+class EctecTCPMixIn():
+    """
+    A ThreadingMixIn for the TCPServer with some extra functions.
+
+    Most code is from `socketserver.ThreadingMixIn`.
+    When the server is closed, the request sockets connected to clients
+    are closed to. This class also adds the ablity to block all incoming
+    requests from clients.
+    This MixIn should be combined with `socketserver.TCPServer` so that it
+    overrides the methods.
+
+    By default every client is handled by its own thread. If `max_workers`
+    is set a fixed-size pool of worker threads handles the clients instead.
+    Accepted clients wait in a queue until a worker is free. If `max_pending`
+    clients are already waiting, new clients are refused.
+
+    Parameters
+    ----------
+    max_workers : int, optional
+        The maximum number of threads handling clients.
+        None for one thread per client (without limit).
+    max_pending : int, optional
+        The maximum number of clients waiting for a free worker.
+        None for no limit.
+    thread_stack_size : int, optional
+        The stack size of the handling threads in bytes.
+        0 or None for the platform's default.
+    backlog : int, optional
+        The size of the accept queue. None for `request_queue_size`.
+    fanout_workers : int, optional
+        The number of threads writing packages to many clients in parallel
+        (see `FanOutPool`). None to write them in the sender's thread.
+
+    The server can additionally listen on a unix socket (see `listen_unix`).
+    Clients connecting through it are handled exactly like the others. Their
+    address is `(UNIX_SCHEME + path, 0)`.
+
+    """
+
+    # Decides how threads will act upon termination of the
+    # main process
+    daemon_threads = False
+
+    # If true, server_close() waits until all non-daemonic threads terminate.
+    block_on_close = True
+
+    #: The maximum number of threads handling clients. None for unbounded.
+    max_workers = None
+
+    #: The maximum number of clients waiting for a worker. None for no limit.
+    max_pending = None
+
+    #: The stack size for handling threads in bytes. 0 for default.
+    thread_stack_size = 0
+
+    #: Whether the server is closing. Handlers may skip work in that case.
+    closing = False
+
+    #: The size of the accept queue of the listening socket
+    request_queue_size = 128
+
+    #: The prefix of the addresses of clients connected through a unix socket
+    UNIX_SCHEME = 'unix://'
+
+    def __init__(self,
+                 server_address,
+                 RequestHandlerClass,
+                 bind_and_activate=True,
+                 max_workers=None,
+                 max_pending=None,
+                 thread_stack_size=None,
+                 backlog=None,
+                 fanout_workers=None):
+        # Set accept queue size before the server might be activated
+        if backlog is not None:
+            self.request_queue_size = backlog
+
+        # Set execution model before the server might be activated
+        if max_workers is not None:
+            if max_workers < 1:
+                raise ValueError("`max_workers` must be positive.")
+            self.max_workers = max_workers
+        if max_pending is not None:
+            self.max_pending = max_pending
+        if thread_stack_size is not None:
+            self.thread_stack_size = thread_stack_size
+
+        # Threads handling clients. Threads remove themselves on exit.
+        self._threads = set()
+
+        #: The pool forwarding packages to many clients or None
+        self.fanout_pool = FanOutPool(fanout_workers) \
+            if fanout_workers else None
+
+        # Request sockets that are handled or wait to be handled
+        self._requests = set()
+
+        # Request sockets handed over to another server. They aren't shut down.
+        self._detached = set()
+
+        # ClientStates of clients handed over from another server
+        self._resumed = {}
+
+        # Queue of (request, client_address, accept_time) for the workers
+        self._pending = queue.Queue()
+
+        # Guards the counters and sets of the execution model
+        self._pool_lock = threading.Lock()
+        self._pending_count = 0
+        self._busy = 0
+        self._rejected = 0
+        self._delay_total = 0.
+        self._delay_count = 0
+        self._delay_max = 0.
+
+        # Statistics of accepting new connections
+        self._accept_lock = threading.Lock()
+        self._accepted = 0
+        self._refused = 0
+        self._wakeups = 0
+        self._max_batch = 0
+        self._latency_total = 0.
+        self._latency_max = 0.
+        self._max_queue = None
+        self._full_queue = None
+        self._overflows_start = _listen_overflows()
+
+        # Traffic of the clients that disconnected
+        self._traffic_lock = threading.Lock()
+        self._traffic = (0, 0, 0, 0)
+        self._start_time = time.monotonic()
+
+        #: The capture of the received data or None
+        self.capture: TrafficCapture = None
+
+        # Additional listening socket of the AF_UNIX family and its path
+        self.unix_socket = None
+        self.unix_path = None
+
+        # For waking up `serve_forever` when shutting down
+        self._wakeup_recv, self._wakeup_send = socket.socketpair()
+        self._wakeup_recv.setblocking(False)
+        self._wakeup_send.setblocking(False)
+        self._shutdown_request = False
+        self._is_shut_down = threading.Event()
+        self._is_shut_down.set()
+
+        super().__init__(server_address, RequestHandlerClass,
+                         bind_and_activate)
+
+        # Define some extra attributes
+        self.block_new_connections = False
+
+    def serve_forever(self, poll_interval=0.5):
+        """
+        Handle requests until shutdown.
+
+        Same as in BaseServer but `shutdown` wakes up the loop immediately
+        instead of waiting for the end of the current `poll_interval`.
+        All pending connections are accepted when the loop wakes up.
+
+        """
+        self._is_shut_down.clear()
+
+        # Accept until the queue is empty without blocking
+        self.socket.setblocking(False)
+
+        try:
+            with selectors.DefaultSelector() as selector:
+                selector.register(self, selectors.EVENT_READ)
+                selector.register(self._wakeup_recv, selectors.EVENT_READ)
+                if self.unix_socket is not None:
+                    selector.register(self.unix_socket, selectors.EVENT_READ)
+
+                while not self._shutdown_request:
+                    ready = selector.select(poll_interval)
+                    # bpo-35017: shutdown() called during select(), exit.
+                    if self._shutdown_request:
+                        break
+
+                    for key, dummy in ready:
+                        if key.fileobj is self:
+                            self._accept_pending(self.socket)
+                        elif key.fileobj is self.unix_socket:
+                            self._accept_pending(self.unix_socket)
+                        else:
+                            self._clear_wakeup()
+
+                    self.service_actions()
+        finally:
+            self._shutdown_request = False
+            self._is_shut_down.set()
+
+    def _accept_pending(self, listener):
+        """
+        Accept all connections waiting in the accept queue of `listener`.
+
+        At most `request_queue_size` connections are accepted at once so that
+        the loop stays responsive to `shutdown`.
+
+        """
+        wakeup = time.perf_counter()
+        if listener is self.socket:
+            self._observe_queue()
+
+        accepted = 0
+        latencies = []
+        while accepted < self.request_queue_size:
+            # Same as BaseServer._handle_request_noblock
+            try:
+                request, client_address = self.get_request(listener)
+            except (BlockingIOError, InterruptedError):
+                break  # queue empty
+            except OSError:
+                logger.exception("Couldn't accept connection.")
+                break
+
+            accepted += 1
+
+            if self.verify_request(request, client_address):
+                try:
+                    self.process_request(request, client_address)
+                except Exception:
+                    self.handle_error(request, client_address)
+                    self.shutdown_request(request)
+            else:
+                with self._accept_lock:
+                    self._refused += 1
+                self.shutdown_request(request)
+
+            latencies.append(time.perf_counter() - wakeup)
+
+        with self._accept_lock:
+            self._wakeups += 1
+            self._accepted += accepted
+            self._max_batch = max(self._max_batch, accepted)
+            self._latency_total += sum(latencies)
+            if latencies:
+                self._latency_max = max(self._latency_max, latencies[-1])
+
+    def get_request(self, listener=None):
+        """Accept a new connection from the listening socket."""
+        if listener is None:
+            listener = self.socket
+
+        request, client_address = listener.accept()
+
+        # On some platforms the socket inherits the non-blocking mode
+        request.setblocking(True)
+
+        if listener is self.unix_socket:
+            # The client's socket is unnamed. Use the server's path instead.
+            client_address = (self.UNIX_SCHEME + self.unix_path, 0)
+
+        return request, client_address
+
+    def listen_unix(self, path: str):
+        """
+        Listen on a unix socket in addition to the TCP socket.
+
+        This must be called before `serve_forever`. Co-located clients
+        connecting through the unix socket skip the TCP loopback stack.
+        The socket file is removed when the server is closed.
+
+        Parameters
+        ----------
+        path : str
+            The path for the unix socket. Mustn't exist.
+
+        Raises
+        ------
+        OSError
+            Couldn't create the socket e.g. because `path` exists.
+
+        """
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.bind(path)
+            sock.listen(self.request_queue_size)
+            sock.setblocking(False)
+        except OSError:
+            sock.close()
+            raise
+
+        self.unix_socket = sock
+        self.unix_path = path
+
+    def close_unix(self, unlink: bool = True):
+        """
+        Close the unix socket the server listens on.
+
+        Parameters
+        ----------
+        unlink : bool, optional
+            Whether to remove the socket file. The default is True.
+
+        """
+        if self.unix_socket is None:
+            return
+
+        self.unix_socket.close()
+        self.unix_socket = None
+
+        if unlink:
+            try:
+                os.unlink(self.unix_path)
+            except OSError:
+                pass
+
+    def start_capture(self, path: str):
+        """
+        Capture the data received from clients connecting from now on.
+
+        Parameters
+        ----------
+        path : str
+            The path of the capture file. An existing file is overwritten.
+
+        """
+        self.stop_capture()
+        self.capture = TrafficCapture(path)
+
+    def stop_capture(self):
+        """Stop capturing and close the capture file."""
+        capture = self.capture
+        self.capture = None
+        if capture is not None:
+            capture.close()
+
+    def _observe_queue(self):
+        """Record the length of the accept queue if the OS tells it."""
+        # On linux TCP_INFO of a listening socket contains the current length
+        # of the accept queue (tcpi_unacked) and its size (tcpi_sacked).
+        if not hasattr(socket, 'TCP_INFO') or self.socket.family not in (
+                socket.AF_INET, socket.AF_INET6):
+            return
+
+        try:
+            info = self.socket.getsockopt(socket.IPPROTO_TCP, socket.TCP_INFO,
+                                          32)
+            length, size = struct.unpack_from('II', info, 24)
+        except (OSError, struct.error):
+            return
+
+        with self._accept_lock:
+            self._max_queue = max(self._max_queue or 0, length)
+            self._full_queue = (self._full_queue or 0) + (length >= size)
+
+    def accept_stats(self) -> 'AcceptStats':
+        """
+        Get statistics about accepting new connections.
+
+        Returns
+        -------
+        AcceptStats
+            The statistics.
+
+        """
+        overflows = _listen_overflows()
+        if overflows is not None and self._overflows_start is not None:
+            overflows -= self._overflows_start
+        else:
+            overflows = None
+
+        with self._accept_lock:
+            mean_latency = self._latency_total / self._accepted \
+                if self._accepted else 0.
+
+            return AcceptStats(self._accepted, self._refused, self._wakeups,
+                               self._max_batch, mean_latency,
+                               self._latency_max, self.request_queue_size,
+                               self._max_queue, self._full_queue, overflows)
+
+    def add_traffic(self, stats: ClientStats):
+        """
+        Add the traffic of a client that disconnects to the totals.
+
+        This is called by the handler while holding the lock for the list
+        of clients. So each client is counted exactly once.
+
+        Parameters
+        ----------
+        stats : ClientStats
+            The final statistics of the client.
+
+        """
+        with self._traffic_lock:
+            self._traffic = (self._traffic[0] + stats.packages_in,
+                             self._traffic[1] + stats.packages_out,
+                             self._traffic[2] + stats.bytes_in,
+                             self._traffic[3] + stats.bytes_out)
+
+    def traffic_stats(
+        self,
+        previous: 'ServerStats' = None
+    ) -> Tuple['ServerStats', List['ClientStats']]:
+        """
+        Get statistics about the traffic of the server and each client.
+
+        The lock for the list of clients is only held while copying it.
+        No state is kept for the rates. So callers polling at different
+        intervals don't affect each other.
+
+        Parameters
+        ----------
+        previous : ServerStats, optional
+            An earlier snapshot of this server. The rates are measured since
+            then. The default is None (since the start of the server).
+
+        Returns
+        -------
+        ServerStats
+            The statistics of the server.
+        list of ClientStats
+            The statistics of each registered client.
+
+        """
+        handler_class = self.RequestHandlerClass
+        with handler_class.Locks.clients:
+            handlers = [client.handler
+                        for client in handler_class.get_client_list()]
+            with self._traffic_lock:
+                totals = self._traffic
+
+        clients = [handler.stats() for handler in handlers]
+        for stats in clients:
+            totals = (totals[0] + stats.packages_in,
+                      totals[1] + stats.packages_out,
+                      totals[2] + stats.bytes_in,
+                      totals[3] + stats.bytes_out)
+
+        uptime = time.monotonic() - self._start_time
+        if previous is None:
+            elapsed, last_totals = uptime, (0, 0, 0, 0)
+        else:
+            elapsed = uptime - previous.uptime
+            last_totals = (previous.packages_in, previous.packages_out,
+                           previous.bytes_in, previous.bytes_out)
+
+        rates = [(total - last) / elapsed if elapsed > 0 else 0.
+                 for total, last in zip(totals, last_totals)]
+
+        return ServerStats(len(clients), uptime, *totals, *rates), clients
+
+    def _clear_wakeup(self):
+        """Read out the bytes written to wake up `serve_forever`."""
+        try:
+            while self._wakeup_recv.recv(1024):
+                pass
+        except OSError:
+            pass  # no more bytes (BlockingIOError) or closed
+
+    def shutdown(self, timeout: float = None) -> bool:
+        """
+        Stop the serve_forever loop.
+
+        Blocks until the loop has finished. This must be called while
+        serve_forever() is running in another thread, or it will
+        deadlock.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            The maximum time to wait in s. The default is None (no limit).
+
+        Returns
+        -------
+        bool
+            Whether the loop finished before the timeout.
+
+        """
+        self._shutdown_request = True
+        try:
+            self._wakeup_send.send(b'\0')
+        except OSError:
+            pass  # buffer full -> wakeup pending anyway
+
+        return self._is_shut_down.wait(timeout)
+
+    def verify_request(self, request, client_address):
+        """
+        Verify the request.
+
+        Return True if we should proceed with this request.
+        """
+        return not bool(self.block_new_connections)
+
+    def shutdown_request(self, request):
+        """Called to shutdown and close an individual request."""
+        if request in self._detached:
+            # The connection is continued by another server
+            return
+
+        # Changed from socketserver.TCPServer
+        try:
+            # explicitly shutdown.  socket.close() merely releases
+            # the socket and waits for GC to perform the actual close.
+            request.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass  # some platforms may raise ENOTCONN here
+        self.close_request(request)
+
+    def process_request_thread(self, request, client_address):
+        """Same as in BaseServer but as a thread.
+
+        In addition, exception handling is done here.
+
+        """
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+            with self._pool_lock:
+                self._requests.discard(request)
+
+    def process_request(self, request, client_address):
+        """Hand the request over to a thread or a worker of the pool."""
+        accepted = time.perf_counter()
+
+        if self.max_workers is None:
+            # One thread per client
+            with self._pool_lock:
+                self._requests.add(request)
+
+            # name thread after ip
+            self._start_thread(self._handle_single,
+                               (request, client_address, accepted),
+                               str(client_address[0]))
+            return
+
+        with self._pool_lock:
+            # Admission control (clients handed over are always admitted)
+            if (self.max_pending is not None and request not in self._resumed
+                    and self._busy + self._pending_count >=
+                    self.max_workers + self.max_pending):
+                self._rejected += 1
+                refuse = True
+            else:
+                refuse = False
+                self._requests.add(request)
+                self._pending_count += 1
+
+                # Only start a new worker if no worker is idle
+                spawn = (len(self._threads) < self.max_workers
+                         and self._busy + self._pending_count >
+                         len(self._threads))
+
+        if refuse:
+            logger.warning("Worker pool saturated. Refused {}.".format(
+                client_address[0]))
+            self.shutdown_request(request)
+            return
+
+        self._pending.put((request, client_address, accepted))
+
+        if spawn:
+            self._start_thread(self._work, (),
+                               "Ectec-Worker-{}".format(id(request)))
+
+    def detach_request(self, request):
+        """
+        Exclude a request from being shut down and closed by this server.
+
+        This is used when handing the connection over to another server.
+
+        """
+        with self._pool_lock:
+            self._detached.add(request)
+
+    def resume_request(self, request, client_address, state: ClientState):
+        """
+        Handle a request handed over by another server.
+
+        The handler can retrieve the `state` using `pop_resumed_state`.
+
+        """
+        with self._pool_lock:
+            self._resumed[request] = state
+
+        self.process_request(request, client_address)
+
+    def pop_resumed_state(self, request) -> ClientState:
+        """
+        Get the state of a client handed over by another server.
+
+        Returns
+        -------
+        ClientState or None
+            The state or None if the request wasn't handed over.
+
+        """
+        with self._pool_lock:
+            return self._resumed.pop(request, None)
+
+    def _start_thread(self, target, args, name):
+        """Start and register a thread handling clients."""
+        thread = threading.Thread(target=target, args=args, name=name)
+        thread.daemon = self.daemon_threads
+
+        with self._pool_lock:
+            self._threads.add(thread)
+
+        if not self.thread_stack_size:
+            thread.start()
+            return
+
+        # The stack size is process wide and read when a thread is started
+        with _stack_size_lock:
+            old_size = threading.stack_size(self.thread_stack_size)
+            try:
+                thread.start()
+            finally:
+                threading.stack_size(old_size)
+
+    def _start_handling(self, accepted, pending=False):
+        """
+        Update the counters when a request starts to be handled.
+
+        A request taken from the queue (`pending`) leaves `_pending_count`
+        in the same step. So `process_request` never sees it in between.
+
+        """
+        delay = time.perf_counter() - accepted
+        with self._pool_lock:
+            if pending:
+                self._pending_count -= 1
+            self._busy += 1
+            self._delay_total += delay
+            self._delay_count += 1
+            self._delay_max = max(self._delay_max, delay)
+
+    def _handle_single(self, request, client_address, accepted):
+        """Handle one request in its own thread and clean up afterwards."""
+        self._start_handling(accepted)
+        try:
+            self.process_request_thread(request, client_address)
+        finally:
+            with self._pool_lock:
+                self._busy -= 1
+                self._threads.discard(threading.current_thread())
+
+    def _work(self):
+        """Handle requests from the queue until receiving `None`."""
+        try:
+            while True:
+                item = self._pending.get()
+                if item is None:
+                    break
+
+                request, client_address, accepted = item
+                self._start_handling(accepted, pending=True)
+                try:
+                    self.process_request_thread(request, client_address)
+                finally:
+                    with self._pool_lock:
+                        self._busy -= 1
+        finally:
+            with self._pool_lock:
+                self._threads.discard(threading.current_thread())
+
+    def pool_stats(self) -> 'PoolStats':
+        """
+        Get statistics about the threads handling the clients.
+
+        Returns
+        -------
+        PoolStats
+            The statistics.
+
+        """
+        with self._pool_lock:
+            busy = self._busy
+            saturation = busy / self.max_workers if self.max_workers else 0.
+            mean_delay = self._delay_total / self._delay_count \
+                if self._delay_count else 0.
+
+            return PoolStats(len(self._threads), busy, self.max_workers,
+                             self._pending_count, self.max_pending,
+                             self._rejected, saturation, mean_delay,
+                             self._delay_max)
+
+    def server_close(self, timeout: float = None):
+        """
+        Cleanup the server.
+
+        The sockets of all clients are shut down. If `block_on_close` is set
+        this waits for the handling threads to terminate.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            The maximum time to wait for the threads in s.
+            The default is None (no limit).
+
+        """
+        deadline = time.monotonic() + timeout if timeout is not None \
+            else None
 
-        return clientl
+        self.closing = True
+        super().server_close()  # should call socketserver.TCPServer's method
+        self.close_unix()
 
+        self._wakeup_recv.close()
+        self._wakeup_send.close()
 
-class EctecTCPMixIn():
-    """
-    A ThreadingMixIn for the TCPServer with some extra functions.
+        # Close the requests still waiting for a worker
+        while True:
+            try:
+                item = self._pending.get_nowait()
+            except queue.Empty:
+                break
 
-    Most code is from `socketserver.ThreadingMixIn`.
-    When the server is closed, the request sockets connected to clients
-    are closed to. This class also adds the ablity to block all incoming
-    requests from clients.
-    This MixIn should be combined with `socketserver.TCPServer` so that it
-    overrides the methods.
-    """
+            if item is not None:
+                with self._pool_lock:
+                    self._pending_count -= 1
+                    self._requests.discard(item[0])
+                self.shutdown_request(item[0])
 
-    # Decides how threads will act upon termination of the
-    # main process
-    daemon_threads = False
+        with self._pool_lock:
+            requests = list(self._requests)
+            threads = list(self._threads)
 
-    # If true, server_close() waits until all non-daemonic threads terminate.
-    block_on_close = True
+        # Changed from socketserver.ThreadingMixIn
+        # Shut down all sockets first so that the threads terminate in
+        # parallel while we wait for them.
+        for request in requests:
+            self.shutdown_request(request)
 
-    # For non-daemonic threads, list of threading.Threading objects
-    # used by server_close() to wait for all threads completion.
-    _threads = None
+        # Stop idle workers
+        for thread in threads:
+            self._pending.put(None)
 
-    def __init__(self,
-                 server_address,
-                 RequestHandlerClass,
-                 bind_and_activate=True):
-        super().__init__(server_address, RequestHandlerClass,
-                         bind_and_activate)
+        if self.block_on_close:
+            for thread in threads:
+                if thread.daemon:
+                    continue
 
-        # Define some extra attributes
-        self.block_new_connections = False
+                if deadline is None:
+                    thread.join()
+                else:
+                    thread.join(max(deadline - time.monotonic(), 0))
 
-    def verify_request(self, request, client_address):
-        """
-        Verify the request.
+        if self.fanout_pool is not None:
+            self.fanout_pool.close(None if deadline is None else
+                                   max(deadline - time.monotonic(), 0))
 
-        Return True if we should proceed with this request.
-        """
-        return not bool(self.block_new_connections)
+        self.stop_capture()
 
-    def shutdown_request(self, request):
-        """Called to shutdown and close an individual request."""
-        # Changed from socketserver.TCPServer
-        try:
-            # explicitly shutdown.  socket.close() merely releases
-            # the socket and waits for GC to perform the actual close.
-            request.shutdown(socket.SHUT_RDWR)
-        except OSError:
-            pass  # some platforms may raise ENOTCONN here
-        self.close_request(request)
+    def drain_requests(self, timeout: float = None) -> bool:
+        """
+        Wait until the data currently sent to the clients was sent.
 
-    def process_request_thread(self, request, client_address):
-        """Same as in BaseServer but as a thread.
+        Parameters
+        ----------
+        timeout : float, optional
+            The maximum time to wait in s. The default is None (no limit).
 
-        In addition, exception handling is done here.
+        Returns
+        -------
+        bool
+            Whether all data was sent before the timeout.
 
         """
-        try:
-            self.finish_request(request, client_address)
-        except Exception:
-            self.handle_error(request, client_address)
-        finally:
-            self.shutdown_request(request)
+        deadline = time.monotonic() + timeout if timeout is not None \
+            else None
 
-    def process_request(self, request, client_address):
-        """Start a new thread to process the request."""
-        # 'Inherited' from socketserver.ThreadingMixIn
-        t = threading.Thread(target=self.process_request_thread,
-                             args=(request, client_address))
-        t.daemon = self.daemon_threads
-        if not t.daemon and self.block_on_close:
-            if self._threads is None:
-                self._threads = []
-            self._threads.append(t)
-        t.start()
-
-        # Extra part
-        t.name = str(client_address[0])  # name thread after ip
-        t.request_socket = request  # add attribute
-
-    def server_close(self):
-        """Cleanup the server."""
-        super().server_close()  # should call socketserver.TCPServer's method
+        # The handlers are tracked by the request handler class
+        get_client_list = getattr(self.RequestHandlerClass, 'get_client_list',
+                                  list)
 
-        # Changed from socketserver.ThreadingMixIn
-        if self.block_on_close:
-            threads = self._threads
-            self._threads = None
-            if threads:
-                for thread in threads:
-                    self.shutdown_request(thread.request_socket)
+        for client in get_client_list():
+            remaining = max(deadline - time.monotonic(), 0) \
+                if deadline is not None else None
 
-                for thread in threads:
-                    thread.join()
+            if not client.handler.flush(remaining):
+                return False
+
+        return True
 
 
 class EctecTCPServer(EctecTCPMixIn, socketserver.TCPServer):
@@ -1288,6 +3906,18 @@ class Server(AbstractServer):
         The request handler for the TCPServer.
         Needs a `get_client_list` static/class method.
         The default is ClientHandler.
+    max_workers : int, optional
+        The size of the pool of threads handling clients.
+        The default is None (one thread per client).
+    max_pending : int, optional
+        The maximum number of clients waiting for a free worker.
+        The default is None (no limit).
+    thread_stack_size : int, optional
+        The stack size of handling threads in bytes.
+        The default is None (platform's default).
+    fanout_workers : int, optional
+        The number of threads writing a package to many clients in parallel.
+        The default is None (written by the sender's thread).
 
     Attributes
     ----------
@@ -1299,6 +3929,10 @@ class Server(AbstractServer):
         ip address of the server.
     port : int
         the port of the server.
+    groups : dict of str: list of str
+        the members of each group.
+    unix_path : str or None
+        the path of the unix socket the server listens on.
 
     Examples
     --------
@@ -1339,7 +3973,15 @@ class Server(AbstractServer):
     """
     version = VERSION
 
-    def __init__(self, requesthandler=ClientHandler):
+    #: s the `stop` method takes at most by default
+    STOP_TIMEOUT = 5.0
+
+    def __init__(self,
+                 requesthandler=ClientHandler,
+                 max_workers: int = None,
+                 max_pending: int = None,
+                 thread_stack_size: int = None,
+                 fanout_workers: int = None):
         """
         Init the instance.
 
@@ -1349,6 +3991,18 @@ def __init__(self, requesthandler=ClientHandler):
             The request handler for the TCPServer.
             Needs a `get_client_list` static/class method.
             The default is ClientHandler.
+        max_workers : int, optional
+            The size of the pool of threads handling clients.
+            The default is None (one thread per client).
+        max_pending : int, optional
+            The maximum number of clients waiting for a free worker.
+            The default is None (no limit).
+        thread_stack_size : int, optional
+            The stack size of handling threads in bytes.
+            The default is None (platform's default).
+        fanout_workers : int, optional
+            The number of threads writing a package to many clients in
+            parallel. The default is None (written by the sender's thread).
 
         Returns
         -------
@@ -1359,6 +4013,12 @@ def __init__(self, requesthandler=ClientHandler):
 
         self.requesthandler_class = requesthandler
 
+        # The execution model passed to the EctecTCPServer
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.thread_stack_size = thread_stack_size
+        self.fanout_workers = fanout_workers
+
         # Holds the thread running TCPServer.serve_forever
         self._serve_thread = None
 
@@ -1397,6 +4057,18 @@ def port(self) -> int:
             raise AttributeError("Server not runnning.")
         return self._server.server_address[1]
 
+    @property
+    def unix_path(self) -> str:
+        """
+        str or None
+            The path of the unix socket the server additionally listens on.
+            None if the server doesn't listen on a unix socket.
+
+        """
+        if not self._server:
+            return None
+        return self._server.unix_path
+
     @property
     def users(self) -> List[Tuple[str, Role, Address]]:
         """
@@ -1417,6 +4089,94 @@ def users(self) -> List[Tuple[str, Role, Address]]:
 
         return clients
 
+    @property
+    def groups(self) -> Dict[str, List[str]]:
+        """
+        dict of str: list of str
+            The names of the members of each group.
+
+        """
+        if not self.running:
+            return {}
+
+        return self.requesthandler_class.get_groups()
+
+    def accept_stats(self) -> AcceptStats:
+        """
+        Get statistics about accepting new connections.
+
+        Returns
+        -------
+        AcceptStats or None
+            The statistics. None if the server isn't running.
+
+        """
+        if not self._server:
+            return None
+
+        return self._server.accept_stats()
+
+    def pool_stats(self) -> PoolStats:
+        """
+        Get statistics about the threads handling the clients.
+
+        Returns
+        -------
+        PoolStats or None
+            The statistics. None if the server isn't running.
+
+        """
+        if not self._server:
+            return None
+
+        return self._server.pool_stats()
+
+    def stats(self, previous: ServerStats = None) -> ServerStats:
+        """
+        Get statistics about the traffic of the server.
+
+        Parameters
+        ----------
+        previous : ServerStats, optional
+            An earlier result of this method. The rates are measured since
+            then. The default is None (since the start of the server).
+
+        Returns
+        -------
+        ServerStats or None
+            The statistics. None if the server isn't running.
+
+        """
+        if not self._server:
+            return None
+
+        return self._server.traffic_stats(previous)[0]
+
+    def client_stats(self, client_id) -> ClientStats:
+        """
+        Get statistics about the connection to a client.
+
+        Parameters
+        ----------
+        client_id : str
+            Currently the client's name serves as id.
+
+        Returns
+        -------
+        ClientStats or None
+            The statistics. None if the client wasn't found or the server
+            isn't running.
+
+        """
+        if not self.running:
+            return None
+
+        handler = self.get_handler(client_id)
+        if handler is None:
+            return None
+
+        return handler.stats()
+
     @property
     def running(self) -> bool:
         """
@@ -1443,7 +4203,12 @@ def __exit__(self, exc_type, exc_value, traceback):
             # wether to raise the Exception or suppress
             return False  # do not suppress
 
-    def start(self, port: int, address: str = ""):
+    def start(self,
+              port: int,
+              address: str = "",
+              backlog: int = None,
+              unix_path: str = None,
+              capture: str = None):
         """
         Start the server at the given port and address.
 
@@ -1451,17 +4216,255 @@ def start(self, port: int, address: str = ""):
         It is important to call the `stop` method after this one so that
         the `EctecTCPServer` is teared down and cleaned up.
 
+        With `unix_path` the server additionally listens on a unix socket.
+        Clients on the same machine can connect through it using the address
+        ``unix://<unix_path>``. This is faster than the TCP loopback. The
+        socket file is removed when the server is stopped.
+
+        With `capture` all data received from the clients is recorded to
+        a file (see `TrafficCapture`). It can be replayed with
+        ``python -m benchmarks.replay``.
+
         Parameters
         ----------
         port : int
             the port.
         address : str
             The address. Defaults to an empty string.
+        backlog : int, optional
+            The size of the queue for connections the server didn't accept
+            yet. Increase it if many clients connect at once.
+            The default is None (`EctecTCPMixIn.request_queue_size`).
+        unix_path : str, optional
+            The path for an additional unix socket. Mustn't exist.
+            The default is None (TCP only).
+        capture : str, optional
+            The path of a file to capture the traffic to.
+            The default is None (no capture).
+
+        Raises
+        ------
+        EctecException
+            The server is already running.
+        OSError
+            Couldn't create the sockets.
+
+        Returns
+        -------
+        ServerRunningContextManager
+            A context manager for closing the server.
+
+        """
+        if self.running:
+            raise EctecException('Server is already running.')
+
+        server = self._create_server(port, address, backlog, unix_path,
+                                     capture)
+        self._server = server
+
+        self._serve_thread = threading.Thread(target=server.serve_forever)
+        self._serve_thread.start()
+
+        return self.ServerRunningContextManager(self)
+
+    def _create_server(self,
+                       port: int,
+                       address: str = "",
+                       backlog: int = None,
+                       unix_path: str = None,
+                       capture: str = None) -> 'EctecTCPServer':
+        """
+        Create the `EctecTCPServer` for `start`.
+
+        The parameters are the ones of `start`. Subclasses serving the
+        server in another kind of thread use this too.
+
+        Raises
+        ------
+        OSError
+            Couldn't create the sockets.
+
+        Returns
+        -------
+        EctecTCPServer
+            The server. It isn't served yet.
+
+        """
+        server = EctecTCPServer((address, port),
+                                self.requesthandler_class,
+                                max_workers=self.max_workers,
+                                max_pending=self.max_pending,
+                                thread_stack_size=self.thread_stack_size,
+                                backlog=backlog,
+                                fanout_workers=self.fanout_workers)
+
+        try:
+            if unix_path is not None:
+                server.listen_unix(unix_path)
+            if capture is not None:
+                server.start_capture(capture)
+        except OSError:
+            server.server_close()
+            raise
+
+        return server
+
+    def handoff(self, path: str, clients: bool = True, timeout: float = None):
+        """
+        Hand the running server over to another process.
+
+        The other process must have called `takeover` with the same `path`.
+        The listening sockets (including the one of `unix_path`) are passed
+        to it over the unix socket at `path` (using SCM_RIGHTS). So no
+        client is refused in between. If `clients` is True the connections
+        to the registered clients are passed too, together with their name,
+        role, the bytes received but not processed yet and the caches for
+        deduplication. The clients don't notice the handoff. Otherwise the
+        connections are closed gracefully like with `drain`.
+
+        This server is stopped afterwards. Only available on unix.
+
+        Parameters
+        ----------
+        path : str
+            The path of the unix socket of the other process.
+        clients : bool, optional
+            Whether to hand over the clients. The default is True.
+        timeout : float, optional
+            The maximum time to wait in s. The default is None (no limit).
+            Clients that couldn't be detached in time are disconnected.
+
+        Raises
+        ------
+        EctecException
+            The server isn't running.
+        OSError
+            Couldn't connect to the other process. The server keeps running.
+        HandoffError
+            The other process didn't take over. The server is stopped.
+
+        """
+        if not self.running:
+            raise EctecException('Server is not running.')
+
+        deadline = time.monotonic() + timeout if timeout is not None \
+            else None
+
+        def remaining():
+            if deadline is None:
+                return None
+            return max(deadline - time.monotonic(), 0)
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(remaining())
+            sock.connect(path)
+        except OSError:
+            sock.close()
+            raise
+
+        server = self._server
+
+        # stop accepting new clients
+        server.shutdown(remaining())
+
+        handlers = []
+        try:
+            if clients:
+                # The other clients are handed over -> no user updates
+                server.closing = True
+
+                for client in self.requesthandler_class.get_client_list():
+                    server.detach_request(client.handler.request)
+                    client.handler.detach_requested.set()
+                    handlers.append(client.handler)
+
+                # wait for the handlers to stop between two commands
+                for handler in list(handlers):
+                    if not handler.detached.wait(remaining()):
+                        logger.warning("Couldn't detach {}.".format(
+                            handler.client_data.name))
+                        handlers.remove(handler)
+                        with server._pool_lock:
+                            server._detached.discard(handler.request)
+
+            listeners = [server.socket.fileno()]
+            if server.unix_socket is not None:
+                listeners.append(server.unix_socket.fileno())
+
+            header = {'clients': len(handlers), 'unix_path': server.unix_path}
+            _send_handoff_message(sock, header, listeners)
+
+            # The unix socket file is used by the other process now
+            server.close_unix(unlink=False)
+
+            for i in range(0, len(handlers), HANDOFF_CHUNK_SIZE):
+                chunk = handlers[i:i + HANDOFF_CHUNK_SIZE]
+
+                states = []
+                for handler in chunk:
+                    data = handler.client_data
+                    states.append({
+                        'name': data.name,
+                        'role': data.role.value,
+                        'address': list(data.address),
+                        'buffer':
+                        base64.b64encode(handler.buffer).decode('ascii'),
+                        'dedup': handler.export_dedup(),
+                        'groups': sorted(handler.joined)
+                    })
+
+                _send_handoff_message(
+                    sock, states,
+                    [handler.request.fileno() for handler in chunk])
+
+        except (OSError, ValueError) as error:
+            raise HandoffError("Handoff failed: " + str(error)) from error
+
+        finally:
+            sock.close()
+
+            if not clients:
+                server.drain_requests(remaining())
+
+            # Closes the listening socket and the connections not handed over
+            server.server_close(remaining())
+
+            # The connections handed over are closed but not shut down
+            with server._pool_lock:
+                detached = list(server._detached)
+                server._detached.clear()
+            for request in detached:
+                request.close()
+
+            self._serve_thread.join(remaining())
+
+        logger.info("Handed over {} clients.".format(len(handlers)))
+
+    def takeover(self, path: str, timeout: float = None):
+        """
+        Take over a server running in another process.
+
+        This creates a unix socket at `path` and waits until the other
+        process calls `handoff`. Then the server continues to serve using
+        the listening socket and the clients received. This method returns
+        once the server is running.
+
+        Parameters
+        ----------
+        path : str
+            The path for the unix socket. Mustn't exist.
+        timeout : float, optional
+            The maximum time to wait in s. The default is None (no limit).
 
         Raises
         ------
         EctecException
             The server is already running.
+        socket.timeout
+            The other process didn't call `handoff` in time.
+        HandoffError
+            The data received was incomplete.
 
         Returns
         -------
@@ -1472,12 +4475,97 @@ def start(self, port: int, address: str = ""):
         if self.running:
             raise EctecException('Server is already running.')
 
-        server = EctecTCPServer((address, port), self.requesthandler_class)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            listener.bind(path)
+            listener.listen(1)
+            listener.settimeout(timeout)
+
+            conn, dummy = listener.accept()
+        finally:
+            listener.close()
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+        sockets = []  # every socket received so far
+
+        def wrap(fds):
+            received = []
+            try:
+                while fds:
+                    received.append(socket.socket(fileno=fds[0]))
+                    fds = fds[1:]
+            finally:
+                for fd in fds:
+                    os.close(fd)  # not a socket or not reached
+                sockets.extend(received)
+            return received
+
+        clients = []
+        try:
+            try:
+                conn.settimeout(timeout)
+
+                header, fds = _recv_handoff_message(conn, 2)
+                received = wrap(fds)
+                unix_path = header.get('unix_path')
+                if len(received) != (2 if unix_path else 1):
+                    raise HandoffError("Didn't receive the listening socket.")
+                listen_socket = received[0]
+                unix_socket = received[1] if unix_path else None
+
+                while len(clients) < header['clients']:
+                    states, fds = _recv_handoff_message(conn,
+                                                        HANDOFF_CHUNK_SIZE)
+                    received = wrap(fds)
+
+                    if len(states) != len(received):
+                        raise HandoffError(
+                            "Didn't receive all client sockets.")
+
+                    for state, request in zip(states, received):
+                        client_state = ClientState(
+                            state['name'], state['role'],
+                            Address._make(state['address']),
+                            base64.b64decode(state['buffer']),
+                            state.get('dedup'), state.get('groups', ()))
+                        clients.append((client_state, request))
+            except (OSError, ValueError, KeyError) as error:
+                raise HandoffError("Takeover failed: " + str(error)) from error
+        except BaseException:
+            # the listening sockets and clients received are closed too
+            for sock in sockets:
+                sock.close()
+            raise
+        finally:
+            conn.close()
+
+        server = EctecTCPServer(listen_socket.getsockname(),
+                                self.requesthandler_class,
+                                bind_and_activate=False,
+                                max_workers=self.max_workers,
+                                max_pending=self.max_pending,
+                                thread_stack_size=self.thread_stack_size,
+                                fanout_workers=self.fanout_workers)
+        server.socket.close()
+        server.socket = listen_socket
+        if unix_socket is not None:
+            unix_socket.setblocking(False)
+            server.unix_socket = unix_socket
+            server.unix_path = unix_path
         self._server = server
 
+        for state, request in clients:
+            request.settimeout(None)
+            server.resume_request(request, tuple(state.address), state)
+
         self._serve_thread = threading.Thread(target=server.serve_forever)
         self._serve_thread.start()
 
+        logger.info("Took over {} clients.".format(len(clients)))
+
         return self.ServerRunningContextManager(self)
 
     @property
@@ -1562,13 +4650,70 @@ def kick(self, client_id):
                 # there should only be one client, a break safes CPU time
                 break
 
-    def stop(self):
+    def stop(self, timeout: float = None):
         """
-        Stops the server.
+        Stops the server immediately.
+
+        The connections to all clients are closed. This method returns after
+        `timeout` seconds at the latest regardless of the number of clients.
+        Threads still handling a client then terminate on their own.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            The hard deadline in s. The default is `STOP_TIMEOUT`.
 
         """
         if not self._server:
             return
         if self._serve_thread and self._serve_thread.is_alive():
-            self._server.shutdown()
-            self._server.server_close()
+            if timeout is None:
+                timeout = self.STOP_TIMEOUT
+            deadline = time.monotonic() + timeout
+
+            self._server.shutdown(timeout)
+            self._server.server_close(max(deadline - time.monotonic(), 0))
+            self._serve_thread.join(max(deadline - time.monotonic(), 0))
+
+    def drain(self, timeout: float = None) -> bool:
+        """
+        Stops the server gracefully.
+
+        The server stops accepting new clients first. Then it waits until
+        the data currently being sent to the clients was sent. After that
+        the connections are closed. If the data couldn't be sent within
+        `timeout` seconds the server is stopped anyways.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            The maximum time to wait in s. The default is None (no limit).
+
+        Returns
+        -------
+        bool
+            Whether all data was sent before the connections were closed.
+
+        """
+        if not self._server:
+            return True
+        if not (self._serve_thread and self._serve_thread.is_alive()):
+            return True
+
+        deadline = time.monotonic() + timeout if timeout is not None \
+            else None
+
+        def remaining():
+            if deadline is None:
+                return None
+            return max(deadline - time.monotonic(), 0)
+
+        # stop accepting new clients
+        self._server.shutdown(remaining())
+
+        drained = self._server.drain_requests(remaining())
+
+        self._server.server_close(remaining())
+        self._serve_thread.join(remaining())
+
+        return drained
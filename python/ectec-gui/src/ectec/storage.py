@@ -0,0 +1,1304 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Persistent package storages.
+
+The `PackageStorage` of `ectec.client` keeps every package as an object in
+memory. The storages of this module keep the packages or their bodies in a
+file or in compact columns instead. They can replace `UserClient.packages`
+for long histories.
+
+***********************************
+
+Created on Mon Oct 19 19:02:44 2026
+
+Copyright (C) 2020 real-yfprojects (github.com user)
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+import array
+import io
+import json
+import math
+import mmap
+import sqlite3
+import tempfile
+import threading
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional
+
+from . import AbstractPackageStorage, content_hash
+from .client import Package, PackageStorage, _timestamp
+
+# ---- SQLite
+
+
+class StoredPackage(Package):
+    """
+    A package whose body is loaded from its storage when accessed.
+
+    Changes to a `StoredPackage` aren't written to the storage.
+
+    Parameters
+    ----------
+    storage : SqlitePackageStorage
+        The storage holding the body.
+    package_id : int
+        The id of the package in the storage.
+    stored_size : int
+        The length of the stored body.
+    *args
+        The arguments for `Package`.
+
+    """
+
+    __slots__ = ['storage', 'package_id', 'stored_size', 'loaded']
+
+    def __init__(self, storage: 'SqlitePackageStorage', package_id: int,
+                 stored_size: int, *args):
+        super().__init__(*args)
+        self.storage = storage
+        self.package_id = package_id
+        self.stored_size = stored_size
+        self.loaded = False
+
+    @property
+    def content(self) -> bytes:
+        """
+        Get the `content` property.
+
+        The body is read from the storage on the first access.
+
+        Returns
+        -------
+        bytes
+            The body of the package.
+
+        """
+        if not self.loaded:
+            self._set_content(self.storage.load_content(self.package_id))
+            self.loaded = True
+
+        return super().content
+
+    @content.setter
+    def content(self, value: bytes):
+        """Set the `content` property. The storage isn't changed."""
+        self._set_content(value)
+        self.loaded = True
+
+    @property
+    def size(self) -> int:
+        """
+        Get the `size` property.
+
+        Returns
+        -------
+        int
+            The length of the body in bytes.
+
+        """
+        if not self.loaded:
+            return self.stored_size
+
+        return super().size
+
+    def open(self):
+        """
+        Get the body as a readable file-like object.
+
+        Returns
+        -------
+        file-like object
+            `file` (rewound) or a BytesIO object for the content.
+
+        """
+        self.content  # load the body
+        return super().open()
+
+
+class SqlitePackageStorage(AbstractPackageStorage):
+    """
+    A package storage backed by a SQLite database.
+
+    The metadata of the packages is indexed. The bodies are stored as BLOBs
+    and read when the `content` of a `StoredPackage` is accessed. The
+    storage can be used from multiple threads.
+
+    Parameters
+    ----------
+    path : str, optional
+        The database file. It is created if it doesn't exist.
+        The default is ':memory:'.
+
+    Examples
+    --------
+    >>> storage = SqlitePackageStorage('history.db')
+    >>> storage.add(package1, package2)
+    >>> for pkg in storage.filter(sender='somesender'):
+    ...     print(pkg)
+    <Package 1>
+    >>> storage.close()
+
+    The packages are still stored when the file is opened again.
+
+    """
+
+    #: The number of rows fetched from a cursor at once when iterating.
+    FETCH_SIZE = 256
+
+    #: The string attributes of `Package` mapped to columns.
+    COLUMNS = {'sender': 'sender', 'type': 'type'}
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS packages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sender TEXT NOT NULL,
+            recipients TEXT NOT NULL,
+            type TEXT NOT NULL,
+            time REAL,
+            size INTEGER NOT NULL,
+            digest TEXT NOT NULL,
+            content BLOB NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS recipients (
+            package INTEGER NOT NULL
+                REFERENCES packages(id) ON DELETE CASCADE,
+            recipient TEXT NOT NULL,
+            PRIMARY KEY (recipient, package)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS packages_sender ON packages(sender);
+        CREATE INDEX IF NOT EXISTS packages_type ON packages(type);
+        CREATE INDEX IF NOT EXISTS packages_time ON packages(time);
+        CREATE INDEX IF NOT EXISTS recipients_package
+            ON recipients(package);
+    """
+
+    #: The columns selected for a `StoredPackage`.
+    SELECT = "SELECT id, size, sender, recipients, type, time FROM packages"
+
+    def __init__(self, path: str = ':memory:'):
+        self.path = path
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute("PRAGMA foreign_keys = ON")
+            self.connection.executescript(self.SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def close(self) -> None:
+        """Close the database."""
+        with self.lock:
+            self.connection.close()
+
+    # ---- Conversion
+
+    def _row(self, package: Package) -> tuple:
+        """Get the values of the columns of `packages` for a package."""
+        content = package.content
+        return (package.sender, json.dumps(list(package.recipient)),
+                package.type, package.timestamp, len(content),
+                content_hash(content), sqlite3.Binary(content))
+
+    def _package(self, row: tuple) -> StoredPackage:
+        """Create a package from a row selected by `SELECT`."""
+        package_id, size, sender, recipients, typ, time = row
+        return StoredPackage(self, package_id, size, sender,
+                             json.loads(recipients), typ, time)
+
+    def _where(self, package: Package) -> tuple:
+        """Get the condition selecting the packages equal to `package`."""
+        content = package.content
+        return ("sender = ? AND type = ? AND recipients = ? AND time IS ? "
+                "AND size = ? AND digest = ?",
+                [package.sender, package.type,
+                 json.dumps(list(package.recipient)), package.timestamp,
+                 len(content), content_hash(content)])
+
+    def load_content(self, package_id: int) -> bytes:
+        """
+        Read the body of a stored package.
+
+        Parameters
+        ----------
+        package_id : int
+            The id of the package.
+
+        Returns
+        -------
+        bytes
+            The body. Empty if the package was removed.
+
+        """
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT content FROM packages WHERE id = ?",
+                (package_id, )).fetchone()
+
+        return bytes(row[0]) if row else b''
+
+    def _select(self, sql: str, parameters=()) -> Iterator[StoredPackage]:
+        """Stream the packages selected by `sql` from a cursor."""
+        with self.lock:
+            cursor = self.connection.execute(sql, parameters)
+
+        try:
+            while True:
+                with self.lock:
+                    rows = cursor.fetchmany(self.FETCH_SIZE)
+                if not rows:
+                    break
+
+                for row in rows:
+                    yield self._package(row)
+        finally:
+            cursor.close()
+
+    # ---- Storage interface
+
+    def __contains__(self, package: Package) -> bool:
+        """
+        Test wether this storage contains the given package.
+
+        Parameters
+        ----------
+        package : Package
+            The package to search for.
+
+        Returns
+        -------
+        bool
+            Wether a package equal to `package` is stored.
+
+        """
+        where, parameters = self._where(package)
+        with self.lock:
+            return self.connection.execute(
+                "SELECT 1 FROM packages WHERE " + where + " LIMIT 1",
+                parameters).fetchone() is not None
+
+    def __iter__(self) -> Iterator[StoredPackage]:
+        """
+        Iterate over the packages in the order they were added.
+
+        The packages are streamed from the database.
+
+        """
+        return self._select(self.SELECT + " ORDER BY id")
+
+    def __len__(self) -> int:
+        """Get the number of packages stored."""
+        with self.lock:
+            return self.connection.execute(
+                "SELECT COUNT(*) FROM packages").fetchone()[0]
+
+    def add(self,
+            *packages: Package,
+            as_list: Optional[List[Package]] = None) -> List[int]:
+        """
+        Add packages to the storage.
+
+        All packages are inserted in one transaction.
+
+        Parameters
+        ----------
+        *packages : Package
+            The packages.
+        as_list : List[Package], optional
+            The packages in a list. The default is None.
+
+        Returns
+        -------
+        List[int]
+            The ids of the packages in the storage.
+
+        """
+        if packages and isinstance(packages[0], list):
+            raise ValueError("Expected Package not list for `*packages`.")
+
+        packages = list(packages) + list(as_list or ())
+        rows = [self._row(pkg) for pkg in packages]
+
+        ids = []
+        with self.lock, self.connection:
+            cursor = self.connection.cursor()
+            recipients = []
+            for pkg, row in zip(packages, rows):
+                cursor.execute(
+                    "INSERT INTO packages (sender, recipients, type, time, "
+                    "size, digest, content) VALUES (?, ?, ?, ?, ?, ?, ?)", row)
+                ids.append(cursor.lastrowid)
+                recipients.extend((cursor.lastrowid, recipient)
+                                  for recipient in set(pkg.recipient))
+
+            cursor.executemany(
+                "INSERT INTO recipients (package, recipient) VALUES (?, ?)",
+                recipients)
+
+        return ids
+
+    def remove(self,
+               *packages: Package,
+               func: Callable[[Package], bool] = None) -> None:
+        """
+        Remove packages from the storage.
+
+        All packages that equal the packages directly specified are removed.
+        The function acts as a filter. The `func` function gets passed
+        an `Package` if the function returns `True` the package is removed.
+
+        Parameters
+        ----------
+        *packages : Package (optional)
+            Packages to be removed.
+        func : callable(Package) -> bool, optional
+            A function acting as a filter.
+
+        """
+        ids = []
+        if func:
+            ids = [(pkg.package_id, ) for pkg in self if func(pkg)]
+
+        with self.lock, self.connection:
+            for package in packages:
+                where, parameters = self._where(package)
+                self.connection.execute(
+                    "DELETE FROM packages WHERE " + where, parameters)
+
+            self.connection.executemany("DELETE FROM packages WHERE id = ?",
+                                        ids)
+
+    def all(self) -> List[StoredPackage]:
+        """
+        Return a list of all packages in the storage.
+
+        Returns
+        -------
+        List of StoredPackage.
+
+        """
+        return list(self)
+
+    def get(self, package_id: int) -> StoredPackage:
+        """
+        Get a stored package by its id.
+
+        Parameters
+        ----------
+        package_id : int
+            The id returned by `add`.
+
+        Raises
+        ------
+        KeyError
+            There is no package with this id.
+
+        Returns
+        -------
+        StoredPackage
+            The package.
+
+        """
+        with self.lock:
+            row = self.connection.execute(self.SELECT + " WHERE id = ?",
+                                          (package_id, )).fetchone()
+        if row is None:
+            raise KeyError(package_id)
+
+        return self._package(row)
+
+    def filter(self,
+               func: Optional[Callable[[Package], bool]] = None,
+               **kwargs) -> Iterator[StoredPackage]:
+        """
+        Filter the packages in the storage.
+
+        The keywords `sender`, `recipient`, `type`, `time` and `content` are
+        translated to SQL. Other keywords and `func` are checked for each
+        package selected.
+
+        Parameters
+        ----------
+        func : callable(Package) -> bool, optional
+            A function acting as a filter.
+        **kwargs : Any.
+            Attributes of Package that should match.
+
+        Yields
+        ------
+        StoredPackage
+            The packages matching the filter.
+
+        """
+        conditions = []
+        parameters = []
+        remaining = []
+        for keyword, value in kwargs.items():
+            if keyword in self.COLUMNS and isinstance(value, str):
+                conditions.append(self.COLUMNS[keyword] + " = ?")
+                parameters.append(value)
+            elif keyword == 'time' and value is None:
+                conditions.append("time IS NULL")
+            elif keyword == 'timestamp' and (value is None or isinstance(
+                    value, (int, float))):
+                conditions.append("time IS ?")
+                parameters.append(value)
+            elif keyword == 'time' and hasattr(value, 'timestamp'):
+                conditions.append("time = ?")
+                parameters.append(value.timestamp())
+            elif keyword == 'recipient' and isinstance(value, tuple):
+                conditions.append("recipients = ?")
+                parameters.append(json.dumps(list(value)))
+                if value:
+                    # use the index of the recipients
+                    conditions.append("id IN (SELECT package FROM recipients "
+                                      "WHERE recipient = ?)")
+                    parameters.append(value[0])
+            elif keyword == 'content' and isinstance(value, bytes):
+                conditions.append("digest = ?")
+                parameters.append(content_hash(value))
+            else:
+                remaining.append((keyword, value))
+
+        sql = self.SELECT
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+
+        for pkg in self._select(sql + " ORDER BY id", parameters):
+            for keyword, value in remaining:
+                if not hasattr(pkg, keyword) or getattr(pkg, keyword) != value:
+                    break
+            else:
+                if (not func) or func(pkg):
+                    yield pkg
+
+    def filter_recipient(self, *recipients: str) -> Iterator[StoredPackage]:
+        """
+        Filter out the packages that have one of the given recipients.
+
+        Parameters
+        ----------
+        *recipients : str
+            The allowed recipients.
+
+        Yields
+        ------
+        StoredPackage
+            The packages.
+
+        """
+        if not recipients:
+            return iter(())
+
+        placeholders = ', '.join('?' * len(recipients))
+        return self._select(
+            self.SELECT + " WHERE id IN (SELECT package FROM recipients "
+            "WHERE recipient IN ({})) ORDER BY id".format(placeholders),
+            recipients)
+
+    def range(self, start=None, end=None) -> Iterator[StoredPackage]:
+        """
+        Get the packages received in a time range.
+
+        Parameters
+        ----------
+        start : None, number or datetime.datetime, optional
+            The earliest time included. The default is None.
+        end : None, number or datetime.datetime, optional
+            The time the range ends before. The default is None.
+
+        Yields
+        ------
+        StoredPackage
+            The packages ordered by their time and then by their id.
+
+        """
+        start, end = _timestamp(start), _timestamp(end)
+        return self._select(
+            self.SELECT + " WHERE time >= ? AND time < ? ORDER BY time, id",
+            (-math.inf if start is None else start,
+             math.inf if end is None else end))
+
+    def since(self, start) -> Iterator[StoredPackage]:
+        """
+        Get the packages received at or after a time.
+
+        Parameters
+        ----------
+        start : number or datetime.datetime
+            The earliest time included.
+
+        Yields
+        ------
+        StoredPackage
+            The packages ordered by their time.
+
+        """
+        return self.range(start)
+
+
+# ---- Archive
+
+
+class BodyArchive:
+    """
+    An append-only file of package bodies read through a memory map.
+
+    Parameters
+    ----------
+    path : str, optional
+        The archive file. It is truncated. The default is None for a
+        temporary file.
+
+    """
+
+    #: bytes - the size of the parts copied from a file
+    CHUNK_SIZE = 1 << 16
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        if path is None:
+            self.file = tempfile.TemporaryFile()
+        else:
+            self.file = open(path, 'w+b')
+
+        #: bytes - the length of the archive
+        self.size = 0
+
+        self.lock = threading.Lock()
+        self._map: Optional[mmap.mmap] = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def close(self) -> None:
+        """Close the archive. Views of it stay valid until released."""
+        with self.lock:
+            self._map = None
+            self.file.close()
+
+    def append(self, body: BinaryIO) -> tuple:
+        """
+        Append a body to the archive.
+
+        Parameters
+        ----------
+        body : file-like object
+            The body to copy.
+
+        Returns
+        -------
+        tuple of (int, int)
+            The offset and the length of the body in the archive.
+
+        """
+        with self.lock:
+            offset = self.size
+            self.file.seek(offset)
+            while True:
+                chunk = body.read(self.CHUNK_SIZE)
+                if not chunk:
+                    break
+                self.file.write(chunk)
+                self.size += len(chunk)
+
+        return offset, self.size - offset
+
+    def _mapping(self, end: int) -> mmap.mmap:
+        """Get a memory map of the archive reaching to `end`."""
+        with self.lock:
+            if self._map is None or len(self._map) < end:
+                # the old map is closed when the last view is released
+                self.file.flush()
+                self._map = mmap.mmap(self.file.fileno(),
+                                      self.size,
+                                      access=mmap.ACCESS_READ)
+            return self._map
+
+    def view(self, offset: int, length: int) -> memoryview:
+        """
+        Get a read-only view of a body without copying it.
+
+        Parameters
+        ----------
+        offset : int
+            The offset returned by `append`.
+        length : int
+            The length returned by `append`.
+
+        Returns
+        -------
+        memoryview
+            The body.
+
+        """
+        if not length:
+            return memoryview(b'')
+
+        mapping = self._mapping(offset + length)
+        return memoryview(mapping)[offset:offset + length]
+
+    def read(self, offset: int, length: int) -> bytes:
+        """
+        Read a body.
+
+        Parameters
+        ----------
+        offset : int
+            The offset returned by `append`.
+        length : int
+            The length returned by `append`.
+
+        Returns
+        -------
+        bytes
+            A copy of the body.
+
+        """
+        if not length:
+            return b''
+
+        return self._mapping(offset + length)[offset:offset + length]
+
+
+class ArchivedPackage(Package):
+    """
+    A package whose body is kept in a `BodyArchive`.
+
+    The `content` is copied from the archive on every access. Setting it
+    detaches the package from the archive.
+
+    Parameters
+    ----------
+    archive : BodyArchive
+        The archive holding the body.
+    offset : int
+        The offset of the body in the archive.
+    length : int
+        The length of the body.
+    *args
+        The arguments for `Package`.
+
+    """
+
+    __slots__ = ['archive', 'offset', 'length']
+
+    def __init__(self, archive: BodyArchive, offset: int, length: int,
+                 *args):
+        super().__init__(*args)
+        self.archive = archive
+        self.offset = offset
+        self.length = length
+
+    @property
+    def content(self) -> bytes:
+        """
+        Get the `content` property.
+
+        Returns
+        -------
+        bytes
+            The body of the package.
+
+        """
+        if self.archive is not None:
+            return self.archive.read(self.offset, self.length)
+
+        return super().content
+
+    @content.setter
+    def content(self, value: bytes):
+        """Set the `content` property. This detaches the archive."""
+        self._set_content(value)
+        self.archive = None
+
+    @property
+    def size(self) -> int:
+        """
+        Get the `size` property.
+
+        Returns
+        -------
+        int
+            The length of the body in bytes.
+
+        """
+        if self.archive is not None:
+            return self.length
+
+        return super().size
+
+    def view(self) -> memoryview:
+        """
+        Get the body without copying it.
+
+        Returns
+        -------
+        memoryview
+            A read-only view of the body.
+
+        """
+        if self.archive is not None:
+            return self.archive.view(self.offset, self.length)
+
+        return memoryview(super().content)
+
+    def open(self) -> BinaryIO:
+        """
+        Get the body as a readable file-like object.
+
+        Returns
+        -------
+        file-like object
+            A BytesIO object for the content.
+
+        """
+        if self.archive is not None:
+            return io.BytesIO(self.content)
+
+        return super().open()
+
+
+class ArchivePackageStorage(PackageStorage):
+    """
+    A `PackageStorage` keeping the bodies in a `BodyArchive`.
+
+    Only the metadata and the indexes of the packages are held in memory.
+    `add` appends the bodies to the archive and stores `ArchivedPackage`
+    copies of the packages. Space of removed or evicted bodies isn't
+    reclaimed.
+
+    Parameters
+    ----------
+    path : str, optional
+        The archive file. The default is None for a temporary file.
+    **kwargs
+        The limits passed to `PackageStorage`.
+
+    """
+
+    def __init__(self, path: Optional[str] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.archive = BodyArchive(path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def close(self) -> None:
+        """Close the archive."""
+        self.archive.close()
+
+    def archived(self, package: Package) -> ArchivedPackage:
+        """
+        Append the body of a package to the archive.
+
+        Parameters
+        ----------
+        package : Package
+            The package.
+
+        Returns
+        -------
+        ArchivedPackage
+            A copy of the package without the body in memory.
+
+        """
+        if isinstance(package, ArchivedPackage) and \
+                package.archive is self.archive:
+            return package
+
+        offset, length = self.archive.append(package.open())
+        return ArchivedPackage(self.archive, offset, length, package.sender,
+                               package.recipient, package.type,
+                               package.timestamp)
+
+    def add(self,
+            *packages: Package,
+            as_list: Optional[List[Package]] = None) -> List[int]:
+        """
+        Add packages to the PackageStorage.
+
+        The stored packages are `ArchivedPackage` copies.
+
+        Parameters
+        ----------
+        *packages : Package
+            The packages.
+        as_list : List[Package], optional
+            The packages in a list. The default is None.
+
+        Returns
+        -------
+        List[int]
+            The ids of the packages in the storage. The packages might have
+            been evicted already.
+
+        """
+        if packages and isinstance(packages[0], list):
+            raise ValueError("Expected Package not list for `*packages`.")
+
+        packages = list(packages) + list(as_list or ())
+        return super().add(as_list=[self.archived(pkg) for pkg in packages])
+
+
+# ---- Columns
+
+
+class ColumnPackage(Package):
+    """
+    A view of a package stored in a `ColumnarPackageStorage`.
+
+    The body is copied from the storage when `content` is accessed.
+    Setting it detaches the package from the storage.
+
+    Parameters
+    ----------
+    storage : ColumnarPackageStorage
+        The storage holding the body.
+    row : int
+        The id of the package in the storage.
+    *args
+        The arguments for `Package`.
+
+    """
+
+    __slots__ = ['storage', 'row']
+
+    def __init__(self, storage: 'ColumnarPackageStorage', row: int, *args):
+        super().__init__(*args)
+        self.storage = storage
+        self.row = row
+
+    @property
+    def content(self) -> bytes:
+        """
+        Get the `content` property.
+
+        Returns
+        -------
+        bytes
+            The body of the package.
+
+        """
+        if self.storage is not None:
+            return self.storage.content_of(self.row)
+
+        return super().content
+
+    @content.setter
+    def content(self, value: bytes):
+        """Set the `content` property. This detaches the storage."""
+        self._set_content(value)
+        self.storage = None
+
+    @property
+    def size(self) -> int:
+        """
+        Get the `size` property.
+
+        Returns
+        -------
+        int
+            The length of the body in bytes.
+
+        """
+        if self.storage is not None:
+            offsets = self.storage.content_offsets
+            return offsets[self.row + 1] - offsets[self.row]
+
+        return super().size
+
+    def open(self) -> BinaryIO:
+        """
+        Get the body as a readable file-like object.
+
+        Returns
+        -------
+        file-like object
+            A BytesIO object for the content.
+
+        """
+        if self.storage is not None:
+            return io.BytesIO(self.content)
+
+        return super().open()
+
+
+class ColumnarPackageStorage(AbstractPackageStorage):
+    """
+    A package storage keeping the packages in compact columns.
+
+    Senders, recipients and types are interned into integer ids. The ids,
+    the timestamps and the offsets are stored in arrays. All bodies are
+    kept in one buffer. `ColumnPackage` views are created when packages
+    are requested.
+
+    The rows of removed packages are only marked as removed. Their space
+    isn't reclaimed.
+
+    Examples
+    --------
+    >>> storage = ColumnarPackageStorage()
+    >>> storage.add(package1, package2)
+    >>> for pkg in storage.filter(sender='somesender'):
+    ...     print(pkg)
+    <Package 1>
+
+    """
+
+    def __init__(self):
+        #: the interned strings by their id
+        self.strings: List[str] = []
+        self._string_ids: Dict[str, int] = {}
+
+        #: the columns with one entry per row
+        self.senders = array.array('I')
+        self.types = array.array('I')
+        self.times = array.array('d')  # NaN for no time
+        self.alive = bytearray()
+
+        #: the recipients of row i are at `recipient_offsets[i:i + 2]`
+        self.recipient_offsets = array.array('Q', [0])
+        self.recipients = array.array('I')
+
+        #: the body of row i is at `content_offsets[i:i + 2]`
+        self.content_offsets = array.array('Q', [0])
+        self.contents = bytearray()
+
+        #: string id -> rows
+        self.by_sender: Dict[int, array.array] = {}
+        self.by_recipient: Dict[int, array.array] = {}
+        self.by_type: Dict[int, array.array] = {}
+
+        self._length = 0
+
+    def _intern(self, string: str) -> int:
+        """Get the id of a string. New strings are added."""
+        string_id = self._string_ids.get(string)
+        if string_id is None:
+            string_id = self._string_ids[string] = len(self.strings)
+            self.strings.append(string)
+        return string_id
+
+    @staticmethod
+    def _post(index: Dict[int, array.array], key: int, row: int) -> None:
+        """Add a row to the postings of `key`."""
+        rows = index.get(key)
+        if rows is None:
+            index[key] = array.array('I', [row])
+        else:
+            rows.append(row)
+
+    def content_of(self, row: int) -> bytes:
+        """
+        Get the body of a row.
+
+        Parameters
+        ----------
+        row : int
+            The id of the package.
+
+        Returns
+        -------
+        bytes
+            A copy of the body.
+
+        """
+        offsets = self.content_offsets
+        return bytes(self.contents[offsets[row]:offsets[row + 1]])
+
+    def get(self, row: int) -> ColumnPackage:
+        """
+        Get a view of a stored package.
+
+        Parameters
+        ----------
+        row : int
+            The id returned by `add`.
+
+        Raises
+        ------
+        KeyError
+            There is no package with this id.
+
+        Returns
+        -------
+        ColumnPackage
+            The package.
+
+        """
+        if not 0 <= row < len(self.alive) or not self.alive[row]:
+            raise KeyError(row)
+
+        strings = self.strings
+        offsets = self.recipient_offsets
+        recipients = self.recipients[offsets[row]:offsets[row + 1]]
+        time = self.times[row]
+        return ColumnPackage(self, row, strings[self.senders[row]],
+                             [strings[i] for i in recipients],
+                             strings[self.types[row]],
+                             None if math.isnan(time) else time)
+
+    def _rows(self, kwargs: dict) -> Iterator[int]:
+        """Get the rows possibly matching the keywords."""
+        candidates = None
+        indexes = (('sender', self.by_sender), ('type', self.by_type),
+                   ('recipient', self.by_recipient))
+        for keyword, index in indexes:
+            if keyword not in kwargs:
+                continue
+
+            value = kwargs[keyword]
+            if keyword == 'recipient':
+                if not isinstance(value, tuple) or not value:
+                    continue
+                value = value[0]
+            if not isinstance(value, str):
+                continue
+
+            string_id = self._string_ids.get(value)
+            rows = index.get(string_id) if string_id is not None else None
+            if rows is None:
+                return iter(())  # the value isn't stored
+            if candidates is None or len(rows) < len(candidates):
+                candidates = rows
+
+        if candidates is None:
+            return iter(range(len(self.alive)))
+
+        # postings can grow while iterating
+        return iter(candidates[:])
+
+    def _matches(self, row: int, kwargs: dict) -> bool:
+        """Test the columns of a row against the keywords."""
+        for keyword, value in kwargs.items():
+            if keyword == 'sender':
+                if self.strings[self.senders[row]] != value:
+                    return False
+            elif keyword == 'type':
+                if self.strings[self.types[row]] != value:
+                    return False
+            elif keyword == 'timestamp':
+                timestamp = self.times[row]
+                if (None if math.isnan(timestamp) else timestamp) != value:
+                    return False
+            elif keyword == 'recipient':
+                if not isinstance(value, tuple):
+                    return False
+                offsets = self.recipient_offsets
+                recipients = self.recipients[offsets[row]:offsets[row + 1]]
+                if len(recipients) != len(value) or any(
+                        self.strings[i] != r
+                        for i, r in zip(recipients, value)):
+                    return False
+            else:
+                pkg = self.get(row)
+                if not hasattr(pkg, keyword) or getattr(pkg, keyword) != value:
+                    return False
+
+        return True
+
+    def __contains__(self, package: Package) -> bool:
+        """
+        Test wether this storage contains the given package.
+
+        Parameters
+        ----------
+        package : Package
+            The package to search for.
+
+        Returns
+        -------
+        bool
+            Wether a package equal to `package` is stored.
+
+        """
+        return next(self._equal_rows(package), None) is not None
+
+    def _equal_rows(self, package: Package) -> Iterator[int]:
+        """Get the rows of the packages equal to `package`."""
+        kwargs = {
+            'sender': package.sender,
+            'type': package.type,
+            'recipient': tuple(package.recipient)
+        }
+        for row in self._rows(kwargs):
+            if self.alive[row] and self._matches(row, kwargs) and \
+                    self.get(row) == package:
+                yield row
+
+    def __iter__(self) -> Iterator[ColumnPackage]:
+        """Iterate over views of the packages in the order they were added."""
+        return self.filter()
+
+    def __len__(self) -> int:
+        """Get the number of packages stored."""
+        return self._length
+
+    def add(self,
+            *packages: Package,
+            as_list: Optional[List[Package]] = None) -> List[int]:
+        """
+        Add packages to the storage.
+
+        Parameters
+        ----------
+        *packages : Package
+            The packages.
+        as_list : List[Package], optional
+            The packages in a list. The default is None.
+
+        Returns
+        -------
+        List[int]
+            The ids of the packages in the storage.
+
+        """
+        if packages and isinstance(packages[0], list):
+            raise ValueError("Expected Package not list for `*packages`.")
+
+        ids = []
+        for pkg in list(packages) + list(as_list or ()):
+            row = len(self.alive)
+            ids.append(row)
+
+            sender = self._intern(pkg.sender)
+            typ = self._intern(pkg.type)
+            self.senders.append(sender)
+            self.types.append(typ)
+            self.times.append(math.nan if pkg.timestamp is None else
+                              pkg.timestamp)
+            self.alive.append(1)
+            self._post(self.by_sender, sender, row)
+            self._post(self.by_type, typ, row)
+
+            for recipient in pkg.recipient:
+                self.recipients.append(self._intern(recipient))
+            self.recipient_offsets.append(len(self.recipients))
+            for recipient in set(pkg.recipient):
+                self._post(self.by_recipient, self._intern(recipient), row)
+
+            self.contents += pkg.content
+            self.content_offsets.append(len(self.contents))
+            self._length += 1
+
+        return ids
+
+    def remove(self,
+               *packages: Package,
+               func: Callable[[Package], bool] = None) -> None:
+        """
+        Remove packages from the storage.
+
+        All packages that equal the packages directly specified are removed.
+        The function acts as a filter. The `func` function gets passed
+        an `Package` if the function returns `True` the package is removed.
+
+        Parameters
+        ----------
+        *packages : Package (optional)
+            Packages to be removed.
+        func : callable(Package) -> bool, optional
+            A function acting as a filter.
+
+        """
+        rows = set()
+        for package in packages:
+            rows.update(self._equal_rows(package))
+
+        if func:
+            rows.update(pkg.row for pkg in self if func(pkg))
+
+        for row in rows:
+            self.alive[row] = 0
+        self._length -= len(rows)
+
+    def all(self) -> List[ColumnPackage]:
+        """
+        Return a list of all packages in the storage.
+
+        Returns
+        -------
+        List of ColumnPackage.
+
+        """
+        return list(self)
+
+    def filter(self,
+               func: Optional[Callable[[Package], bool]] = None,
+               **kwargs) -> Iterator[ColumnPackage]:
+        """
+        Filter the packages in the storage.
+
+        The sender, type and recipient keywords are compared on the
+        columns. Views are only created for the rows matching them.
+
+        Parameters
+        ----------
+        func : callable(Package) -> bool, optional
+            A function acting as a filter.
+        **kwargs : Any.
+            Attributes of Package that should match.
+
+        Yields
+        ------
+        ColumnPackage
+            The packages matching the filter.
+
+        """
+        alive = self.alive
+        for row in self._rows(kwargs):
+            if alive[row] and self._matches(row, kwargs):
+                pkg = self.get(row)
+                if (not func) or func(pkg):
+                    yield pkg
+
+    def filter_recipient(self, *recipients: str) -> Iterator[ColumnPackage]:
+        """
+        Filter out the packages that have one of the given recipients.
+
+        Parameters
+        ----------
+        *recipients : str
+            The allowed recipients.
+
+        Yields
+        ------
+        ColumnPackage
+            The packages.
+
+        """
+        rows = set()
+        for recipient in recipients:
+            string_id = self._string_ids.get(recipient)
+            if string_id is not None:
+                rows.update(self.by_recipient.get(string_id, ()))
+
+        for row in sorted(rows):
+            if self.alive[row]:
+                yield self.get(row)
@@ -24,8 +24,9 @@
 
 """
 
+import bisect
 import textwrap
-from typing import Callable, List, Optional, Tuple, Union, cast
+from typing import List, Optional, Tuple, Union, cast
 
 from ectec.client import Package, PackageStorage
 from PyQt5.QtCore import (QAbstractListModel, QEvent, QModelIndex, QObject,
@@ -48,8 +49,10 @@ class ModelPackageStorage(PackageStorage):
     ----------
     model : EctecPackageModel
         The connected model.
+    **kwargs
+        The limits passed to `PackageStorage`.
     """
-    def __init__(self, model: 'EctecPackageModel'):
+    def __init__(self, model: 'EctecPackageModel', **kwargs):
         """
         Init a PackageStorage that is connected to a Model.
 
@@ -57,41 +60,44 @@ def __init__(self, model: 'EctecPackageModel'):
         ----------
         model : EctecPackageModel
             The connected model.
+        **kwargs
+            The limits passed to `PackageStorage`.
         """
-        super().__init__()
+        super().__init__(**kwargs)
         self.model = model
-
-    def remove(self,
-               *packages: Package,
-               func: Callable[[Package], bool] = None) -> None:
-        """
-        Remove packages from the storage.
-
-        All packages that equal the packages directly specified are removed.
-        The function acts as a filter. The `func` function gets passed
-        an `Package` if the function returns `True` the package is removed.
-        If you pass both packages and a function all packages matching
-        one of them will be removed.
-
-        Parameters
-        ----------
-        *packages : Package (optional)
-            Packages to be removed.
-        func : callable(Package) -> bool, optional
-            A function acting as a filter.
-
-        """
-        self.model.beginResetModel()
-
-        super().remove(*packages, func=func)
-
-        self.model.endResetModel()
+        self._inserting = False
+
+    def _row(self, package_id: int) -> int:
+        """Get the row of a stored package."""
+        # packages are evicted from the start mostly
+        for row, stored_id in enumerate(self.packages):
+            if stored_id == package_id:
+                return row
+
+        raise KeyError(package_id)
+
+    def _unindex(self, package_id: int) -> None:
+        """Remove a stored package and its row."""
+        row = self._row(package_id)
+        self.model.beginRemoveRows(QModelIndex(), row, row)
+        try:
+            super()._unindex(package_id)
+        finally:
+            self.model.endRemoveRows()
+
+    def _strip(self, package_id: int) -> Package:
+        """Replace the body of a stored package and update its row."""
+        pkg = super()._strip(package_id)
+
+        index = self.model.index(self._row(package_id))
+        self.model.dataChanged.emit(index, index)
+        return pkg
 
     def add(
         self,
         *packages: Union[Package, List[Package]],
         as_list: Optional[List[Package]] = None,
-    ) -> None:
+    ) -> List[int]:
         """
         Add packages to the PackageStorage.
 
@@ -104,16 +110,45 @@ def add(
 
         Returns
         -------
-        None.
+        List[int]
+            The ids of the packages in the storage.
 
         """
         count = len(packages) + (len(as_list) if as_list else 0)
         self.model.beginInsertRows(QModelIndex(), len(self),
                                    len(self) + count - 1)
-        super().add(*packages, as_list=as_list)
+        self._inserting = True
+        try:
+            ids = super().add(*packages, as_list=as_list)
+        finally:
+            self._inserting = False
 
         self.model.endInsertRows()
 
+        if self.over_limit:
+            self.evict()
+
+        return ids
+
+    def evict(self) -> List[Package]:
+        """
+        Evict packages until the limits are satisfied.
+
+        The eviction is delayed until the rows added are inserted into the
+        model. The rows of the packages removed are removed from the model
+        one by one so that the view keeps its scroll position and selection.
+
+        Returns
+        -------
+        List[Package]
+            The packages removed or stripped of their body.
+
+        """
+        if self._inserting:
+            return []
+
+        return super().evict()
+
 
 class EctecPackageModel(QAbstractListModel):
     """
@@ -159,6 +194,40 @@ def data(self, index: QModelIndex, role: Qt.ItemDataRole):
             row = index.row()
             return self.storage.all()[row]
 
+    def search(self,
+               query: str,
+               limit: Optional[int] = None) -> List[QModelIndex]:
+        """
+        Find the text packages containing all words of a query.
+
+        This requires the storage to have a `text_index`.
+
+        Parameters
+        ----------
+        query : str
+            The words as passed to `PackageStorage.search`.
+        limit : int, optional
+            The maximum number of indexes returned. The default is None.
+
+        Returns
+        -------
+        List[QModelIndex]
+            The indexes of the packages found, the newest first.
+
+        """
+        ids = self.storage.text_index.search(query, limit,
+                                             self.storage.packages)
+
+        # the ids increase with the rows
+        rows = list(self.storage.packages)
+        indexes = []
+        for package_id in ids:
+            row = bisect.bisect_left(rows, package_id)
+            if row < len(rows) and rows[row] == package_id:
+                indexes.append(self.index(row))
+
+        return indexes
+
 
 class ChatViewDelegate(QStyledItemDelegate):
     """
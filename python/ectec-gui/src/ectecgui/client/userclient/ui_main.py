@@ -88,6 +88,10 @@ def setupUi(self, dUserClient):
         self.horizontalLayout_2.addWidget(self.frameServerInfo)
         spacerItem = QtWidgets.QSpacerItem(40, 20, QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Minimum)
         self.horizontalLayout_2.addItem(spacerItem)
+        self.lineEditSearch = QtWidgets.QLineEdit(self.frameMenuBar)
+        self.lineEditSearch.setClearButtonEnabled(True)
+        self.lineEditSearch.setObjectName("lineEditSearch")
+        self.horizontalLayout_2.addWidget(self.lineEditSearch)
         self.buttonDisconnect = QtWidgets.QPushButton(self.frameMenuBar)
         icon = QtGui.QIcon.fromTheme("network-disconnect")
         self.buttonDisconnect.setIcon(icon)
@@ -201,6 +205,7 @@ def retranslateUi(self, dUserClient):
         _translate = QtCore.QCoreApplication.translate
         self.labelClient.setText(_translate("dUserClient", "<html><head/><body><p><span style=\" font-style:italic;\">Local client</span></p></body></html>"))
         self.labelServer.setText(_translate("dUserClient", "<html><head/><body><p><span style=\" font-style:italic;\">Server</span></p></body></html>"))
+        self.lineEditSearch.setPlaceholderText(_translate("dUserClient", "Search"))
         self.buttonDisconnect.setText(_translate("dUserClient", "Disconnect"))
         self.toolButtonMenu.setToolTip(_translate("dUserClient", "Menu"))
         self.labelTo.setText(_translate("dUserClient", "To:"))
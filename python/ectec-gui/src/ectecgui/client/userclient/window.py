@@ -26,7 +26,8 @@
 import ectec
 import ectec.client as eccl
 from PyQt5 import QtWidgets
-from PyQt5.QtCore import QEvent, pyqtSignal, pyqtSlot
+from PyQt5.QtCore import (QEvent, QModelIndex, QPersistentModelIndex,
+                          pyqtSignal, pyqtSlot)
 from PyQt5.QtGui import QCloseEvent, QIcon, QTextCursor
 from PyQt5.QtWidgets import QAction, QApplication, QComboBox, QMessageBox
 
@@ -166,6 +167,9 @@ class UserClientWindow(QtWidgets.QDialog):
     #: Return to the calling window. This window is already closed.
     ended = pyqtSignal()
 
+    #: The maximum number of packages found by a search.
+    SEARCH_HITS = 100
+
     def __init__(self, client: QUserClient, parent=None) -> None:
         """Init."""
         super().__init__(parent=parent)
@@ -189,6 +193,10 @@ def __init__(self, client: QUserClient, parent=None) -> None:
 
         self.client = client
 
+        #: The last search and the packages found, the newest first.
+        self._search_query = None
+        self._search_hits = []
+
         # =================================================================
         #
         # Setup entries and populate with default values.
@@ -226,7 +234,12 @@ def __init__(self, client: QUserClient, parent=None) -> None:
 
         # change packagestorage of client
         self.packagemodel = EctecPackageModel()
-        self.client.packages = self.packagemodel.storage
+        storage = self.packagemodel.storage
+        storage.max_packages = self.client.HISTORY_PACKAGES
+        storage.max_bytes = self.client.HISTORY_BYTES
+        storage.eviction = self.client.HISTORY_EVICTION
+        storage.text_index = eccl.TextIndex()
+        self.client.packages = storage
 
         self.ui.chatView.setModel(self.packagemodel)
         self.ui.chatView.setLocalName(self.client.username)
@@ -240,6 +253,7 @@ def __init__(self, client: QUserClient, parent=None) -> None:
         # connect GUI
         self.ui.buttonDisconnect.clicked.connect(self.slotDisconnect)
         self.ui.buttonSend.clicked.connect(self.slotSend)
+        self.ui.lineEditSearch.returnPressed.connect(self.slotSearch)
 
         # connect client
         self.client.usersUpdated.connect(self.slotUsersUpdated)
@@ -302,6 +316,31 @@ def slotSend(self):
         cursor.removeSelectedText()
         cursor.endEditBlock()
 
+    @pyqtSlot()
+    def slotSearch(self):
+        """
+        Show the next package matching the search.
+
+        Pressing enter again shows the next older package found.
+        """
+        query = self.ui.lineEditSearch.text()
+        if query != self._search_query or not self._search_hits:
+            self._search_query = query
+            self._search_hits = [
+                QPersistentModelIndex(index)
+                for index in self.packagemodel.search(query, self.SEARCH_HITS)
+            ]
+
+        # the rows found are invalid after the model was reset
+        while self._search_hits:
+            index = QModelIndex(self._search_hits.pop(0))
+            if index.isValid():
+                self.ui.chatView.setCurrentIndex(index)
+                self.ui.chatView.scrollTo(index)
+                return
+
+        logger.debug('Search: No packages found.')
+
     @pyqtSlot()
     def slotUsersUpdated(self):
         """
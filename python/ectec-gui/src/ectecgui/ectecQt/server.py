@@ -73,7 +73,12 @@ def __init__(self, requesthandler=QClientHandler):
         self.requesthandler_class.usersChanged.signal.connect(
             self.usersChanged)
 
-    def start(self, port: int, address: str = ""):
+    def start(self,
+              port: int,
+              address: str = "",
+              backlog: int = None,
+              unix_path: str = None,
+              capture: str = None):
         """
         Start the server at the given port and address.
 
@@ -87,11 +92,22 @@ def start(self, port: int, address: str = ""):
             the port.
         address : str
             The address. Defaults to an empty string.
+        backlog : int, optional
+            The size of the queue for connections the server didn't accept
+            yet. The default is None (`EctecTCPMixIn.request_queue_size`).
+        unix_path : str, optional
+            The path for an additional unix socket. Mustn't exist.
+            The default is None (TCP only).
+        capture : str, optional
+            The path of a file to capture the traffic to.
+            The default is None (no capture).
 
         Raises
         ------
         EctecException
             The server is already running.
+        OSError
+            Couldn't create the sockets.
 
         Returns
         -------
@@ -102,8 +118,8 @@ def start(self, port: int, address: str = ""):
         if self.running:
             raise ectec.EctecException('Server is already running.')
 
-        server = ectecserver.EctecTCPServer((address, port),
-                                            self.requesthandler_class)
+        server = self._create_server(port, address, backlog, unix_path,
+                                     capture)
         self._server = server
 
         self._serve_thread = ThreadQ(target=server.serve_forever)
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Performance tests of the parsers with adversarial input.
+
+The commands parsed by the server and the client are controlled by the
+remote. Each test feeds pathological input to a parser and fails if the
+parser exceeds its time or memory budget. The budgets are generous. They
+catch complexity blowups, not small regressions.
+
+***********************************
+
+Created on Mon Oct 19 16:20:13 2026
+
+Copyright (C) 2020 real-yfprojects (github.com user)
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+import logging
+import socket
+import socketserver
+import time
+import tracemalloc
+import unittest
+from unittest import mock
+
+from . import _import_ectec
+
+ectec = _import_ectec('client', 'server')
+ectecclient = ectec.client
+ectecserver = ectec.server
+
+#: The maximum length of a command. Inputs are as long as allowed.
+COMMAND_LENGTH = ectecserver.ClientHandler.COMMAND_LENGTH
+
+
+class DripSocket:
+    """
+    A fake socket returning the given data in tiny parts.
+
+    `recv` raises `socket.timeout` when the data is exhausted.
+    """
+
+    def __init__(self, data: bytes, part_size: int = 1):
+        self.data = data
+        self.part_size = part_size
+        self.position = 0
+
+    def recv(self, bufsize):
+        if self.position >= len(self.data):
+            raise socket.timeout()
+
+        size = min(bufsize, self.part_size)
+        part = self.data[self.position:self.position + size]
+        self.position += len(part)
+        return part
+
+    def recv_into(self, buffer, nbytes=0):
+        part = self.recv(nbytes or len(buffer))
+        buffer[:len(part)] = part
+        return len(part)
+
+    def settimeout(self, timeout):
+        pass
+
+    def setblocking(self, flag):
+        pass
+
+
+class ParserBudgetTestCase(unittest.TestCase):
+    """Base class measuring the parsers."""
+
+    #: s - the default time budget of one call
+    TIME_BUDGET = 0.02
+
+    #: factor applied to the time budgets. The budgets are the durations
+    #: expected on an idle machine while backtracking takes seconds.
+    TIME_SLACK = 25
+
+    #: bytes - the default memory budget of one call
+    MEMORY_BUDGET = 1 << 18
+
+    def assertWithinBudget(self, func, *args, time_budget=None,
+                           memory_budget=None, expected=None):
+        """
+        Call `func` and check its duration and memory peak.
+
+        The time is measured without tracing the memory. The fastest of
+        three calls is compared to the budget times `TIME_SLACK` so that
+        loaded machines don't fail the test.
+
+        Parameters
+        ----------
+        func : callable
+            The parser. It is called with `args`.
+        time_budget : float, optional
+            The budget in s. The default is `TIME_BUDGET`.
+        memory_budget : int, optional
+            The budget in bytes. The default is `MEMORY_BUDGET`.
+        expected : type, optional
+            An exception `func` is expected to raise. The default is None.
+
+        Returns
+        -------
+        object
+            The return value of the last call.
+
+        """
+        time_budget = (time_budget or self.TIME_BUDGET) * self.TIME_SLACK
+        memory_budget = memory_budget or self.MEMORY_BUDGET
+
+        def call():
+            if expected is None:
+                return func(*args)
+
+            with self.assertRaises(expected):
+                func(*args)
+
+        durations = []
+        for i in range(3):
+            start = time.perf_counter()
+            result = call()
+            durations.append(time.perf_counter() - start)
+
+        tracemalloc.start()
+        try:
+            call()
+            dummy, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        self.assertLessEqual(
+            min(durations), time_budget,
+            "Time budget of {}s exceeded.".format(time_budget))
+        self.assertLessEqual(
+            peak, memory_budget,
+            "Memory budget of {} bytes exceeded.".format(memory_budget))
+
+        return result
+
+
+def recipient_lists():
+    """Yield pathological recipient lists of maximal length."""
+    room = COMMAND_LENGTH - 100
+    yield 'a,' * (room // 2) + 'a'
+    yield ',' * room
+    yield '#,' * (room // 2)
+    yield 'a' * room
+    yield ('a' * 60 + ',') * (room // 61)
+
+
+class ServerParserTestCase(ParserBudgetTestCase):
+    """The parsers of the `ClientHandler`."""
+
+    def setUp(self):
+        ectecserver.logger.propagate = False
+
+        class TestHandler(ectecserver.ClientHandler):
+
+            def __init__(self, request, address, server):
+                self.request = request
+                self.client_address = address
+                self.server = server
+
+        server = mock.MagicMock(spec=socketserver.TCPServer)
+        self.handler = TestHandler(None, ('127.0.0.1', 0), server)
+        self.handler.log = mock.MagicMock(spec=logging.LoggerAdapter)
+        self.handler.setup()
+
+    def test_package_recipients(self):
+        """Test PACKAGE commands with maximal recipient lists."""
+        for recipients in recipient_lists():
+            for tail in (' WITH 5', ' WITH 5 HASH ' + 'f' * 63 + 'g', ' ',
+                         ' REF ' + 'f' * 64, ''):
+                cmd = 'PACKAGE t FROM s TO ' + recipients + tail
+
+                with self.subTest(recipients=recipients[:10], tail=tail):
+                    for regex in (self.handler.regex_package,
+                                  self.handler.regex_ref):
+                        self.assertWithinBudget(regex.fullmatch, cmd)
+
+    def test_route_recipients(self):
+        """Test routing to maximal recipient lists."""
+        for recipients in recipient_lists():
+            with self.subTest(recipients=recipients[:10]):
+                self.assertWithinBudget(self.handler.route, recipients)
+
+    def test_huge_lengths(self):
+        """Test PACKAGE headers declaring huge lengths."""
+        digits = COMMAND_LENGTH - 100
+        for length in ('9' * digits, '0' * digits + '1'):
+            cmd = 'PACKAGE t FROM s TO r WITH ' + length
+            with self.subTest(length=length[:10]):
+                header = self.assertWithinBudget(
+                    self.handler.parse_pkg_header, cmd)
+                self.assertEqual(header[3], int(length))
+
+        cmd = 'CACHE ' + '9' * digits
+        match = self.assertWithinBudget(self.handler.regex_cache.fullmatch,
+                                        cmd)
+        self.assertIsNotNone(match)
+
+    def test_invalid_utf8(self):
+        """Test commands consisting of invalid UTF-8."""
+        for raw in (b'\xff' * COMMAND_LENGTH,
+                    b'PACKAGE t FROM s TO ' + b'\xc3' * (COMMAND_LENGTH - 20),
+                    b'\xed\xa0\x80' * (COMMAND_LENGTH // 3)):
+
+            def parse(raw=raw):
+                cmd = raw.decode('utf-8', errors='backslashreplace')
+                for regex in (self.handler.regex_package,
+                              self.handler.regex_ref,
+                              self.handler.regex_cache,
+                              self.handler.regex_join,
+                              self.handler.regex_register,
+                              self.handler.regex_info):
+                    regex.fullmatch(cmd)
+
+            with self.subTest(raw=raw[:10]):
+                self.assertWithinBudget(parse)
+
+    def test_slow_drip(self):
+        """Test commands arriving byte by byte."""
+        cmd = b'PACKAGE t FROM s TO ' + b'a' * (COMMAND_LENGTH - 20)
+
+        def recv(data):
+            self.handler.buffer = b''
+            self.handler.request = DripSocket(data)
+            return self.handler.recv_command(COMMAND_LENGTH)
+
+        # the longest command allowed
+        result = self.assertWithinBudget(recv, cmd + b'\n', time_budget=0.1)
+        self.assertEqual(result, cmd)
+
+        # endless commands are rejected after the maximum length
+        data = cmd + b'a' * COMMAND_LENGTH * 10
+        self.assertWithinBudget(recv,
+                                data,
+                                time_budget=0.1,
+                                expected=ectecserver.CommandError)
+        self.assertLessEqual(self.handler.request.position,
+                             COMMAND_LENGTH + 1)
+
+        # large parts too
+        def recv_parts(data):
+            self.handler.buffer = b''
+            self.handler.request = DripSocket(data, 1 << 16)
+            return self.handler.recv_command(COMMAND_LENGTH)
+
+        self.assertWithinBudget(recv_parts,
+                                data,
+                                expected=ectecserver.CommandError)
+        self.assertLessEqual(self.handler.request.position,
+                             self.handler.SOCKET_BUFSIZE)
+
+
+class ClientParserTestCase(ParserBudgetTestCase):
+    """The parsers of the `Client`."""
+
+    def setUp(self):
+        self.client = ectecclient.Client()
+
+    def test_package_recipients(self):
+        """Test PACKAGE commands with maximal recipient lists."""
+        for recipients in recipient_lists():
+            for tail in (' WITH 5 HASH ' + 'f' * 63 + 'g', ' ',
+                         ' REF ' + 'f' * 63, ''):
+                cmd = 'PACKAGE t FROM s TO ' + recipients + tail
+
+                with self.subTest(recipients=recipients[:10], tail=tail):
+                    self.assertWithinBudget(self.client.parse_package, cmd)
+
+    def test_huge_lengths(self):
+        """Test commands declaring huge lengths."""
+        digits = COMMAND_LENGTH - 100
+        self.client.socket = DripSocket(b'')
+
+        # the connection is given up without reading the payload
+        for cmd in ('UPDATE USERS ' + '9' * digits,
+                    'PACKAGE t FROM s TO r WITH ' + '9' * digits):
+            with self.subTest(cmd=cmd[:20]):
+                self.assertWithinBudget(self.client.parse_update
+                                        if cmd.startswith('UPDATE') else
+                                        self.client.parse_package,
+                                        cmd,
+                                        expected=ectecclient.ConnectionClosed)
+
+        cmd = 'CACHE ' + '9' * digits + ' ' + '9' * 10
+        self.assertWithinBudget(self.client.regex_cache.fullmatch, cmd)
+
+    def test_invalid_utf8(self):
+        """Test commands consisting of invalid UTF-8."""
+        for raw in (b'\xff' * COMMAND_LENGTH,
+                    b'ERROR ' + b'\xc3' * (COMMAND_LENGTH - 6),
+                    b'\xed\xa0\x80' * (COMMAND_LENGTH // 3)):
+
+            def parse(raw=raw):
+                cmd = raw.decode('utf-8', errors='backslashreplace')
+                self.client.parse_package(cmd)
+                self.client.parse_update(cmd)
+                self.client.parse_cache(cmd)
+                return self.client.parse_error(cmd)
+
+            with self.subTest(raw=raw[:10]):
+                self.assertWithinBudget(parse)
+
+    def test_long_errors(self):
+        """Test ERROR commands of maximal length."""
+        for message in ('a' * COMMAND_LENGTH, ' ' * COMMAND_LENGTH,
+                        '.*' * (COMMAND_LENGTH // 2)):
+            with self.subTest(message=message[:10]):
+                self.assertEqual(
+                    self.assertWithinBudget(self.client.parse_error,
+                                            'ERROR ' + message), message)
+
+    def test_slow_drip(self):
+        """Test commands arriving byte by byte."""
+        cmd = b'ERROR ' + b'a' * (COMMAND_LENGTH - 6)
+
+        def recv(data):
+            self.client._buffer = b''
+            self.client.socket = DripSocket(data)
+            return self.client.recv_command(COMMAND_LENGTH)
+
+        result = self.assertWithinBudget(recv, cmd + b'\n', time_budget=0.1)
+        self.assertEqual(result, cmd)
+
+        data = cmd + b'a' * COMMAND_LENGTH * 10
+        self.assertWithinBudget(recv,
+                                data,
+                                time_budget=0.1,
+                                expected=ectecclient.CommandError)
+        self.assertLessEqual(self.client.socket.position, COMMAND_LENGTH + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
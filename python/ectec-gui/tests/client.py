@@ -23,8 +23,10 @@
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 """
+import collections
 import datetime
 import logging
+import io
 import secrets
 import socket
 import time
@@ -70,6 +72,32 @@ def test_init(self):
             self.assertEqual(p.type, 'testtype')
             self.assertEqual(p.time, time)
 
+    def test_time(self):
+        """Test that the time is kept as a timestamp."""
+        now = datetime.datetime.now()
+        p = client.Package('testsender', 'testrecipient', 'testtype', now)
+
+        self.assertEqual(p.timestamp, now.timestamp())
+        self.assertEqual(p.time, now)
+
+        p.time = 5
+        self.assertEqual(p.timestamp, 5.)
+        self.assertEqual(p.time, datetime.datetime.fromtimestamp(5))
+
+        p.time = None
+        self.assertIsNone(p.timestamp)
+        self.assertIsNone(p.time)
+
+        with self.assertRaises(TypeError):
+            p.time = '5'
+
+        # a datetime and its timestamp are equal
+        p1 = client.Package('testsender', 'testrecipient', 'testtype', now)
+        p2 = client.Package('testsender', 'testrecipient', 'testtype',
+                            now.timestamp())
+        self.assertEqual(p1, p2)
+        self.assertEqual(hash(p1), hash(p2))
+
     def test_eq(self):
         """Tests the comparing of two instances for equality regarding `==`."""
         with self.subTest('No time'):
@@ -86,6 +114,27 @@ def test_eq(self):
             self.assertFalse(p1 is p2)
             self.assertEqual(p1, p2)
 
+        with self.subTest('Same size'):
+            p1 = client.Package('testsender', 'testrecipient', 'testtype')
+            p2 = client.Package('testsender', 'testrecipient', 'testtype')
+            p1.content = b'content1'
+            p2.content = b'content2'
+
+            self.assertEqual(hash(p1), hash(p2))
+            self.assertNotEqual(p1, p2)
+
+        with self.subTest('File'):
+            p1 = client.Package('testsender', 'testrecipient', 'testtype')
+            p2 = client.Package('testsender', 'testrecipient', 'testtype')
+            p1.content = b'content' * 20000
+            p2.file = io.BytesIO(b'content' * 20000)
+
+            self.assertEqual(hash(p1), hash(p2))
+            self.assertEqual(p1, p2)
+
+            p2.file = io.BytesIO(b'content' * 19999 + b'contenx')
+            self.assertNotEqual(p1, p2)
+
     def test_hash(self):
         """Test the hashing of instances."""
         with self.subTest('Equal'):
@@ -148,6 +197,33 @@ def test_hash(self):
             self.assertNotEqual(hash(p1), hash(p2))
 
 
+class BodyCacheTestCase(unittest.TestCase):
+    """Tests for the `BodyCache` used for deduplication."""
+
+    def test_lru(self):
+        cache = ectec.BodyCache(2)
+
+        body = b'body1'
+        self.assertIs(cache.put('1', body), body)
+
+        # equal bodies are held once
+        self.assertIs(cache.put('1', b'body' + b'1'), body)
+
+        cache.put('2', b'body2')
+        self.assertEqual(cache.get('1'), b'body1')  # '1' recently used
+
+        cache.put('3', b'body3')
+        self.assertEqual(len(cache), 2)
+        self.assertNotIn('2', cache)
+        self.assertIn('1', cache)
+        self.assertIsNone(cache.get('2'))
+
+        # hashes can be tracked without the body
+        cache.put('4', None)
+        self.assertIn('4', cache)
+        self.assertNotIn('1', cache)
+
+
 class PackageStorageTestCase(unittest.TestCase):
     """Tests for the `PackageStorage`."""
 
@@ -268,6 +344,17 @@ def filter_function(pkg):
 
             self.assertEqual(ps.all(), packages)
 
+        with self.subTest('Remove changed.'):
+            ps = client.PackageStorage()
+            ps.add(as_list=packages)
+
+            p1.content = b'x'
+            ps.remove(p1)
+            p1.content = b''
+
+            self.assertEqual(ps.all(), [p2, p3, p4, p5, p6])
+            self.assertNotIn(p1, ps)
+
     def test_filter(self):
         """Test the filtering of packages."""
         p1 = client.Package('testsender', 'testrecipient', 'testtype')
@@ -445,6 +532,228 @@ def test_filter_recipient(self):
 
             self.assertEqual(filtered, [p4, p5, p7])
 
+    def test_indexes(self):
+        """Test that the indexes follow adding and removing."""
+        p1 = client.Package('testsender', 'name1', 'testtype')
+        p2 = client.Package('testsender', ['name1', 'name2'], 'sometype', 2)
+        p3 = client.Package('testman', ['name2', 'name2'], 'testtype', 2)
+
+        ps = client.PackageStorage()
+        self.assertEqual(ps.add(p1, p2, as_list=[p3]), [0, 1, 2])
+
+        self.assertEqual(ps.indexes['sender'], {
+            'testsender': {0: p1, 1: p2},
+            'testman': {2: p3}
+        })
+        self.assertEqual(ps.indexes['recipient'], {
+            'name1': {0: p1, 1: p2},
+            'name2': {1: p2, 2: p3}
+        })
+        self.assertEqual(list(ps.filter(recipient=('name2', 'name2'))), [p3])
+        self.assertEqual(list(ps.filter(sender=['unhashable'])), [])
+
+        ps.remove(p2)
+
+        self.assertEqual(ps.indexes['sender'], {
+            'testsender': {0: p1},
+            'testman': {2: p3}
+        })
+        self.assertEqual(ps.indexes['recipient'], {
+            'name1': {0: p1},
+            'name2': {2: p3}
+        })
+        self.assertEqual(ps.indexes['type'], {'testtype': {0: p1, 2: p3}})
+        self.assertEqual(list(ps.filter(type='testtype', sender='testman')),
+                         [p3])
+        self.assertEqual(list(ps.filter_recipient('name1', 'name2')),
+                         [p1, p3])
+
+    def test_ids(self):
+        """Test the ids of the stored packages."""
+        p1 = client.Package('testsender', 'name1', 'testtype')
+        p2 = client.Package('testsender', 'name1', 'testtype')
+        p3 = client.Package('testman', 'name2', 'testtype', 2)
+
+        ps = client.PackageStorage()
+        ps.add(p1, p3)
+        ids = ps.add(p2)
+
+        self.assertEqual(ids, [2])
+        self.assertIs(ps.get(2), p2)
+        self.assertEqual(ps.find(p2), [0, 2])
+        self.assertIn(client.Package('testsender', 'name1', 'testtype'), ps)
+
+        ps.remove(p1)
+
+        self.assertEqual(ps.all(), [p3])
+        self.assertNotIn(p2, ps)
+        self.assertEqual(ps.find(p1), [])
+        self.assertRaises(KeyError, ps.get, 0)
+
+        # ids aren't reused
+        self.assertEqual(ps.add(p1), [3])
+
+        # the storage can be changed while iterating
+        for pkg in ps.filter(type='testtype'):
+            ps.remove(pkg)
+        self.assertEqual(len(ps), 0)
+
+    def test_limits(self):
+        """Test evicting packages exceeding the limits."""
+        def make(i, size=10, time=None):
+            pkg = client.Package('sender', 'name' + str(i % 2), 'type', time)
+            pkg.content = bytes([i]) * size
+            return pkg
+
+        with self.subTest("FIFO"):
+            evicted = []
+            ps = client.PackageStorage(max_packages=3,
+                                       on_evict=evicted.extend)
+            packages = [make(i) for i in range(5)]
+            ps.add(*packages[:2])
+            self.assertEqual(evicted, [])
+
+            ps.add(as_list=packages[2:])
+
+            self.assertEqual(ps.all(), packages[2:])
+            self.assertEqual(evicted, packages[:2])
+            self.assertEqual(ps.size, 30)
+            self.assertEqual(list(ps.filter_recipient('name0')),
+                             [packages[2], packages[4]])
+
+        with self.subTest("Bytes"):
+            ps = client.PackageStorage(max_bytes=25)
+            packages = [make(i) for i in range(4)]
+            ps.add(as_list=packages)
+
+            self.assertEqual(ps.all(), packages[2:])
+            self.assertEqual(ps.size, 20)
+
+        with self.subTest("Oldest"):
+            ps = client.PackageStorage(max_packages=2,
+                                       eviction=client.Eviction.OLDEST)
+            packages = [make(0, time=3), make(1, time=1), make(2)]
+            ps.add(*packages)
+            self.assertEqual(ps.all(), packages[:2])
+
+            ps.add(make(3, time=2))
+            self.assertEqual(ps.all(), [packages[0], ps.get(3)])
+
+        with self.subTest("Content"):
+            ps = client.PackageStorage(max_bytes=25,
+                                       eviction=client.Eviction.CONTENT)
+            packages = [make(i) for i in range(4)]
+            ps.add(as_list=packages)
+
+            self.assertEqual(ps.all(), packages)
+            self.assertEqual([pkg.content for pkg in packages[:2]],
+                             [b'', b''])
+            self.assertEqual(ps.size, 20)
+            self.assertIn(make(0, size=0), ps)
+            self.assertNotIn(make(0), ps)
+
+            # removing works with the changed hash
+            ps.remove(make(0, size=0))
+            self.assertEqual(ps.all(), packages[1:])
+
+        with self.subTest("Limit set later"):
+            ps = client.PackageStorage()
+            packages = [make(i) for i in range(4)]
+            ps.add(as_list=packages)
+            ps.max_packages = 2
+
+            ps.add(packages[0])
+            self.assertEqual(ps.all(), [packages[3], packages[0]])
+
+    def test_package_hash(self):
+        """Test that the cached hash follows changes of the package."""
+        p1 = client.Package('testsender', 'name1', 'testtype')
+        p2 = client.Package('testsender', 'name1', 'testtype')
+        self.assertEqual(hash(p1), hash(p2))
+
+        p2.content = b'content'
+        self.assertNotEqual(p1, p2)
+        self.assertNotEqual(hash(p1), hash(p2))
+
+        p1.content = b'content'
+        self.assertEqual(p1, p2)
+        self.assertEqual(hash(p1), hash(p2))
+
+        p1.sender = 'testman'
+        self.assertNotEqual(p1, p2)
+
+    def test_search(self):
+        """Test searching the bodies of the text packages."""
+        def make(text, time):
+            pkg = client.Package('testsender', 'name1', 'text/plain', time)
+            pkg.content = text.encode('utf-8')
+            return pkg
+
+        packages = [
+            make(text, i)
+            for i, text in enumerate(["Hello World", "hello there",
+                                      "World peace", "another world"])
+        ]
+        p1, p2, p3, p4 = packages
+
+        self.assertRaises(ValueError, client.PackageStorage().search, 'hello')
+
+        ps = client.PackageStorage(text_index=client.TextIndex())
+        ps.add(as_list=packages)
+        ps.text_index.wait()
+
+        self.assertEqual(ps.search('world'), [p4, p3, p1])
+        self.assertEqual(ps.search('world', limit=2), [p4, p3])
+        self.assertEqual(ps.search('hello wo'), [p1])
+
+        # removed packages aren't returned even before the index is updated
+        ps.remove(p3)
+        self.assertEqual(ps.search('world'), [p4, p1])
+        ps.text_index.wait()
+        self.assertEqual(ps.search('peace'), [])
+
+        # stripped bodies are dropped from the index
+        ps.max_bytes = 25
+        ps.eviction = client.Eviction.CONTENT
+        ps.add(make("new world", 5))
+        ps.text_index.wait()
+        self.assertEqual(ps.search('world'), [ps.all()[-1], p4])
+
+    def test_range(self):
+        """Test looking up packages by their time."""
+        packages = [
+            client.Package('testsender', 'name1', 'testtype', time)
+            for time in (1, 2, 2, 4, 3, None, 5)
+        ]
+        p1, p2, p3, p4, p5, p6, p7 = packages
+
+        ps = client.PackageStorage()
+        ps.add(as_list=packages)
+
+        # out of order packages are sorted in
+        self.assertEqual(list(ps.range()), [p1, p2, p3, p5, p4, p7])
+        self.assertEqual(list(ps.range(2, 4)), [p2, p3, p5])
+        self.assertEqual(list(ps.range(end=2)), [p1])
+        self.assertEqual(list(ps.range(6)), [])
+        self.assertEqual(list(ps.since(3.5)), [p4, p7])
+        self.assertEqual(list(ps.since(datetime.datetime.fromtimestamp(4))),
+                         [p4, p7])
+        self.assertRaises(TypeError, list, ps.range('1'))
+
+        ps.remove(p2, p4)
+        self.assertEqual(list(ps.since(2)), [p5, p7])
+
+        # removed packages are dropped from the index eventually
+        ps.remove(func=lambda p: True)
+        ps.add(as_list=[
+            client.Package('testsender', 'name1', 'testtype', i)
+            for i in range(2000)
+        ])
+        ps.remove(func=lambda p: p.timestamp < 1990)
+        self.assertLess(len(ps._time_ids), 2000)
+        self.assertEqual([p.timestamp for p in ps.since(1995)],
+                         [1995., 1996., 1997., 1998., 1999.])
+
 
 # ---- Client Tests
 
@@ -736,6 +1045,18 @@ def test_parse_update(self):
 
             self.assertEqual(res, ['3'])
 
+        with self.subTest("Too large"):
+            self.client.MAX_UPDATE_SIZE = 10
+            command = 'UPDATE USERS 20'
+
+            self.server_socket.sendall(b'a' * 20)
+
+            with self.assertRaises(client.ConnectionClosed):
+                self.client.parse_update(command)
+
+            # the list isn't read
+            self.assertEqual(self.client.recv_bytes(4, 1), b'aaaa')
+
     def test_parse_package(self):
         with self.subTest("Other command"):
             command = 'INFO'
@@ -785,6 +1106,123 @@ def test_parse_package(self):
 
             self.assertEqual(res, package)
 
+        with self.subTest("Spilled"):
+            self.client.SPILL_THRESHOLD = 10
+            command = 'PACKAGE testtype FROM ben TO anna WITH 20'
+            data = b'a\xd9\xf7\xafa-\xd3#\xea\xf3$\xedj\xa2\x1f[\xe6i\x85\xbe'
+
+            self.server_socket.sendall(data)
+
+            res = self.client.parse_package(command)
+
+            self.assertIsNotNone(res.file)
+            self.assertEqual(res.size, 20)
+            self.assertEqual(res.content, data)
+            res.file.close()
+
+        with self.subTest("Too large"):
+            self.client.MAX_PACKAGE_SIZE = 10
+            command = 'PACKAGE testtype FROM ben TO anna WITH 20'
+
+            self.server_socket.sendall(b'a' * 20 + b'INFO')
+
+            with self.assertRaises(client.ConnectionClosed):
+                self.client.parse_package(command)
+
+            # the content isn't read
+            self.assertEqual(self.client.recv_bytes(4, 1), b'aaaa')
+
+    def test_send_join_part(self):
+        sep = self.client.COMMAND_SEPERATOR
+
+        self.client.send_join('class')
+        self.assertEqual(self.server_socket.recv(4096), b'JOIN class' + sep)
+
+        self.client.send_part('class')
+        self.assertEqual(self.server_socket.recv(4096), b'PART class' + sep)
+
+        with self.assertRaises(ValueError):
+            self.client.send_join('#class')
+
+        # packages can be sent to groups
+        package = client.Package("ben", ["#class", "anna"], "typ4")
+        self.assertEqual(package.groups, ('class', ))
+
+        self.client.send_package(package)
+        self.assertEqual(self.server_socket.recv(4096),
+                         b"PACKAGE typ4 FROM ben TO #class,anna WITH 0" + sep)
+
+        res = self.client.parse_package(
+            "PACKAGE typ4 FROM ben TO #class,anna WITH 0")
+        self.assertEqual(res.recipient, ('#class', 'anna'))
+
+    def test_deduplication(self):
+        """Test parsing and sending packages with a hash or a reference."""
+        sep = self.client.COMMAND_SEPERATOR
+        data = b'exercise'
+        digest = ectec.content_hash(data)
+
+        with self.subTest("Cache"):
+            self.assertFalse(self.client.parse_cache('INFO'))
+            self.assertTrue(self.client.parse_cache('CACHE 2 100'))
+            self.assertEqual(self.client.dedup_max_size, 100)
+
+        with self.subTest("Parse hash"):
+            command = 'PACKAGE t FROM ben TO anna WITH 8 HASH ' + digest
+            self.server_socket.sendall(data)
+
+            first = self.client.parse_package(command)
+            self.assertEqual(first.content, data)
+
+            self.server_socket.sendall(data)
+            second = self.client.parse_package(command)
+            self.assertIs(second.content, first.content)
+
+        with self.subTest("Parse reference"):
+            command = 'PACKAGE t FROM ben TO anna REF ' + digest
+
+            res = self.client.parse_package(command)
+            self.assertIs(res.content, first.content)
+
+            with self.assertRaises(client.CommandError):
+                self.client.parse_package('PACKAGE t FROM ben TO anna REF ' +
+                                          '0' * 64)
+
+        with self.subTest("Send"):
+            package = client.Package("ben", "anna", "t")
+            package.content = data
+
+            self.client.send_package(package)
+            ans = self.server_socket.recv(4096)
+            self.assertEqual(
+                ans, b"PACKAGE t FROM ben TO anna WITH 8 HASH " +
+                digest.encode() + sep + data)
+
+            self.client.send_package(package)
+            ans = self.server_socket.recv(4096)
+            self.assertEqual(
+                ans,
+                b"PACKAGE t FROM ben TO anna REF " + digest.encode() + sep)
+
+        with self.subTest("Forget sent"):
+            # e.g. the server failed to store the body
+            self.client.forget_sent_bodies()
+
+            self.client.send_package(package)
+            ans = self.server_socket.recv(4096)
+            self.assertEqual(
+                ans, b"PACKAGE t FROM ben TO anna WITH 8 HASH " +
+                digest.encode() + sep + data)
+
+        with self.subTest("Send too large"):
+            package.content = b'x' * 101
+
+            self.client.send_package(package)
+            ans = self.server_socket.recv(4096)
+            self.assertEqual(
+                ans,
+                b"PACKAGE t FROM ben TO anna WITH 101" + sep + package.content)
+
     def test_parse_error(self):
         """Test parsing an ERROR command."""
         with self.subTest("Other command"):
@@ -843,6 +1281,17 @@ def test_send_register(self):
         self.assertEqual(ans, b'REGISTER testname AS testrole' +
                          self.client.COMMAND_SEPERATOR)
 
+    def test_send_handshake(self):
+        self.client.send_handshake('testversion', 'testname', 'testrole')
+        ans = self.server_socket.recv(4096)
+
+        sep = self.client.COMMAND_SEPERATOR
+        self.assertEqual(ans, b'INFO testversion' + sep +
+                         b'REGISTER testname AS testrole' + sep)
+
+        with self.assertRaises(ValueError):
+            self.client.send_handshake('testversion', 'bad name', 'testrole')
+
     def test_send_package(self):
         sep = self.client.COMMAND_SEPERATOR
 
@@ -878,6 +1327,25 @@ def test_send_package(self):
             expected = b"PACKAGE typ4 FROM ben TO anna WITH 1" + sep + b'T'
             self.assertEqual(ans, expected)
 
+        with self.subTest("File package"):
+            package = client.Package("ben", "anna", "typ4")
+            package.file = io.BytesIO(b'Test')
+
+            self.client.send_package(package)
+
+            ans = self.server_socket.recv(4096)
+
+            expected = b"PACKAGE typ4 FROM ben TO anna WITH 4" + sep + b'Test'
+            self.assertEqual(ans, expected)
+
+        with self.subTest("Too large"):
+            self.client.MAX_PACKAGE_SIZE = 2
+            package = client.Package("ben", "anna", "typ4")
+            package.content = b'Test'
+
+            with self.assertRaises(ValueError):
+                self.client.send_package(package)
+
 
 class UserClientThreadTestCase(unittest.TestCase):
 
@@ -950,7 +1418,21 @@ def test_all_commands(self):
 
 class UserClientTestCase(unittest.TestCase):
     # TODO implement `UserClientTestCase`
-    pass
+
+    def test_buffer_full(self):
+        """Test counting the packages dropped from a full buffer."""
+        userclient = client.UserClient('somename')
+        userclient.buffer = collections.deque(maxlen=2)
+        packages = [client.Package('ben', 'somename', 't', i)
+                    for i in range(3)]
+
+        with self.assertLogs(client.logger, logging.WARNING):
+            for package in packages:
+                userclient._add_package(package)
+
+        self.assertEqual(userclient.dropped, 1)
+        self.assertEqual(userclient.receive(), packages[1:])
+        self.assertEqual(len(userclient.packages), 3)
 
 
 def getModuleSuite():
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+TestCases for the `ectec.logs` module.
+
+***********************************
+
+Created on Mon Oct 19 17:12:36 2026
+
+Copyright (C) 2020 real-yfprojects (github.com user)
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+import logging
+import threading
+import unittest
+
+from . import ErrorDetectionHandler, _import_ectec
+
+ectec = _import_ectec('logs')
+logs = ectec.logs
+
+
+class QueueLoggingTestCase(unittest.TestCase):
+    """TestCase for `QueueLogging`."""
+
+    def setUp(self):
+        self.logger = logging.getLogger('ectec.tests.queue')
+        self.logger.propagate = False
+        self.logger.setLevel(logging.DEBUG)
+
+        self.handler = ErrorDetectionHandler(logging.DEBUG)
+        self.logger.addHandler(self.handler)
+        self.addCleanup(self.logger.removeHandler, self.handler)
+
+    def test_queue_logging(self):
+        """Test handling the records in a background thread."""
+        threads = []
+        self.handler.emit = lambda record: threads.append(
+            threading.current_thread())
+
+        with logs.QueueLogging(self.logger) as queued:
+            self.assertEqual(self.logger.handlers, [queued.handler])
+            self.logger.info("Message %d", 1)
+
+        # the records were handled when stopping
+        self.assertEqual(self.logger.handlers, [self.handler])
+        self.assertEqual(len(threads), 1)
+        self.assertIsNot(threads[0], threading.current_thread())
+
+    def test_ancestor_handlers(self):
+        """Test moving the handlers the records propagate to."""
+        threads = []
+        self.handler.emit = lambda record: threads.append(
+            threading.current_thread())
+
+        child = logging.getLogger('ectec.tests.queue.child')
+        child.propagate = True
+
+        with logs.QueueLogging(child):
+            self.assertFalse(child.propagate)
+            self.assertEqual(self.logger.handlers, [self.handler])
+            child.info("Message %d", 1)
+
+        self.assertTrue(child.propagate)
+        self.assertEqual(child.handlers, [])
+        self.assertEqual(len(threads), 1)
+        self.assertIsNot(threads[0], threading.current_thread())
+
+    def test_full_queue(self):
+        """Test dropping records if the queue is full."""
+        queued = logs.QueueLogging(self.logger, maxsize=2)
+        queued.queue.put(None)
+        queued.queue.put(None)
+
+        self.logger.removeHandler(self.handler)
+        self.logger.addHandler(queued.handler)
+        try:
+            self.logger.info("Dropped")
+        finally:
+            self.logger.removeHandler(queued.handler)
+            self.logger.addHandler(self.handler)
+
+        self.assertEqual(queued.dropped, 1)
+
+
+class RateLimitFilterTestCase(unittest.TestCase):
+    """TestCase for `RateLimitFilter`."""
+
+    def test_rate_limit(self):
+        """Test suppressing records above the rate."""
+        limit = logs.RateLimitFilter(1, burst=3)
+
+        def record(msg):
+            return logging.LogRecord('ectec', logging.INFO, __file__, 0, msg,
+                                     (), None)
+
+        passed = [limit.filter(record("PACKAGE %s")) for i in range(5)]
+        self.assertEqual(passed, [True, True, True, False, False])
+        self.assertEqual(limit.suppressed, 2)
+
+        # other messages have their own limit
+        self.assertTrue(limit.filter(record("Other")))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -24,11 +24,16 @@
 
 """
 import logging
+import os
+import os.path as osp
+import secrets
+import socket
+import tempfile
 import threading
 import time
 import unittest
 
-from . import ErrorDetectionHandler, _import_ectec
+from . import ErrorDetectionHandler, FunctionThread, _import_ectec
 
 ectec = _import_ectec('client', 'server', 'logs')
 
@@ -117,6 +122,124 @@ def test_one_client(self):
 
             self.check_logs()
 
+    def test_pipelined_client(self):
+        """Test one client connecting with the pipelined handshake."""
+        server = ectec.server.Server()
+
+        with server.start(0):
+            client = ectec.client.UserClient('Testuser')
+
+            with client.connect("127.0.0.1", server.port, pipeline=True):
+                self.assertTrue(client.connected)
+                self.assertEqual(client.users, ["Testuser"])
+
+                self.assertEqual(len(server.users), 1)
+                self.assertEqual(server.users[0][0], "Testuser")
+
+            self.assertFalse(client.connected)
+
+            time.sleep(0.1)
+            self.assertEqual(len(server.users), 0)
+
+            self.check_logs()
+
+    def test_accept_stats(self):
+        """Test the backlog option and the statistics of accepting."""
+        server = ectec.server.Server()
+
+        with server.start(0, backlog=50):
+            clients = []
+            try:
+                for i in range(3):
+                    client = ectec.client.UserClient(f'userclient_{i}')
+                    client.connect("127.0.0.1", server.port)
+                    clients.append(client)
+
+                stats = server.accept_stats()
+                self.assertEqual(stats.backlog, 50)
+                self.assertEqual(stats.accepted, 3)
+                self.assertEqual(stats.refused, 0)
+                self.assertGreaterEqual(stats.max_batch, 1)
+                self.assertGreater(stats.max_latency, 0)
+
+                server.reject = True
+                with self.assertRaises(ectec.ConnectException):
+                    ectec.client.UserClient('rejected').connect(
+                        "127.0.0.1", server.port)
+
+                self.assertEqual(server.accept_stats().refused, 1)
+            finally:
+                for client in clients:
+                    client.disconnect()
+
+        self.check_logs()
+
+    def test_finished_threads(self):
+        """Test that threads of disconnected clients are cleaned up."""
+        server = ectec.server.Server()
+
+        with server.start(0):
+            for i in range(5):
+                client = ectec.client.UserClient(f'userclient_{i}')
+                with client.connect("127.0.0.1", server.port):
+                    pass
+
+            time.sleep(0.1)
+            stats = server.pool_stats()
+            self.assertEqual(stats.workers, 0)
+            self.assertEqual(stats.busy, 0)
+            self.assertEqual(len(server._server._threads), 0)
+
+        self.check_logs()
+
+    def test_worker_pool(self):
+        """Test a server with a bounded pool of workers."""
+        server = ectec.server.Server(max_workers=2, max_pending=1,
+                                     thread_stack_size=256 * 1024)
+
+        with server.start(0):
+            clients = [ectec.client.UserClient(f'userclient_{i}')
+                       for i in range(4)]
+            try:
+                clients[0].connect('127.0.0.1', server.port)
+                clients[1].connect('127.0.0.1', server.port)
+
+                stats = server.pool_stats()
+                self.assertEqual(stats.workers, 2)
+                self.assertEqual(stats.busy, 2)
+                self.assertEqual(stats.saturation, 1.)
+
+                # third client waits for a free worker
+                thread = threading.Thread(
+                    target=clients[2].connect, args=('127.0.0.1',
+                                                     server.port))
+                thread.start()
+
+                time.sleep(0.1)
+                self.assertEqual(server.pool_stats().pending, 1)
+
+                # fourth client is refused
+                with self.assertRaises(ectec.ConnectException):
+                    clients[3].connect('127.0.0.1', server.port)
+                self.assertEqual(server.pool_stats().rejected, 1)
+
+                # free a worker
+                server.kick('userclient_0')
+                thread.join()
+
+                self.assertTrue(clients[2].connected)
+
+                stats = server.pool_stats()
+                self.assertEqual(stats.pending, 0)
+                self.assertEqual(stats.workers, 2)
+                self.assertGreater(stats.max_delay, 0.05)
+
+            finally:
+                for client in clients:
+                    client.disconnect()
+
+        self.handler.clear()
+
     def test_kicking_client(self):
         """Test the server kicking a client."""
         server = ectec.server.Server()
@@ -173,6 +296,514 @@ def test_stopping_server(self):
             if client:
                 client.disconnect()
 
+    def test_stopping_server_deadline(self):
+        """Test that stopping a server with many clients is bounded."""
+        N = 20
+        server = ectec.server.Server()
+
+        clients = []
+        try:
+            server.start(0)
+
+            for i in range(N):
+                client = ectec.client.UserClient(f'userclient_{i}')
+                client.connect("127.0.0.1", server.port)
+                clients.append(client)
+
+            t1 = time.perf_counter()
+            server.stop(timeout=1)
+            t2 = time.perf_counter()
+
+            self.assertLess(t2 - t1, 1.1)
+            self.assertFalse(server.running)
+
+            time.sleep(0.05)
+            for client in clients:
+                self.assertFalse(client.connected)
+
+        finally:
+            server.stop()
+
+            for client in clients:
+                client.disconnect()
+
+    def test_draining_server(self):
+        """Test stopping the server gracefully."""
+        server = ectec.server.Server()
+
+        client = None
+
+        try:
+            server.start(0)
+
+            client = ectec.client.UserClient('Testuser')
+            client.connect("127.0.0.1", server.port)
+
+            self.assertTrue(server.drain(timeout=1))
+
+            time.sleep(0.05)
+
+            self.assertFalse(server.running)
+            self.assertFalse(client.connected)
+
+            # draining a stopped server does nothing
+            self.assertTrue(server.drain())
+
+        finally:
+            server.stop()
+
+            if client:
+                client.disconnect()
+
+    @unittest.skipUnless(hasattr(socket, 'AF_UNIX')
+                         and hasattr(socket, 'SCM_RIGHTS'),
+                         "Handoff requires unix sockets.")
+    def test_handoff(self):
+        """Test handing a running server over to another server."""
+
+        # Both servers run in this process and need their own client lists
+        class OldHandler(ectec.server.ClientHandler):
+            clients = {role.value: [] for role in ectec.Role}
+
+        class NewHandler(ectec.server.ClientHandler):
+            clients = {role.value: [] for role in ectec.Role}
+
+        old_server = ectec.server.Server(OldHandler)
+        new_server = ectec.server.Server(NewHandler)
+
+        client1 = ectec.client.UserClient('user_1')
+        client2 = ectec.client.UserClient('user_2')
+        client3 = ectec.client.UserClient('user_3')
+        client1.DEDUP_ENTRIES = client2.DEDUP_ENTRIES = 4
+
+        package = ectec.client.Package('user_1', 'user_2', 'text/plain')
+        package.content = b'Hello'
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = osp.join(directory, 'handoff.sock')
+            unix_path = osp.join(directory, 'ectec.sock')
+
+            try:
+                old_server.start(0, unix_path=unix_path)
+                port = old_server.port
+
+                client1.connect('127.0.0.1', port)
+                client2.connect('127.0.0.1', port)
+
+                # the body is cached by the clients and the old server
+                time.sleep(0.1)
+                client1.send(package)
+                time.sleep(0.1)
+                client2._update()
+                self.assertEqual(len(client2.receive()), 1)
+
+                thread = FunctionThread(target=new_server.takeover,
+                                        args=(path, 5))
+                thread.start()
+
+                while not osp.exists(path):
+                    time.sleep(0.01)
+
+                old_server.handoff(path, timeout=5)
+                thread.join()
+
+                self.assertFalse(old_server.running)
+                self.assertTrue(new_server.running)
+                self.assertEqual(new_server.port, port)
+                self.assertEqual(new_server.unix_path, unix_path)
+
+                # the clients didn't notice
+                self.assertTrue(client1.connected)
+                self.assertTrue(client2.connected)
+                self.assertEqual(sorted(user[0] for user in new_server.users),
+                                 ['user_1', 'user_2'])
+
+                # packages are forwarded by the new server
+                # which knows the cached bodies
+                client1.send(package)
+
+                time.sleep(0.1)
+                client2._update()
+                received = client2.receive()
+                self.assertEqual(len(received), 1)
+                self.assertEqual(received[0].content, b'Hello')
+
+                # new clients connect to the new server
+                client3.connect('unix://' + unix_path)
+                self.assertEqual(len(new_server.users), 3)
+
+            finally:
+                for client in (client1, client2, client3):
+                    client.disconnect()
+
+                old_server.stop()
+                new_server.stop()
+
+        self.check_logs()
+
+    @unittest.skipUnless(hasattr(socket, 'AF_UNIX')
+                         and hasattr(socket, 'SCM_RIGHTS')
+                         and osp.isdir('/proc/self/fd'),
+                         "Requires unix sockets and /proc.")
+    def test_failed_takeover(self):
+        """Test that a failed takeover closes the sockets received."""
+        server = ectec.server.Server()
+        listen_socket = socket.socket()
+        listen_socket.bind(('127.0.0.1', 0))
+        listen_socket.listen()
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = osp.join(directory, 'handoff.sock')
+            fds = len(os.listdir('/proc/self/fd'))
+            errors = []
+
+            def takeover():
+                try:
+                    server.takeover(path, 5)
+                except ectec.server.HandoffError as error:
+                    errors.append(error)
+
+            thread = threading.Thread(target=takeover)
+            thread.start()
+            while not osp.exists(path):
+                time.sleep(0.01)
+
+            with socket.socket(socket.AF_UNIX) as conn:
+                conn.connect(path)
+                ectec.server._send_handoff_message(
+                    conn, {'clients': 1}, [listen_socket.fileno()])
+
+                # a client state without its socket
+                ectec.server._send_handoff_message(conn, [{}], [])
+            thread.join()
+
+        listen_socket.close()
+        self.assertEqual(len(errors), 1)
+        self.assertFalse(server.running)
+        self.assertEqual(len(os.listdir('/proc/self/fd')), fds - 1)
+
+    @unittest.skipUnless(hasattr(socket, 'AF_UNIX'),
+                         "Requires unix sockets.")
+    def test_unix_socket(self):
+        """Test clients connecting through a unix socket."""
+        server = ectec.server.Server()
+
+        client1 = ectec.client.UserClient('user_1')
+        client2 = ectec.client.UserClient('user_2')
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = osp.join(directory, 'ectec.sock')
+
+            try:
+                server.start(0, unix_path=path)
+                self.assertEqual(server.unix_path, path)
+
+                client1.connect('unix://' + path, pipeline=True)
+                client2.connect('127.0.0.1', server.port)
+
+                self.assertEqual(client1.server,
+                                 ectec.Address('unix://' + path, 0))
+                self.assertEqual(len(server.users), 2)
+
+                # packages are forwarded between the transports
+                package = ectec.client.Package('user_1', 'user_2',
+                                               'text/plain')
+                package.content = b'Hello'
+                client1.send(package)
+
+                time.sleep(0.1)
+                client2._update()
+                received = client2.receive()
+                self.assertEqual(len(received), 1)
+                self.assertEqual(received[0].content, b'Hello')
+
+            finally:
+                client1.disconnect()
+                client2.disconnect()
+                server.stop()
+
+            # the socket file is removed
+            self.assertFalse(osp.exists(path))
+
+        self.check_logs()
+
+    def test_large_package(self):
+        """Test streaming a package larger than the thresholds."""
+
+        class StreamingHandler(ectec.server.ClientHandler):
+            STREAM_THRESHOLD = 100 * 1000
+            STREAM_CHUNK_SIZE = 4096
+            STREAM_BUFFER_SIZE = 16 * 4096
+
+        server = ectec.server.Server(StreamingHandler)
+
+        client1 = ectec.client.UserClient('user_1')
+        client2 = ectec.client.UserClient('user_2')
+        client2.SPILL_THRESHOLD = 100 * 1000
+
+        content = secrets.token_bytes(3 * 1000 * 1000)
+
+        with server.start(0):
+            try:
+                client1.connect('127.0.0.1', server.port)
+                client2.connect('127.0.0.1', server.port)
+
+                # a package stored in a file is sent from the file
+                with tempfile.TemporaryFile() as file:
+                    file.write(content)
+
+                    package = ectec.client.Package('user_1', 'user_2',
+                                                   'application/data')
+                    package.file = file
+                    self.assertEqual(package.size, len(content))
+                    client1.send(package)
+
+                    for i in range(50):
+                        client2._update()
+                        received = client2.receive()
+                        if received:
+                            break
+                        time.sleep(0.1)
+
+                self.assertEqual(len(received), 1)
+
+                # the received content was spilled to disk
+                self.assertIsNotNone(received[0].file)
+                self.assertEqual(received[0].size, len(content))
+                self.assertEqual(received[0].open().read(), content)
+                received[0].file.close()
+
+                # the connection is still usable
+                package = ectec.client.Package('user_1', 'user_2',
+                                               'text/plain')
+                package.content = b'Hello'
+                client1.send(package)
+
+                time.sleep(0.1)
+                client2._update()
+                received = client2.receive()
+                self.assertEqual(len(received), 1)
+                self.assertEqual(received[0].content, b'Hello')
+                self.assertIsNone(received[0].file)
+
+            finally:
+                client1.disconnect()
+                client2.disconnect()
+
+        self.check_logs()
+
+    def test_deduplication(self):
+        """Test sending the same body multiple times."""
+        server = ectec.server.Server()
+
+        client1 = ectec.client.UserClient('user_1')
+        client2 = ectec.client.UserClient('user_2')
+        client3 = ectec.client.UserClient('user_3')
+        client1.DEDUP_ENTRIES = client2.DEDUP_ENTRIES = 8
+
+        with server.start(0):
+            try:
+                for client in (client1, client2, client3):
+                    client.connect('127.0.0.1', server.port)
+
+                # wait for the answers to the CACHE commands
+                time.sleep(0.1)
+                self.assertIsNotNone(client1.sent_bodies)
+                self.assertIsNone(client3.sent_bodies)
+
+                for i in range(3):
+                    package = ectec.client.Package('user_1', 'user_2',
+                                                   'text/plain')
+                    package.content = b'The same exercise'
+                    client1.send(package)
+
+                time.sleep(0.1)
+
+                received = []
+                for client in (client2, client3):
+                    client._update()
+                    received.append(client.receive())
+                    self.assertEqual(len(received[-1]), 3)
+
+                # the body is held once by the deduplicating client
+                first, second, third = received[0]
+                self.assertEqual(first.content, b'The same exercise')
+                self.assertIs(second.content, first.content)
+                self.assertIs(third.content, first.content)
+
+                # other clients receive the bodies as usual
+                self.assertTrue(
+                    all(package.content == b'The same exercise'
+                        for package in received[1]))
+
+            finally:
+                for client in (client1, client2, client3):
+                    client.disconnect()
+
+        self.check_logs()
+
+    def test_groups(self):
+        """Test sending packages to a group."""
+        server = ectec.server.Server()
+
+        clients = [ectec.client.UserClient(f'user_{i}') for i in range(4)]
+
+        with server.start(0):
+            try:
+                for client in clients:
+                    client.connect('127.0.0.1', server.port)
+
+                clients[1].join('class')
+                clients[2].join('class')
+                time.sleep(0.1)
+                self.assertEqual(server.groups,
+                                 {'class': ['user_1', 'user_2']})
+
+                package = ectec.client.Package('user_0', '#class',
+                                               'text/plain')
+                package.content = b'Hello class'
+                clients[0].send(package)
+
+                time.sleep(0.1)
+                for client in clients:
+                    client._update()
+
+                # only the members received the package
+                for i, expected in enumerate((0, 1, 1, 0)):
+                    received = clients[i].receive()
+                    self.assertEqual(len(received), expected)
+
+                # leaving a group and disconnecting update the index
+                clients[1].part('class')
+                clients[2].disconnect()
+                time.sleep(0.1)
+                self.assertEqual(server.groups, {})
+
+            finally:
+                for client in clients:
+                    client.disconnect()
+
+        self.check_logs()
+
+    def test_fanout(self):
+        """Test broadcasting packages with a pool of writer threads."""
+        server = ectec.server.Server(fanout_workers=3)
+
+        clients = [ectec.client.UserClient(f'user_{i}') for i in range(12)]
+
+        with server.start(0):
+            try:
+                for client in clients:
+                    client.connect('127.0.0.1', server.port)
+
+                for i in range(3):
+                    package = ectec.client.Package('user_0', 'user_1',
+                                                   'text/plain')
+                    package.content = 'Package {}'.format(i).encode()
+                    clients[0].send(package)
+
+                time.sleep(0.2)
+                for client in clients:
+                    client._update()
+
+                # all others received the packages in order
+                self.assertEqual(clients[0].receive(), [])
+                for client in clients[1:]:
+                    self.assertEqual(
+                        [package.content for package in client.receive()],
+                        [b'Package 0', b'Package 1', b'Package 2'])
+
+            finally:
+                for client in clients:
+                    client.disconnect()
+
+        self.check_logs()
+
+    def test_stats(self):
+        """Test the statistics of the server and its clients."""
+        server = ectec.server.Server()
+
+        clients = [ectec.client.UserClient(f'user_{i}') for i in range(2)]
+
+        self.assertIsNone(server.stats())
+        with server.start(0):
+            try:
+                for client in clients:
+                    client.connect('127.0.0.1', server.port)
+
+                package = ectec.client.Package('user_0', 'user_1',
+                                               'text/plain')
+                package.content = b'Hello'
+                clients[0].send(package)
+                time.sleep(0.1)
+
+                sender = server.client_stats('user_0')
+                self.assertEqual(sender.packages_in, 1)
+                self.assertGreater(sender.bytes_in, 5)
+                self.assertEqual(sender.packages_out, 0)
+
+                recipient = server.client_stats('user_1')
+                self.assertEqual(recipient.packages_out, 1)
+                self.assertGreater(recipient.bytes_out, 5)
+                self.assertLessEqual(recipient.connected,
+                                     recipient.last_activity)
+
+                self.assertIsNone(server.client_stats('unknown'))
+
+                stats = server.stats()
+                self.assertEqual(stats.clients, 2)
+                self.assertEqual(stats.packages_in, 1)
+                self.assertEqual(stats.packages_out, 1)
+                self.assertGreater(stats.packages_in_rate, 0)
+
+                # disconnected clients are still counted
+                clients[1].disconnect()
+                time.sleep(0.1)
+
+                stats = server.stats(stats)
+                self.assertEqual(stats.clients, 1)
+                self.assertEqual(stats.packages_out, 1)
+                self.assertEqual(stats.packages_out_rate, 0)
+
+            finally:
+                for client in clients:
+                    client.disconnect()
+
+        self.check_logs()
+
+    def test_capture(self):
+        """Test capturing the traffic of a server."""
+        server = ectec.server.Server()
+        Capture = ectec.server.TrafficCapture
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = osp.join(directory, 'traffic.cap')
+
+            with server.start(0, capture=path):
+                client1 = ectec.client.UserClient('user_1')
+                client2 = ectec.client.UserClient('user_2')
+                with client1.connect('127.0.0.1', server.port), \
+                        client2.connect('127.0.0.1', server.port):
+                    package = ectec.client.Package('user_1', 'user_2',
+                                                   'text/plain')
+                    package.content = b'Captured'
+                    client1.send(package)
+                    time.sleep(0.1)
+
+            records = list(Capture.read(path))
+
+        kinds = [record.kind for record in records]
+        self.assertEqual(kinds.count(Capture.OPEN), 2)
+        self.assertEqual(kinds.count(Capture.CLOSE), 2)
+
+        data = b''.join(record.data for record in records
+                        if record.kind == Capture.DATA and
+                        record.connection == records[0].connection)
+        self.assertIn(b'REGISTER user_1 AS user\n', data)
+        self.assertIn(b'\nCaptured', data)
+
+        self.check_logs()
+
     def test_rejecting_clients(self):
         """Test the server rejecting a client."""
         server = ectec.server.Server()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+TestCases for the `ectec.search` module.
+
+***********************************
+
+Created on Mon Oct 19 21:31:02 2026
+
+Copyright (C) 2020 real-yfprojects (github.com user)
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+import threading
+import unittest
+
+from . import _import_ectec
+
+ectec = _import_ectec('client', 'search')
+client = ectec.client
+search = ectec.search
+
+
+def text_package(text, typ='text/plain'):
+    """Create a package with `text` as its body."""
+    pkg = client.Package('testsender', 'testrecipient', typ)
+    pkg.content = text.encode('utf-8')
+    return pkg
+
+
+class TextIndexTestCase(unittest.TestCase):
+    """TestCase for `TextIndex`."""
+
+    def setUp(self):
+        self.index = search.TextIndex()
+        self.index.add(
+            enumerate([
+                text_package("Hello World"),
+                text_package("hello there"),
+                text_package("World peace!"),
+                text_package("Hello World", 'image/png'),
+                text_package("Grüße aus Köln"),
+            ]))
+        self.index.wait()
+
+    def test_add(self):
+        """Test indexing packages in the background."""
+        threads = []
+        self.index._add = lambda packages: threads.append(
+            threading.current_thread())
+
+        self.index.add([])
+        self.index.wait()
+
+        self.assertEqual(len(threads), 1)
+        self.assertIsNot(threads[0], threading.current_thread())
+
+        # only text packages are indexed
+        self.assertEqual(len(self.index), 4)
+        self.assertCountEqual(self.index.words[0], ['hello', 'world'])
+
+    def test_search(self):
+        """Test searching for words and prefixes."""
+        self.assertEqual(self.index.search('hello'), [1, 0])
+        self.assertEqual(self.index.search('WORLD'), [2, 0])
+        self.assertEqual(self.index.search('wor'), [2, 0])
+        self.assertEqual(self.index.search('wor '), [])
+        self.assertEqual(self.index.search('world hel'), [0])
+        self.assertEqual(self.index.search('hello peace'), [])
+        self.assertEqual(self.index.search('h'), [1, 0])
+        self.assertEqual(self.index.search('köln'), [4])
+
+        # prefixes matching many words are compared to each package
+        self.index.PREFIX_MERGE = 1
+        self.assertEqual(self.index.search('hello w'), [0])
+        self.assertEqual(self.index.search('t'), [1])
+        self.assertEqual(self.index.search('!?'), [])
+        self.assertEqual(self.index.search('unknown'), [])
+
+        self.assertEqual(self.index.search('hello', limit=1), [1])
+        self.assertEqual(self.index.search('hello', limit=0), [])
+        self.assertEqual(self.index.search('hello', alive={0, 2}), [0])
+
+    def test_remove(self):
+        """Test removing packages from the index."""
+        self.index.remove([0, 2])
+        self.index.wait()
+
+        self.assertEqual(len(self.index), 2)
+        self.assertEqual(self.index.search('hello'), [1])
+        self.assertEqual(self.index.search('world'), [])
+        self.assertNotIn('peace', self.index.postings)
+
+        # new words are found after removing others
+        self.index.add([(5, text_package("peace again"))])
+        self.index.wait()
+        self.assertEqual(self.index.search('pea'), [5])
+
+    def test_idle(self):
+        """Test that the thread ends and is restarted."""
+        self.index.IDLE = 0.01
+        self.index.add([(5, text_package("more"))])
+        self.index.wait()
+
+        thread = self.index._thread
+        if thread is not None:
+            thread.join(1)
+        self.assertIsNone(self.index._thread)
+
+        self.index.add([(6, text_package("more"))])
+        self.index.wait()
+        self.assertEqual(self.index.search('more'), [6, 5])
+
+    def test_failure(self):
+        """Test that a package failing to be read doesn't stop the thread."""
+
+        class BrokenPackage:
+            type = 'text/plain'
+
+            @property
+            def content(self):
+                raise OSError("The body can't be read.")
+
+        with self.assertLogs(search.logger, 'ERROR'):
+            self.index.add([(5, BrokenPackage()),
+                            (6, text_package("after the broken one"))])
+            self.index.wait()
+
+        self.assertEqual(self.index.search('broken'), [6])
+
+        with self.assertLogs(search.logger, 'ERROR'):
+            self.index.remove(None)  # not iterable
+            self.index.wait()
+
+        self.index.add([(7, text_package("still running"))])
+        self.index.wait()
+        self.assertEqual(self.index.search('running'), [7])
+
+
+if __name__ == '__main__':
+    unittest.main()
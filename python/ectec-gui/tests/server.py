@@ -25,9 +25,12 @@
 """
 import copy
 import logging
+import os.path as osp
 import secrets
 import socket
 import socketserver
+import tempfile
+import threading
 import time
 import unittest
 from unittest import mock
@@ -86,6 +89,7 @@ def __init__(self, request, address, server):
                 self.server = server
 
         TestHandler.clients = copy.deepcopy(CLIENTS)
+        TestHandler.subscriptions = {}
 
         self.handler = TestHandler(self.handler_socket,
                                    self.address,
@@ -445,6 +449,319 @@ def test_send_pkg(self):
 
                 self.assertEqual(result, expected)
 
+    def test_recv_chunks(self):
+        """Test receiving data in chunks of limited size."""
+        content = secrets.token_bytes(300 * 1000)
+        self.handler.buffer = content[:1000]
+
+        thread = FunctionThread(target=lambda: list(
+            self.handler.recv_chunks(len(content) - 10, 4096)))
+        thread.start()
+
+        self.client_socket.sendall(content[1000:])
+        thread.join()
+        chunks = thread.return_value
+
+        self.assertTrue(all(len(chunk) <= 4096 for chunk in chunks))
+        self.assertEqual(b''.join(chunks), content[:-10])
+        self.assertEqual(self.handler.buffer, b'')
+
+    def test_package_stream(self):
+        """Test forwarding a package in chunks."""
+        self.client_socket.settimeout(1)
+        command = self.handler.compose_pkg('some_type', 'plain', 'plain', 10)
+
+        # complete content
+        stream = ectecserver.PackageStream(self.handler, command, 10, 8, 4)
+        stream.start()
+        for chunk in (b'0123', b'4567', b'89'):
+            stream.put(chunk)
+        stream.close()
+
+        expected = command + b'0123456789'
+        result = b''
+        while len(result) < len(expected):
+            result += self.client_socket.recv(8192)
+
+        self.assertEqual(result, expected)
+        self.assertFalse(stream.incomplete)
+
+        # a stream waiting behind other frames holds the sender back
+        with self.handler.sending_lock:
+            self.handler._writing = True
+
+        stream = ectecserver.PackageStream(self.handler, command, 10, 8, 4)
+        stream.start()
+        sender = FunctionThread(target=stream.put, args=(b'0123', 0.05))
+        sender.start()
+        stream.put(b'4567', 0.05)
+        sender.join()
+        sender = FunctionThread(target=stream.put, args=(b'89', 0.05))
+        sender.start()
+        sender.join(0.3)
+        self.assertTrue(sender.is_alive())
+
+        with self.handler.sending_lock:
+            self.handler._writing = False
+            self.handler._written.notify_all()
+
+        sender.join(1)
+        self.assertFalse(sender.is_alive())
+        stream.close()
+
+        result = b''
+        while len(result) < len(expected):
+            result += self.client_socket.recv(8192)
+        self.assertEqual(result, expected)
+        self.assertFalse(stream.failed)
+
+        # incomplete content isn't written if the stream didn't start
+        with self.handler.sending_lock:
+            self.handler._writing = True
+
+        stream = ectecserver.PackageStream(self.handler, command, 10, 8, 4)
+        stream.start()
+        stream.put(b'0123')
+        stream.close(0.05)
+        self.assertTrue(stream.incomplete)
+
+        with self.handler.sending_lock:
+            self.handler._writing = False
+            self.handler._written.notify_all()
+        stream.close()
+
+        self.handler.send_error("Next")
+        sep = self.handler.COMMAND_SEPERATOR
+        result = b''
+        while sep not in result:
+            result += self.client_socket.recv(8192)
+        self.assertTrue(result.startswith(b'ERROR '))
+        self.assertFalse(stream.failed)
+
+        # the client is disconnected if incomplete content was started
+        stream = ectecserver.PackageStream(self.handler, command, 10, 8, 4)
+        stream.start()
+        stream.put(b'0123')
+        stream.close()
+
+        result = b''
+        data = self.client_socket.recv(8192)
+        while data:
+            result += data
+            data = self.client_socket.recv(8192)
+
+        self.assertEqual(result, command + b'0123')
+        self.assertTrue(stream.incomplete)
+        self.assertTrue(stream.failed)
+
+    def test_priority_lanes(self):
+        """Test that control frames overtake queued packages."""
+        sep = self.handler.COMMAND_SEPERATOR
+        self.client_socket.settimeout(1)
+        lanes = self.handler._lanes
+
+        def wait_for(condition):
+            for i in range(100):
+                if condition():
+                    return
+                time.sleep(0.01)
+            self.fail("Timed out.")
+
+        release = threading.Event()
+
+        def chunks():
+            yield b'01'
+            release.wait(1)
+            yield b'23'
+
+        command = self.handler.compose_pkg('some_type', 'plain', 'plain', 4)
+        package = ectecserver.Package('plain', 'plain', 'some_type', b'bulk')
+
+        # a package is being streamed
+        stream = FunctionThread(target=self.handler.send_stream,
+                                args=(command, chunks()))
+        stream.start()
+        wait_for(lambda: self.handler._writing)
+
+        # a package and an error are queued
+        bulk = FunctionThread(target=self.handler.send_pkg, args=(package, ))
+        bulk.start()
+        wait_for(lambda: lanes[ectecserver.Priority.BULK])
+
+        control = FunctionThread(target=self.handler.send_error,
+                                 args=('TestError', ))
+        control.start()
+        wait_for(lambda: lanes[ectecserver.Priority.CONTROL])
+
+        release.set()
+        for thread in (stream, bulk, control):
+            thread.join(1)
+
+        expected = command + b'0123' + b'ERROR TestError' + sep + \
+            self.handler.compose_pkg('some_type', 'plain', 'plain', 4) + \
+            b'bulk'
+        result = b''
+        while len(result) < len(expected):
+            result += self.client_socket.recv(8192)
+
+        self.assertEqual(result, expected)
+        self.assertTrue(self.handler.flush(0))
+
+    def test_fanout_pool(self):
+        """Test forwarding to many clients with a pool of threads."""
+        pool = ectecserver.FanOutPool(3)
+        self.addCleanup(pool.close, 1)
+
+        handlers = [mock.Mock(name=f'handler_{i}') for i in range(20)]
+        sent = {handler: [] for handler in handlers}
+
+        def send(number):
+
+            def send_to(handler):
+                if handler is handlers[0]:
+                    raise OSError()
+                time.sleep(0.001)
+                sent[handler].append(number)
+
+            return send_to
+
+        for number in range(5):
+            failed = pool.forward(handlers, send(number))
+            self.assertEqual(failed, [handlers[0]])
+
+        # every client got all packages in order
+        for handler in handlers[1:]:
+            self.assertEqual(sent[handler], list(range(5)))
+
+        # the frames are shared by all recipients
+        package = ectecserver.Package('plain', 'plain', 'some_type', b'body')
+        frames = ectecserver.PackageFrames(self.handler, package)
+        self.assertIs(frames.plain, frames.plain)
+
+        self.handler.send_pkg(package, frames=frames)
+        self.client_socket.settimeout(1)
+        self.assertEqual(self.client_socket.recv(4096), frames.plain)
+
+    def test_stats(self):
+        """Test the statistics of a connection."""
+        self.client_socket.settimeout(1)
+        self.handler.client_data = ectecserver.ClientData(
+            'name', ectec.Role.USER, ('127.0.0.1', 0), self.handler)
+
+        self.client_socket.sendall(b'command\nrest')
+        self.assertEqual(self.handler.recv_command(100, 1, 1), b'command')
+
+        package = ectecserver.Package('plain', 'plain', 'some_type', b'body')
+        self.handler.send_pkg(package)
+        self.handler.send_error('TestError')
+        received = self.client_socket.recv(4096)
+
+        stats = self.handler.stats()
+        self.assertEqual(stats.name, 'name')
+        self.assertEqual(stats.bytes_in, 12)
+        self.assertEqual(stats.buffered, 4)
+        self.assertEqual(stats.packages_out, 1)
+        self.assertEqual(stats.bytes_out, len(received))
+        self.assertEqual(stats.queued, 0)
+
+    def test_traffic_capture(self):
+        """Test capturing the received data and reading it back."""
+        Capture = ectecserver.TrafficCapture
+        with tempfile.TemporaryDirectory() as directory:
+            path = osp.join(directory, 'traffic.cap')
+
+            capture = Capture(path)
+            self.handler.capture = capture
+            self.handler.capture_id = capture.open(('127.0.0.1', 4000))
+
+            self.client_socket.sendall(b'command\n')
+            self.assertEqual(self.handler.recv_command(100, 1, 1), b'command')
+            capture.close_connection(self.handler.capture_id)
+            capture.close()
+
+            # closed captures are ignored
+            capture.data(0, b'ignored')
+
+            records = list(Capture.read(path))
+
+        self.assertEqual([(r.kind, r.connection, r.data) for r in records],
+                         [(Capture.OPEN, 0, b'127.0.0.1:4000'),
+                          (Capture.DATA, 0, b'command\n'),
+                          (Capture.CLOSE, 0, b'')])
+        self.assertEqual(sorted(records, key=lambda r: r.time), records)
+
+    def test_send_pkg_deduplicated(self):
+        """Test sending packages to a client deduplicating bodies."""
+        sep = self.handler.COMMAND_SEPERATOR
+        self.client_socket.settimeout(1)
+
+        self.handler.enable_dedup(1000)
+        expected = 'CACHE {} {}'.format(
+            self.handler.DEDUP_ENTRIES,
+            self.handler.DEDUP_MAX_SIZE).encode('utf-8') + sep
+        self.assertEqual(self.client_socket.recv(4096), expected)
+
+        content = b'exercise'
+        digest = ectec.content_hash(content)
+        package = ectecserver.Package('plain', 'plain', 'some_type', content)
+        header = b'PACKAGE some_type FROM plain TO plain '
+
+        # the body is sent once
+        self.handler.send_pkg(package, digest)
+        self.assertEqual(self.client_socket.recv(4096),
+                         header + b'WITH 8 HASH ' + digest.encode() + sep +
+                         content)
+
+        self.handler.send_pkg(package, digest)
+        self.assertEqual(self.client_socket.recv(4096),
+                         header + b'REF ' + digest.encode() + sep)
+
+        # without hash nothing changes
+        self.handler.send_pkg(package)
+        self.assertEqual(self.client_socket.recv(4096),
+                         header + b'WITH 8' + sep + content)
+
+    def test_store_body(self):
+        """Test checking and caching received bodies."""
+        self.handler.enable_dedup(2)
+
+        content = b'exercise'
+        digest = ectec.content_hash(content)
+        package = ectecserver.Package('plain', 'plain', 'some_type', content)
+
+        stored = self.handler.store_body(package, digest)
+        self.assertEqual(stored, package)
+
+        resolved = self.handler.resolve_ref('some_type', 'plain', 'plain',
+                                            digest)
+        self.assertEqual(resolved, package)
+
+        with self.assertRaises(ectecserver.CommandError):
+            self.handler.store_body(package, '0' * 64)
+
+        with self.assertRaises(ectecserver.CommandError):
+            self.handler.resolve_ref('some_type', 'plain', 'plain', '0' * 64)
+
+    def test_groups(self):
+        """Test joining and leaving groups."""
+        self.handler.client_data = ectecserver.ClientData(
+            'name1', ectec.Role.USER, self.address, self.handler)
+        self.handler.join_group('class')
+        self.handler.join_group('team')
+        self.handler.join_group('class')
+        self.assertEqual(self.handler.get_groups(), {
+            'class': ['name1'],
+            'team': ['name1']
+        })
+
+        # the sender doesn't receive its own packages
+        self.assertEqual(self.handler.route('#class'), [])
+
+        self.handler.part_group('class')
+        self.handler.part_group('unknown')
+        self.assertEqual(self.handler.get_groups(), {'team': ['name1']})
+        self.assertEqual(self.handler.joined, {'team'})
+
     def test_send_update(self):
         """Test the sending of an update"""
         # empty
@@ -604,6 +921,99 @@ def test_handling_user(self):
         client_list = self.handler.get_client_list()
         self.assertEqual(client_list, [])
 
+    def test_handling_pipelined_user(self):
+        """Test the handling of a user client using the pipelined handshake."""
+        sep = self.handler.COMMAND_SEPERATOR
+        self.client_socket.settimeout(1)  # test shouldn't hang on fail
+
+        thread = FunctionThread(target=self.handler.handle)
+        thread.start()
+
+        # ---- version check and register at once
+        version_bytes = str(ectecserver.VERSION).encode('utf-8')
+        name = 'name1'
+        command = b'INFO ' + version_bytes + sep + \
+            b'REGISTER ' + name.encode('utf-8') + b' AS user' + sep
+
+        self.client_socket.sendall(command)
+
+        # ---- both answers are sent at once
+        users_list = name.encode('utf-8')
+        expected = b'INFO True ' + version_bytes + sep + \
+            b'UPDATE USERS ' + str(len(users_list)).encode('utf-8') + sep + \
+            users_list
+
+        answer = self.client_socket.recv(4096)
+
+        self.assertEqual(answer, expected)
+        self.assertEqual(len(self.handler.get_client_list()), 1)
+
+        # ---- disconnect
+        self.client_socket.close()
+        thread.join()
+
+        self.handler.finish()
+
+        self.assertEqual(self.handler.get_client_list(), [])
+
+    def test_handling_pipelined_refusal(self):
+        """Test refusing the version of a pipelined handshake."""
+        sep = self.handler.COMMAND_SEPERATOR
+        self.client_socket.settimeout(1)  # test shouldn't hang on fail
+
+        thread = FunctionThread(target=self.handler.handle)
+        thread.start()
+
+        command = b'INFO 0.0.1' + sep + b'REGISTER name1 AS user' + sep
+        self.client_socket.sendall(command)
+
+        version_bytes = str(ectecserver.VERSION).encode('utf-8')
+        answer = self.client_socket.recv(4096)
+
+        self.assertEqual(answer, b'INFO False ' + version_bytes + sep)
+
+        thread.join()
+        self.assertEqual(self.handler.get_client_list(), [])
+
+    def test_handling_oversized_package(self):
+        """Test rejecting a package exceeding the maximum size."""
+        sep = self.handler.COMMAND_SEPERATOR
+        self.client_socket.settimeout(1)  # test shouldn't hang on fail
+        self.handler.MAX_PACKAGE_SIZE = 100
+
+        thread = FunctionThread(target=self.handler.handle)
+        thread.start()
+
+        version_bytes = str(ectecserver.VERSION).encode('utf-8')
+        command = b'INFO ' + version_bytes + sep + b'REGISTER name1 AS user' \
+            + sep
+        self.client_socket.sendall(command)
+
+        answer = b''
+        while answer.count(sep) < 2:
+            answer += self.client_socket.recv(4096)
+
+        # ---- the client is disconnected
+        command = b'PACKAGE text/plain FROM name1 TO name2 WITH 5000' + sep
+        self.client_socket.sendall(command)
+
+        expected = b'ERROR Server closed connection.Reason: Package too ' + \
+            b'large: 5000 bytes exceed the limit of 100 bytes.' + sep
+
+        answer = b''
+        data = self.client_socket.recv(4096)
+        while data:
+            answer += data
+            data = self.client_socket.recv(4096)
+
+        self.assertEqual(answer, expected)
+
+        thread.join(1)
+        self.assertFalse(thread.is_alive())
+        self.client_socket.close()
+
+        self.handler.finish()
+
     # @unittest.skip("Blocks port")
     def test_handling_bad_client(self):
         """Test the handling of a bad client."""
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+TestCases for the `ectec.storage` module.
+
+***********************************
+
+Created on Mon Oct 19 19:40:11 2026
+
+Copyright (C) 2020 real-yfprojects (github.com user)
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+import datetime
+import os.path as osp
+import tempfile
+import unittest
+
+from . import _import_ectec
+
+ectec = _import_ectec('client', 'storage')
+client = ectec.client
+storage = ectec.storage
+
+
+def make_packages():
+    """Create packages for filling a storage."""
+    p1 = client.Package('testsender', 'testrecipient', 'testtype')
+    p2 = client.Package('testsender', 'testrecipient', 'testtype', 2)
+    p3 = client.Package('testsender', 'testrecipient', 'testtype', 2)
+    p4 = client.Package('testsender', 'testrecipient', 'sometype')
+    p5 = client.Package('testman', 'testrecipient', 'testtype')
+    p6 = client.Package('testman', 'testrecipient', 'testtype', 2)
+    p7 = client.Package('testman', ['testrecipient', 'someman'], 'testtype', 2)
+    p4.content = b'some content'
+    return [p1, p2, p3, p4, p5, p6, p7]
+
+
+class SqlitePackageStorageTestCase(unittest.TestCase):
+    """Tests for the `SqlitePackageStorage`."""
+
+    def setUp(self):
+        self.storage = storage.SqlitePackageStorage()
+        self.addCleanup(self.storage.close)
+        self.packages = make_packages()
+
+    def test_add_all(self):
+        """Test the adding of packages and the `all` method."""
+        self.assertEqual(self.storage.all(), [])
+
+        ids = self.storage.add(*self.packages[:2], as_list=self.packages[2:])
+
+        self.assertEqual(len(ids), 7)
+        self.assertEqual(len(self.storage), 7)
+        self.assertEqual(self.storage.all(), self.packages)
+        self.assertEqual(list(self.storage), self.packages)
+        self.assertEqual(self.storage.get(ids[3]), self.packages[3])
+        self.assertRaises(KeyError, self.storage.get, -1)
+
+    def test_lazy_content(self):
+        """Test that the bodies are read when accessed."""
+        self.storage.add(*self.packages)
+        pkg = self.storage.all()[3]
+
+        self.assertFalse(pkg.loaded)
+        self.assertEqual(pkg.size, 12)
+        self.assertFalse(pkg.loaded)
+
+        self.assertEqual(pkg.content, b'some content')
+        self.assertTrue(pkg.loaded)
+        self.assertEqual(pkg.open().read(), b'some content')
+
+    def test_remove(self):
+        """Test the removing of packages."""
+        p1, p2, p3, p4, p5, p6, p7 = self.packages
+        self.storage.add(*self.packages)
+
+        self.storage.remove(p2, p4)
+        self.assertEqual(self.storage.all(), [p1, p5, p6, p7])
+        self.assertNotIn(p4, self.storage)
+        self.assertIn(p5, self.storage)
+
+        self.storage.remove(func=lambda p: bool(p.time))
+        self.assertEqual(self.storage.all(), [p1, p5])
+
+        # the recipients are removed with the packages
+        self.assertEqual(list(self.storage.filter_recipient('someman')), [])
+
+    def test_filter(self):
+        """Test the filtering of packages."""
+        p1, p2, p3, p4, p5, p6, p7 = self.packages
+        self.storage.add(*self.packages)
+
+        def filtered(func=None, **kwargs):
+            return list(self.storage.filter(func, **kwargs))
+
+        self.assertEqual(filtered(sender='testman'), [p5, p6, p7])
+        self.assertEqual(filtered(recipient=('testrecipient', )),
+                         [p1, p2, p3, p4, p5, p6])
+        self.assertEqual(filtered(recipient=('testrecipient', 'someman')),
+                         [p7])
+        self.assertEqual(filtered(type='sometype'), [p4])
+        self.assertEqual(filtered(content=b'some content'), [p4])
+        self.assertEqual(filtered(time=None), [p1, p4, p5])
+        self.assertEqual(filtered(time=datetime.datetime.fromtimestamp(2)),
+                         [p2, p3, p6, p7])
+        self.assertEqual(filtered(timestamp=2), [p2, p3, p6, p7])
+        self.assertEqual(filtered(timestamp=None), [p1, p4, p5])
+        self.assertEqual(filtered(groups=()), self.packages)
+        self.assertEqual(filtered(unknown=1), [])
+        self.assertEqual(
+            filtered(lambda p: bool(p.time), sender='testsender'), [p2, p3])
+
+        self.assertEqual(list(self.storage.filter_recipient('someman')), [p7])
+        self.assertEqual(
+            list(self.storage.filter_recipient('someman', 'testrecipient')),
+            self.packages)
+        self.assertEqual(list(self.storage.filter_recipient()), [])
+
+    def test_range(self):
+        """Test looking up packages by their time."""
+        p1, p2, p3, p4, p5, p6, p7 = self.packages
+        p1.time = 3
+        self.storage.add(*self.packages)
+
+        self.assertEqual(list(self.storage.range()), [p2, p3, p6, p7, p1])
+        self.assertEqual(list(self.storage.range(end=3)), [p2, p3, p6, p7])
+        self.assertEqual(list(self.storage.since(3)), [p1])
+        self.assertEqual(
+            list(self.storage.since(datetime.datetime.fromtimestamp(2.5))),
+            [p1])
+
+    def test_persistence(self):
+        """Test that the packages survive closing the storage."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = osp.join(directory, 'history.db')
+            with storage.SqlitePackageStorage(path) as history:
+                history.add(*self.packages)
+
+            with storage.SqlitePackageStorage(path) as history:
+                self.assertEqual(history.all(), self.packages)
+
+
+class ArchivePackageStorageTestCase(unittest.TestCase):
+    """Tests for the `ArchivePackageStorage`."""
+
+    def setUp(self):
+        self.storage = storage.ArchivePackageStorage()
+        self.addCleanup(self.storage.close)
+        self.packages = make_packages()
+
+    def test_add(self):
+        """Test that the bodies are moved to the archive."""
+        self.storage.add(*self.packages)
+
+        self.assertEqual(self.storage.all(), self.packages)
+        self.assertEqual(self.storage.archive.size, 12)
+
+        pkg = self.storage.all()[3]
+        self.assertIsInstance(pkg, storage.ArchivedPackage)
+        self.assertIs(pkg.archive, self.storage.archive)
+        self.assertEqual(pkg.size, 12)
+        self.assertEqual(pkg.content, b'some content')
+        self.assertEqual(bytes(pkg.view()), b'some content')
+        self.assertEqual(pkg.open().read(), b'some content')
+        self.assertIn(self.packages[3], self.storage)
+
+        # adding an archived package doesn't copy the body
+        self.storage.add(pkg)
+        self.assertEqual(self.storage.archive.size, 12)
+
+    def test_large_bodies(self):
+        """Test bodies held in a file and bodies added after reading."""
+        with tempfile.TemporaryFile() as file:
+            file.write(b'x' * 200000)
+            pkg = client.Package('testsender', 'testrecipient', 'testtype')
+            pkg.file = file
+            self.storage.add(pkg)
+
+        self.assertEqual(self.storage.all()[0].content, b'x' * 200000)
+
+        # the archive is mapped again when it grew
+        self.storage.add(*self.packages)
+        self.assertEqual(self.storage.all()[4].content, b'some content')
+        self.assertEqual(self.storage.archive.size, 200012)
+
+    def test_remove_evict(self):
+        """Test removing and evicting archived packages."""
+        p1, p2, p3, p4, p5, p6, p7 = self.packages
+        self.storage.add(*self.packages)
+
+        self.storage.remove(p4)
+        self.assertEqual(self.storage.all(), [p1, p2, p3, p5, p6, p7])
+
+        self.storage.max_bytes = 10
+        self.storage.eviction = client.Eviction.CONTENT
+        pkg = client.Package('testsender', 'testrecipient', 'testtype', 3)
+        pkg.content = b'some content'
+        self.storage.add(pkg)
+
+        stored = self.storage.all()[-1]
+        self.assertEqual(stored.content, b'')
+        self.assertIsNone(stored.archive)
+
+
+class ColumnarPackageStorageTestCase(unittest.TestCase):
+    """Tests for the `ColumnarPackageStorage`."""
+
+    def setUp(self):
+        self.storage = storage.ColumnarPackageStorage()
+        self.packages = make_packages()
+
+    def test_add_all(self):
+        """Test the adding of packages and the views."""
+        self.assertEqual(self.storage.all(), [])
+
+        ids = self.storage.add(*self.packages[:2], as_list=self.packages[2:])
+
+        self.assertEqual(ids, list(range(7)))
+        self.assertEqual(len(self.storage), 7)
+        self.assertEqual(self.storage.all(), self.packages)
+
+        pkg = self.storage.get(3)
+        self.assertIsInstance(pkg, storage.ColumnPackage)
+        self.assertEqual(pkg.size, 12)
+        self.assertEqual(pkg.content, b'some content')
+        self.assertEqual(self.storage.get(6).recipient,
+                         ('testrecipient', 'someman'))
+        self.assertEqual(self.storage.strings,
+                         ['testsender', 'testtype', 'testrecipient',
+                          'sometype', 'testman', 'someman'])
+        self.assertRaises(KeyError, self.storage.get, 7)
+
+    def test_remove(self):
+        """Test the removing of packages."""
+        p1, p2, p3, p4, p5, p6, p7 = self.packages
+        self.storage.add(*self.packages)
+
+        self.storage.remove(p2, p4)
+        self.assertEqual(self.storage.all(), [p1, p5, p6, p7])
+        self.assertEqual(len(self.storage), 4)
+        self.assertNotIn(p4, self.storage)
+        self.assertIn(p5, self.storage)
+        self.assertRaises(KeyError, self.storage.get, 1)
+
+        self.storage.remove(func=lambda p: bool(p.time))
+        self.assertEqual(self.storage.all(), [p1, p5])
+        self.assertEqual(list(self.storage.filter_recipient('someman')), [])
+
+    def test_filter(self):
+        """Test the filtering of packages."""
+        p1, p2, p3, p4, p5, p6, p7 = self.packages
+        self.storage.add(*self.packages)
+
+        def filtered(func=None, **kwargs):
+            return list(self.storage.filter(func, **kwargs))
+
+        self.assertEqual(filtered(sender='testman'), [p5, p6, p7])
+        self.assertEqual(filtered(sender='unknown'), [])
+        self.assertEqual(filtered(recipient=('testrecipient', )),
+                         [p1, p2, p3, p4, p5, p6])
+        self.assertEqual(filtered(recipient=('testrecipient', 'someman')),
+                         [p7])
+        self.assertEqual(filtered(type='sometype'), [p4])
+        self.assertEqual(filtered(content=b'some content'), [p4])
+        self.assertEqual(filtered(time=None), [p1, p4, p5])
+        self.assertEqual(filtered(time=datetime.datetime.fromtimestamp(2)),
+                         [p2, p3, p6, p7])
+        self.assertEqual(filtered(timestamp=2), [p2, p3, p6, p7])
+        self.assertEqual(filtered(timestamp=None), [p1, p4, p5])
+        self.assertEqual(filtered(unknown=1), [])
+        self.assertEqual(
+            filtered(lambda p: bool(p.time), sender='testsender'), [p2, p3])
+
+        self.assertEqual(
+            list(self.storage.filter_recipient('someman', 'testrecipient')),
+            self.packages)
+
+
+if __name__ == '__main__':
+    unittest.main()